@@ -0,0 +1,190 @@
+"""Asyncio core for fetching pages and calling Gemini across hundreds of URLs in one process.
+
+Every request goes through one pooled httpx.AsyncClient with keep-alive,
+HTTP/2 when the h2 package is installed, and a cap on connections per host
+so no single site gets hammered. Model calls go through client.aio, which
+shares the rate limiter and circuit breaker with the threaded code. Pages
+that can't be read over plain HTTP (see fetch_tier.escalation_reason) are
+handed back so only they are opened in a browser.
+"""
+import asyncio
+from urllib.parse import urlsplit
+from fetch_tier import GONE_STATUS, USER_AGENT, PageGone, escalation_reason
+from prompt_compaction import DEFAULT_TOKEN_BUDGET, compact_page_text
+from tracing import span
+from triage import TRIAGE_MODEL, TRIAGE_PROMPT, parse_triage_response, record_link_status
+
+APPLICABILITY_MODEL = 'gemini-3-flash-preview'
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AsyncEngine:
+    """Pooled async HTTP client plus async Gemini calls; use as `async with AsyncEngine(...) as engine`."""
+
+    def __init__(self, client, cache=None, max_connections=100, per_host=4, model_concurrency=16, timeout=15):
+        self.client = client
+        self.cache = cache
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.model_concurrency = model_concurrency
+        self.timeout = timeout
+        self.http = None
+        self._hosts = {}
+        self._model_slots = None
+        self._fetch_slots = None
+
+    async def __aenter__(self):
+        import httpx
+        self.http = httpx.AsyncClient(
+            http2=http2_available(),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            # Waiting for a pooled connection is bounded by _fetch_slots, not a timeout
+            timeout=httpx.Timeout(self.timeout, pool=None),
+            follow_redirects=True,
+            headers={'User-Agent': USER_AGENT},
+        )
+        self._model_slots = asyncio.Semaphore(self.model_concurrency)
+        # At most one in-flight request per pooled connection, so queued URLs wait here
+        # instead of timing out in the pool and being escalated to a browser
+        self._fetch_slots = asyncio.Semaphore(self.max_connections)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+
+    def _host_slots(self, url):
+        host = urlsplit(url).hostname or ''
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def fetch(self, url):
+        """GET url over the shared connection pool; returns the httpx response."""
+        with span('http_fetch', url=url) as s:
+            async with self._host_slots(url), self._fetch_slots:
+                response = await self.http.get(url)
+            s.set(status=response.status_code, http_version=response.http_version, bytes=len(response.content))
+            return response
+
+    async def generate(self, model, prompt, content):
+        async with self._model_slots:
+            if self.cache is not None:
+                return await self.cache.agenerate(self.client, model, prompt, content)
+            response = await self.client.aio.models.generate_content(model=model, contents=f"{prompt}\n\n{content}")
+            return response.text
+
+    async def fetch_page(self, url, retries=2):
+        """(text, reason) like FetchTier.fetch_http, retrying 5xx answers with backoff.
+
+        Raises PageGone for 404 and 410; reason says why the text can't be trusted without a browser.
+        """
+        for attempt in range(retries + 1):
+            response = await self.fetch(url)
+            if response.status_code < 500 or attempt == retries:
+                break
+            await asyncio.sleep(2 ** attempt)
+        if response.status_code in GONE_STATUS:
+            raise PageGone(f"HTTP {response.status_code}")
+        return escalation_reason(response.status_code, response.headers, response.text,
+                                 response.headers.get('content-type', '').lower())
+
+    async def check_applicable(self, url, user_info, token_budget=DEFAULT_TOKEN_BUDGET):
+        """Async is_scholarship_applicable: True unless Gemini says the grade level doesn't fit.
+
+        Raises PageGone for 404 and 410. Error pages and bot walls are never
+        sent to Gemini; like any other failed check they count as applicable.
+        """
+        try:
+            text, reason = await self.fetch_page(url)
+            if reason:
+                print(f"Could not check applicability of {url}: {reason}")
+                return True
+            prompt = f"Based on the following page text, is this scholarship applicable for a {user_info['grade_level']} student? Answer with 'yes' or 'no' only."
+            answer = await self.generate(APPLICABILITY_MODEL, prompt, compact_page_text(text, token_budget))
+            return 'yes' in answer.lower()
+        except PageGone:
+            raise
+        except Exception as e:
+            print(f"Could not check applicability of {url}: {e}")
+            return True  # If can't check, assume applicable
+
+    async def triage_one(self, url, store, preclassifier=None, token_budget=DEFAULT_TOKEN_BUDGET):
+        """Fetch and classify one link; returns a reason string if it needs a browser instead."""
+        try:
+            response = await self.fetch(url)
+        except Exception as e:
+            # Timeouts and TLS quirks often work fine in a real browser
+            return f"HTTP fetch failed: {type(e).__name__}"
+        if response.status_code in GONE_STATUS:
+            # A browser would get the same 404
+            record_link_status(store, url, 'not found', f"Page no longer exists (HTTP {response.status_code})")
+            print(f"Saved {url} with status: not found (HTTP {response.status_code})")
+            return None
+        text, reason = escalation_reason(response.status_code, response.headers, response.text,
+                                         response.headers.get('content-type', '').lower())
+        if reason:
+            return reason
+        decision = preclassifier.classify(text) if preclassifier is not None else None
+        if decision is not None:
+            status, details = decision
+            record_link_status(store, url, status, f"Local pre-classifier: {details}")
+            print(f"Saved {url} with status: {status} (no Gemini call)")
+            return None
+        try:
+            with span('classify', url=url) as s:
+                analysis = await self.generate(TRIAGE_MODEL, TRIAGE_PROMPT, compact_page_text(text, token_budget))
+                status, details = parse_triage_response(analysis)
+                s.set(status=status)
+        except Exception as e:
+            # Leave the link unrecorded so the next run retries it
+            print(f"Gemini classification failed for {url}: {e}")
+            return None
+        record_link_status(store, url, status, details)
+        if preclassifier is not None:
+            preclassifier.record_label(text, status, details)
+        print(f"Saved {url} with status: {status}")
+        return None
+
+    async def triage(self, urls, store, preclassifier=None, token_budget=DEFAULT_TOKEN_BUDGET):
+        """Triage every URL concurrently; returns [(url, reason)] for pages that need a browser."""
+        reasons = await asyncio.gather(*(self.triage_one(url, store, preclassifier, token_budget) for url in urls))
+        return [(url, reason) for url, reason in zip(urls, reasons) if reason]
+
+
+def triage_links_async(links, client, store, cache=None, preclassifier=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                       max_connections=100, per_host=4, model_concurrency=16):
+    """Triage links over async HTTP; returns the links that still need a browser."""
+    async def run():
+        async with AsyncEngine(client, cache, max_connections, per_host, model_concurrency) as engine:
+            return await engine.triage(links, store, preclassifier, token_budget)
+
+    escalated = asyncio.run(run())
+    for url, reason in escalated:
+        print(f"{url} needs a browser: {reason}")
+    print(f"Async triage: {len(links) - len(escalated)} of {len(links)} link(s) handled without a browser.")
+    return [url for url, _ in escalated]
+
+
+def check_applicable_all(urls, client, user_info, cache=None, **limits):
+    """Run the applicability check for many URLs at once; returns {url: bool}, False for pages that are gone."""
+    async def check(engine, url):
+        try:
+            return await engine.check_applicable(url, user_info)
+        except PageGone as e:
+            print(f"{url} no longer exists ({e})")
+            return False
+
+    async def run():
+        async with AsyncEngine(client, cache, **limits) as engine:
+            results = await asyncio.gather(*(check(engine, url) for url in urls))
+        return dict(zip(urls, results))
+
+    return asyncio.run(run())
@@ -0,0 +1,187 @@
+"""Headless batch mode: search -> triage -> fill, driven by a JSON job file.
+
+Nothing in a batch run waits on input(). Sites that need a human (CAPTCHA,
+login, unreadable form) are added to the review queue in links.db and the run
+moves on. See batch_job.example.json for the job file format.
+
+Usage: python batch.py job.json
+"""
+import argparse
+import json
+import os
+import sys
+from async_engine import triage_links_async
+from browser_pool import BrowserPool
+from link_store import open_link_store
+from preclassifier import PreClassifier
+from query_plan import expand_queries, run_query_plan
+from search_providers import FIXTURE_DIR, get_provider
+from prompt_compaction import DEFAULT_TOKEN_BUDGET
+from triage import triage_links
+import tracing
+from main import (
+    REQUIRED_FIELDS, build_search_query, extract_text_from_file, fill_application, get_cache, get_client,
+    get_templates, load_essays, load_user_info
+)
+
+DEFAULT_JOB = {
+    'profile': 'user_info.txt',
+    'essays': 'essay{}.txt',
+    'transcript': None,
+    'queries': [],
+    'trace': None,
+    'search': {'provider': 'google', 'fixtures': FIXTURE_DIR, 'record': False,
+               'expand_profile': False, 'max_queries': 20, 'pages': 2, 'per_page': 10, 'workers': 4},
+    'triage': {'enabled': True, 'engine': 'async', 'max_connections': 100, 'per_host': 4,
+               'fetch_workers': 4, 'model_workers': 4,
+               'token_budget': DEFAULT_TOKEN_BUDGET, 'preclassifier': True, 'http_first': True},
+    'fill': {'enabled': False, 'submit': False, 'max_applications': None},
+}
+
+
+def load_job(path):
+    """Read a job file and fill in defaults for anything it leaves out."""
+    with open(path, 'r') as f:
+        job = json.load(f)
+    for key, default in DEFAULT_JOB.items():
+        if isinstance(default, dict):
+            job[key] = {**default, **job.get(key, {})}
+        else:
+            job.setdefault(key, default)
+    return job
+
+
+def load_profile(job):
+    """Build user_info from the job without prompting; raises ValueError if incomplete."""
+    profile = job['profile']
+    info = dict(profile) if isinstance(profile, dict) else load_user_info(profile)
+    missing = [key for key in REQUIRED_FIELDS if not info.get(key)]
+    if missing:
+        raise ValueError(f"Profile is missing required fields: {', '.join(missing)}")
+    info['essays'] = load_essays(job['essays'])
+    transcript_path = job['transcript'] or info.get('transcript_path')
+    if transcript_path and not job['transcript'] and isinstance(profile, str) and not os.path.isabs(transcript_path):
+        # A profile file's transcript_path is relative to the profile, not the working directory
+        transcript_path = os.path.join(os.path.dirname(os.path.abspath(profile)), transcript_path)
+    info['transcript'] = extract_text_from_file(transcript_path) if transcript_path else "N/A"
+    return info
+
+
+def job_queries(job, user_info):
+    """The job's queries for one profile, plus profile-derived ones when expand_profile is set."""
+    queries = []
+    for entry in job['queries']:
+        if isinstance(entry, str):
+            entry = {'query': entry}
+        queries.append(build_search_query(entry['query'], entry.get('omit', ''), user_info))
+    if job['search']['expand_profile']:
+        queries += [q for q in expand_queries(user_info, max_queries=job['search']['max_queries']) if q not in queries]
+    return queries
+
+
+def search_links(job, queries, store):
+    """Run queries as one query plan and return new, deduplicated result links, best first."""
+    search = job['search']
+    if search['provider'] == 'selenium':
+        raise ValueError("Batch mode can't use the selenium search provider; use google, api or replay")
+    provider = get_provider(search['provider'], fixture_dir=search['fixtures'], record=search['record'])
+    return run_query_plan(queries, search_page=provider, pages=search['pages'], per_page=search['per_page'],
+                          max_workers=search['workers'], skip=store.has)
+
+
+def collect_links(job, user_info, store):
+    """Run the job's query plan and return new, deduplicated result links, best first."""
+    return search_links(job, job_queries(job, user_info), store)
+
+
+def triage_new_links(job, links, store, client, cache):
+    """Classify links into the store per the job's triage policy."""
+    triage = job['triage']
+    if not triage['enabled'] or not links:
+        return
+    preclassifier = PreClassifier() if triage['preclassifier'] else None
+    remaining = links
+    if triage['engine'] == 'async':
+        remaining = triage_links_async(links, client, store, cache=cache, preclassifier=preclassifier,
+                                       token_budget=triage['token_budget'],
+                                       max_connections=triage['max_connections'], per_host=triage['per_host'])
+    # driver=None: CAPTCHA sites go to the review queue instead of a visible browser
+    if remaining:
+        triage_links(remaining, client, store, None,
+                     fetch_workers=triage['fetch_workers'], model_workers=triage['model_workers'],
+                     cache=cache, token_budget=triage['token_budget'], preclassifier=preclassifier,
+                     # Links the async engine escalated already failed over plain HTTP
+                     http_first=triage['engine'] == 'threads' and triage['http_first'])
+
+
+def fill_links(job, urls, user_info, state, essay_service=None):
+    """Fill each url headless; completions and reviews go to state. Returns how many reached a submit."""
+    fill = job['fill']
+    filled = 0
+    browsers = BrowserPool(size=1, headless=True)
+    try:
+        for url in urls:
+            try:
+                if fill_application(url, user_info, test=not fill['submit'], browsers=browsers,
+                                    interactive=False, store=state, essay_service=essay_service):
+                    filled += 1
+                    if fill['submit']:
+                        state.upsert(url, 'completed', 'Submitted in batch mode')
+            except Exception as e:
+                print(f"Filling {url} failed: {e}")
+                state.add_review(url, 'fill', f"Error: {e}")
+    finally:
+        browsers.close()
+    return filled
+
+
+def print_template_stats():
+    stats = get_templates().stats()
+    print(f"Form templates: {stats['hits']} reused, {stats['misses']} analyzed with Gemini vision.")
+
+
+def print_reviews(reviews):
+    for url, stage, reason in reviews:
+        print(f"  [{stage}] {url}: {reason}")
+
+
+def run_batch(job):
+    tracing.configure(job['trace'])
+    user_info = load_profile(job)
+    client, cache = get_client(), get_cache()
+    store = open_link_store()
+    try:
+        links = collect_links(job, user_info, store)
+        print(f"Search found {len(links)} new link(s).")
+        triage_new_links(job, links, store, client, cache)
+
+        filled = 0
+        if job['fill']['enabled']:
+            # Links waiting in the fill review queue need a human first, not another attempt
+            blocked = {url for url, _, _ in store.pending_reviews('fill')}
+            urls = [url for url in store.urls_with_status('open') if url not in blocked]
+            filled = fill_links(job, urls[:job['fill']['max_applications']], user_info, store)
+            print_template_stats()
+
+        reviews = store.pending_reviews()
+        print(f"Batch finished: {len(links)} triaged, {filled} filled, {len(reviews)} waiting for review.")
+        print_reviews(reviews)
+        print(tracing.report())
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run search, triage and form filling headless from a job file')
+    parser.add_argument('job', help='Path to a JSON job file (see batch_job.example.json)')
+    args = parser.parse_args()
+    try:
+        job = load_job(args.job)
+        run_batch(job)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
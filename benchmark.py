@@ -0,0 +1,361 @@
+"""Benchmark search, triage and form filling against a local site and a fake Gemini.
+
+Serves the saved scholarship pages and the two-step application form in
+bench_site/ from a local HTTP server, replays recorded search results, and
+swaps Gemini for FakeGemini, which answers instantly after a configurable
+latency. Nothing touches the network and no API quota is used.
+
+Reports per-stage latency percentiles, throughput, WebDriver command counts
+and model call counts. Save a run with --save and compare a later run
+against it with --baseline to see regressions as numbers.
+
+--startup instead times the quick CLI commands in fresh interpreters against
+STARTUP_BUDGET and checks that `import main` loads none of HEAVY_MODULES.
+
+Usage: python benchmark.py [--iterations 5] [--links 20] [--model-latency 0.5]
+       python benchmark.py --startup
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+import tracing
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_site')
+TRIAGE_PAGES = ['scholarship_open.html', 'scholarship_closed.html', 'university_ad.html', 'captcha.html']
+FORM_STEPS = ['apply_step1.html', 'apply_step2.html']
+BENCH_QUERIES = [
+    'engineering scholarships for high school seniors',
+    'computer science scholarships California',
+    'STEM scholarships for women',
+]
+BENCH_PROFILE = {
+    'name': 'Alex Rivera', 'grade_level': 'high school senior', 'gender': 'Female', 'race': 'Hispanic',
+    'ethnicity': 'Mexican American', 'school': 'Gilroy High School', 'gpa_weighted': '4.1',
+    'gpa_unweighted': '3.8', 'resident': 'yes', 'city': 'Gilroy', 'state': 'California',
+    'essays': ['I built a robot that sorts recycling for my school cafeteria.'], 'transcript': 'N/A',
+}
+
+# Modules `import main` must leave alone; the commands that need them import them
+HEAVY_MODULES = ['selenium', 'webdriver_manager', 'google.genai', 'googlesearch', 'pdfplumber', 'httpx', 'requests']
+# p50 wall-clock seconds per command, interpreter start included
+STARTUP_BUDGET = {'import main': 0.2, 'main.py --help': 0.25, 'main.py report': 0.25}
+
+
+class _SiteHandler(SimpleHTTPRequestHandler):
+    """Serves bench_site/; ?n=<id> makes each listing's text unique so the cache can't collapse them."""
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=SITE_DIR, **kwargs)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(self.path)
+        if not parts.query or not parts.path.endswith('.html'):
+            return super().do_GET()
+        path = self.translate_path(parts.path)
+        if not os.path.exists(path):
+            return self.send_error(404)
+        with open(path, 'rb') as f:
+            body = f.read().replace(b'</body>', f"<p>Listing reference {parts.query}</p></body>".encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_site(port=0, latency=0.0):
+    """Serve bench_site/ on localhost in a background thread; returns (server, base_url)."""
+    handler = type('SiteHandler', (_SiteHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class FakeGemini:
+    """Stands in for genai.Client: sleeps for the configured latency, then answers.
+
+    Triage prompts get an open/closed/not found verdict from the page text,
+    screenshot analyses get the form description set in form_analysis, and
+    everything else (essays) gets a fixed paragraph.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.form_analysis = '{}'
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def models(self):
+        return self
+
+    def _answer(self, contents):
+        if isinstance(contents, list):
+            return self.form_analysis
+        text = contents.lower()
+        if 'summarize in json' in text:
+            # Judge only the page text, not the prompt in front of it
+            text = text.split('\n\n', 1)[-1]
+            if 'closed' in text or 'no longer accepting' in text:
+                return '{"status": "closed", "details": "Deadline has passed"}'
+            if 'apply now' in text:
+                return '{"status": "open", "details": "Accepting applications"}'
+            return '{"status": "not found", "details": "Not a general scholarship"}'
+        return "Building a recycling robot taught me to break a messy problem into parts I could test."
+
+    def generate_content(self, model, contents, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+        return SimpleNamespace(text=self._answer(contents))
+
+
+def counting_pool(counter):
+    """BrowserPool subclass whose browsers count every WebDriver command they send."""
+    from browser_pool import BrowserPool
+
+    class CountingBrowserPool(BrowserPool):
+        def _launch(self):
+            driver = super()._launch()
+            execute = driver.execute
+
+            @functools.wraps(execute)
+            def counted(command, params=None):
+                with counter['lock']:
+                    counter['commands'] += 1
+                return execute(command, params)
+            # Elements send their commands through their parent driver, so this sees everything
+            driver.execute = counted
+            return driver
+
+    return CountingBrowserPool
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def write_serp_fixtures(fixture_dir, base_url, num_links):
+    """Record one result list per bench query pointing at the local site."""
+    from search_providers import ReplayProvider
+    replay = ReplayProvider(fixture_dir)
+    os.makedirs(fixture_dir, exist_ok=True)
+    links = [f"{base_url}/{TRIAGE_PAGES[i % len(TRIAGE_PAGES)]}?n={i}" for i in range(num_links)]
+    for offset, query in enumerate(BENCH_QUERIES):
+        # Overlapping, shifted lists so the query plan has duplicates to merge
+        results = links[offset:] + links[:offset]
+        with open(replay.fixture_path(query), 'w') as f:
+            json.dump({'query': query, 'results': results}, f, indent=2)
+
+
+def run_benchmark(iterations=5, num_links=20, model_latency=0.5, model_jitter=0.2, server_latency=0.0,
+                  fetch_workers=4, model_workers=4, warm_cache=False, preclassifier=False):
+    """Run search -> triage -> fill `iterations` times and return the collected numbers."""
+    import main
+    from essay_service import EssayService
+    from form_templates import FormTemplateStore
+    from gemini_cache import GeminiCache
+    from link_store import LinkStore
+    from preclassifier import PreClassifier
+    from query_plan import run_query_plan
+    from search_providers import ReplayProvider
+    from triage import triage_links
+
+    tracing.configure()
+    workdir = tempfile.mkdtemp(prefix='scholarship-bench-')
+    server, base_url = start_site(latency=server_latency)
+    fake = FakeGemini(model_latency, model_jitter)
+    counter = {'commands': 0, 'lock': threading.Lock()}
+    pool_class = counting_pool(counter)
+    stages = {name: {'samples': [], 'items': 0, 'commands': 0, 'model_calls': 0}
+              for name in ('search', 'triage', 'fill')}
+    fixture_dir = os.path.join(workdir, 'serp')
+    write_serp_fixtures(fixture_dir, base_url, num_links)
+    provider = ReplayProvider(fixture_dir, strict=True)
+    fetch_browsers = pool_class(size=fetch_workers, headless=True, page_load_timeout=20)
+    fill_browsers = pool_class(size=1, headless=True)
+    cwd = os.getcwd()
+    # Keep anything the pipeline writes relative to the working directory inside workdir
+    os.chdir(workdir)
+    try:
+        for i in range(iterations):
+            store = LinkStore(os.path.join(workdir, f"links_{i}.db"))
+            cache_path = os.path.join(workdir, 'cache.db' if warm_cache else f"cache_{i}.db")
+            cache = GeminiCache(cache_path)
+            templates = FormTemplateStore(os.path.join(workdir, 'templates.db' if warm_cache else f"templates_{i}.db"))
+            main.templates = templates
+            main.client = fake
+            main.cache = cache
+            main.essay_service = EssayService(fake, library_path=os.path.join(workdir, f"essays_{i}.json"))
+
+            def measure(stage, items, fn):
+                commands, calls = counter['commands'], fake.calls
+                started = time.perf_counter()
+                result = fn()
+                stages[stage]['samples'].append(time.perf_counter() - started)
+                stages[stage]['items'] += items
+                stages[stage]['commands'] += counter['commands'] - commands
+                stages[stage]['model_calls'] += fake.calls - calls
+                return result
+
+            links = measure('search', len(BENCH_QUERIES), lambda: run_query_plan(
+                BENCH_QUERIES, search_page=provider, pages=1, per_page=num_links, skip=store.has))
+            measure('triage', len(links), lambda: triage_links(
+                links, fake, store, None, fetch_workers=fetch_workers, model_workers=model_workers,
+                cache=cache, browsers=fetch_browsers,
+                # No audit sampling, so model-call counts are the same from run to run
+                preclassifier=PreClassifier(os.path.join(workdir, 'labels.jsonl'), audit_rate=0) if preclassifier else None))
+            for step in FORM_STEPS:
+                with open(os.path.join(SITE_DIR, step.replace('.html', '.json')), 'r') as f:
+                    fake.form_analysis = f.read()
+                measure('fill', 1, lambda: main.fill_application(
+                    f"{base_url}/{step}", BENCH_PROFILE, test=False, browsers=fill_browsers,
+                    interactive=False, store=store))
+            store.close()
+            cache.close()
+            templates.close()
+    finally:
+        os.chdir(cwd)
+        fetch_browsers.close()
+        fill_browsers.close()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {'config': {
+        'iterations': iterations, 'links': num_links, 'model_latency': model_latency,
+        'model_jitter': model_jitter, 'server_latency': server_latency, 'fetch_workers': fetch_workers,
+        'model_workers': model_workers, 'warm_cache': warm_cache, 'preclassifier': preclassifier,
+    }, 'stages': {}}
+    for name, stage in stages.items():
+        total = sum(stage['samples'])
+        results['stages'][name] = {
+            'p50': percentile(stage['samples'], 50),
+            'p90': percentile(stage['samples'], 90),
+            'p99': percentile(stage['samples'], 99),
+            'throughput': stage['items'] / total if total else 0.0,
+            'webdriver_commands': stage['commands'],
+            'model_calls': stage['model_calls'],
+            'runs': len(stage['samples']),
+        }
+    return results
+
+
+def print_report(results, baseline=None):
+    print(f"\n--- Benchmark ({results['config']['iterations']} iterations, {results['config']['links']} links) ---")
+    print(f"{'stage':<8}{'p50 s':>9}{'p90 s':>9}{'p99 s':>9}{'items/s':>10}{'WebDriver':>11}{'model':>7}")
+    for name, stage in results['stages'].items():
+        print(f"{name:<8}{stage['p50']:>9.3f}{stage['p90']:>9.3f}{stage['p99']:>9.3f}"
+              f"{stage['throughput']:>10.2f}{stage['webdriver_commands']:>11}{stage['model_calls']:>7}")
+        old = (baseline or {}).get('stages', {}).get(name)
+        if old and old['p50']:
+            change = (stage['p50'] - old['p50']) / old['p50']
+            print(f"{'':<8}p50 {change:+.0%} vs baseline, "
+                  f"WebDriver {stage['webdriver_commands'] - old['webdriver_commands']:+d}, "
+                  f"model {stage['model_calls'] - old['model_calls']:+d}")
+
+
+def run_startup_benchmark(repeats=10):
+    """Time each STARTUP_BUDGET command in fresh interpreters; returns (results, heavy modules main loaded)."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    main_path = os.path.join(repo, 'main.py')
+    commands = {
+        'import main': ['-c', 'import main'],
+        'main.py --help': [main_path, '--help'],
+        'main.py report': [main_path, 'report'],
+    }
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo, os.environ.get('PYTHONPATH')])))
+    # An empty working directory, so report opens a fresh links.db
+    workdir = tempfile.mkdtemp(prefix='scholarship-startup-')
+    try:
+        results = {}
+        for name, argv in commands.items():
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                subprocess.run([sys.executable] + argv, cwd=workdir, env=env, stdout=subprocess.DEVNULL, check=True)
+                samples.append(time.perf_counter() - started)
+            results[name] = {'p50': percentile(samples, 50), 'max': max(samples), 'budget': STARTUP_BUDGET[name]}
+        probe = "import sys, main; print(' '.join(name for name in sys.argv[1:] if name in sys.modules))"
+        loaded = subprocess.run([sys.executable, '-c', probe] + HEAVY_MODULES, cwd=workdir, env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results, loaded
+
+
+def print_startup_report(results, loaded):
+    """Print startup times against the budget; returns False if anything is over it."""
+    print("\n--- Startup ---")
+    print(f"{'command':<16}{'p50 s':>9}{'max s':>9}{'budget s':>10}")
+    ok = not loaded
+    for name, result in results.items():
+        over = result['p50'] > result['budget']
+        ok = ok and not over
+        print(f"{name:<16}{result['p50']:>9.3f}{result['max']:>9.3f}{result['budget']:>10.2f}{'  OVER' if over else ''}")
+    if loaded:
+        print(f"`import main` loaded heavy modules: {', '.join(loaded)}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark search, triage and form filling offline')
+    parser.add_argument('--startup', action='store_true', help='Only check CLI startup time against STARTUP_BUDGET')
+    parser.add_argument('--iterations', type=int, default=5, help='Full search -> triage -> fill runs')
+    parser.add_argument('--links', type=int, default=20, help='Search results triaged per run')
+    parser.add_argument('--model-latency', type=float, default=0.5, help='Seconds each fake Gemini call takes')
+    parser.add_argument('--model-jitter', type=float, default=0.2, help='Extra random seconds per fake Gemini call')
+    parser.add_argument('--server-latency', type=float, default=0.0, help='Seconds the local site waits per request')
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--model-workers', type=int, default=4)
+    parser.add_argument('--warm-cache', action='store_true', help='Share the Gemini cache and form templates across iterations')
+    parser.add_argument('--preclassifier', action='store_true', help='Run the local pre-classifier during triage')
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against results saved earlier with --save')
+    args = parser.parse_args()
+
+    if args.startup:
+        if not print_startup_report(*run_startup_benchmark()):
+            sys.exit(1)
+        return
+    results = run_benchmark(args.iterations, args.links, args.model_latency, args.model_jitter,
+                            args.server_latency, args.fetch_workers, args.model_workers,
+                            args.warm_cache, args.preclassifier)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(tracing.report())
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import queue
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """Resolve the chromedriver binary once per process instead of on every launch."""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+class BrowserPool:
+    """Keeps up to `size` warm Chrome instances and hands them out one at a time.
+
+    Each browser has its own temporary profile and is reset (cookies, storage,
+    extra tabs) before it is handed out again, so every application starts from
+    a clean context. Browsers are replaced after max_uses sessions or when they
+    stop responding.
+    """
+
+    def __init__(self, size=1, max_uses=20, headless=False, page_load_timeout=None):
+        self.size = size
+        self.max_uses = max_uses
+        self.headless = headless
+        self.page_load_timeout = page_load_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._uses = {}
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _launch(self):
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless=new')
+        profile_dir = tempfile.mkdtemp(prefix='scholarship-chrome-')
+        options.add_argument(f'--user-data-dir={profile_dir}')
+        driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=options)
+        if self.page_load_timeout:
+            driver.set_page_load_timeout(self.page_load_timeout)
+        with self._lock:
+            self._uses[driver] = 0
+            self._profiles[driver] = profile_dir
+        return driver
+
+    def _retire(self, driver):
+        with self._lock:
+            self._uses.pop(driver, None)
+            profile_dir = self._profiles.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            return bool(driver.window_handles)
+        except Exception:
+            return False
+
+    @staticmethod
+    def visited_origins(driver):
+        """http(s) origins in the current tab's navigation history."""
+        origins = set()
+        for entry in driver.execute_cdp_cmd('Page.getNavigationHistory', {})['entries']:
+            parts = urlsplit(entry['url'])
+            if parts.scheme in ('http', 'https'):
+                origins.add(f"{parts.scheme}://{parts.netloc}")
+        return origins
+
+    @classmethod
+    def reset_context(cls, driver):
+        """Close extra tabs and clear cookies, cache and storage from the last session.
+
+        Storage is cleared per origin for every origin in the tabs' history.
+        Errors are raised so acquire() replaces the browser instead of handing
+        out one with the last student's storage.
+        """
+        handles = driver.window_handles
+        origins = set()
+        for handle in reversed(handles):
+            driver.switch_to.window(handle)
+            origins |= cls.visited_origins(driver)
+            if handle != handles[0]:
+                driver.close()
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+        for origin in sorted(origins):
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        driver.get('about:blank')
+        # The next reset only needs the origins visited after this one
+        driver.execute_cdp_cmd('Page.resetNavigationHistory', {})
+
+    def acquire(self):
+        """Return a clean, healthy browser, waiting if all of them are in use."""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self._launch()
+                    break
+                if self._uses.get(driver, 0) >= self.max_uses or not self.is_healthy(driver):
+                    self._retire(driver)
+                    continue
+                try:
+                    self.reset_context(driver)
+                    break
+                except Exception as e:
+                    print(f"Could not reset a pooled browser ({type(e).__name__}: {e}); starting a fresh one.")
+                    self._retire(driver)
+            with self._lock:
+                self._uses[driver] += 1
+            return driver
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver):
+        """Give a browser back to the pool."""
+        if self._closed or not self.is_healthy(driver):
+            self._retire(driver)
+        else:
+            self._idle.put(driver)
+        self._slots.release()
+
+    @contextmanager
+    def session(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """Quit every idle browser; ones still in use are quit when released."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(driver)
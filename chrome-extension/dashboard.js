@@ -223,6 +223,40 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   });
 
+  // Shared Gemini pacing: the gap between reviews grows on 429s and shrinks on success
+  const geminiPacing = { delayMs: 1000, minDelayMs: 500, maxDelayMs: 60000 };
+  const maxGeminiRetries = 5;
+
+  function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+  }
+
+  // POST to Gemini, retrying rate limits and server errors with jittered exponential backoff
+  async function callGemini(apiKey, body) {
+    for (let attempt = 0; ; attempt++) {
+      const r = await fetch('https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=' + apiKey, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+      });
+      const data = await r.json().catch(() => ({}));
+      const code = (data && data.error && data.error.code) || r.status;
+      const retryable = code === 429 || code >= 500;
+      if (code === 429) {
+        geminiPacing.delayMs = Math.min(geminiPacing.maxDelayMs, geminiPacing.delayMs * 2);
+      }
+      if (!retryable || attempt >= maxGeminiRetries) {
+        if (!retryable) {
+          geminiPacing.delayMs = Math.max(geminiPacing.minDelayMs, Math.round(geminiPacing.delayMs * 0.9));
+        }
+        return data;
+      }
+      const backoff = Math.random() * Math.min(geminiPacing.maxDelayMs, 1000 * 2 ** attempt);
+      searchStatus.textContent = `Gemini rate limited (${code}), retrying in ${(backoff / 1000).toFixed(1)}s...`;
+      await sleep(backoff);
+    }
+  }
+
   // Review link with Gemini
   async function reviewLinkWithGemini(link, idx, cb) {
     searchStatus.textContent = `Reviewing: ${link}`;
@@ -242,15 +276,10 @@ document.addEventListener('DOMContentLoaded', () => {
               func: () => document.body.innerText.slice(0, 5000)
             }, (results) => {
               const pageText = results && results[0] && results[0].result;
-              // Call Gemini API
-              fetch('https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=' + apiKey, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                  contents: [{ parts: [{ text: `Classify this page as a scholarship opportunity (open) if the application seems to be open, closed if you see the scholarship is past its due date, not found if you can't find a place to apply for the scholarship, or ad. If the scholarship is only available to students of a specific college or university, classify it as an ad. Respond with only one of: open, closed, not found, ad.\n\n${pageText}` }] }]
-                })
+              // Call Gemini API (retries 429/5xx with backoff)
+              callGemini(apiKey, {
+                contents: [{ parts: [{ text: `Classify this page as a scholarship opportunity (open) if the application seems to be open, closed if you see the scholarship is past its due date, not found if you can't find a place to apply for the scholarship, or ad. If the scholarship is only available to students of a specific college or university, classify it as an ad. Respond with only one of: open, closed, not found, ad.\n\n${pageText}` }] }]
               })
-                .then(r => r.json())
                 .then((data) => {
                   // Check for Gemini API rate limit error
                   if (data && data.error && data.error.code === 429) {
@@ -302,7 +331,6 @@ document.addEventListener('DOMContentLoaded', () => {
   reviewAllBtn.addEventListener('click', async () => {
     chrome.storage.local.get(['scholarshipLinks'], (result) => {
       const links = result.scholarshipLinks || [];
-      const delayMs = 2500; // 2.5 seconds between requests to avoid rate limits
       function reviewNext(i) {
         if (i >= links.length) {
           searchStatus.textContent = 'All links reviewed.';
@@ -310,7 +338,8 @@ document.addEventListener('DOMContentLoaded', () => {
           return;
         }
         reviewLinkWithGemini(links[i].url, i, () => {
-          setTimeout(() => reviewNext(i + 1), delayMs);
+          // Adaptive gap instead of a fixed 2.5s wait (see callGemini)
+          setTimeout(() => reviewNext(i + 1), geminiPacing.delayMs);
         });
       }
       reviewNext(0);
@@ -0,0 +1,149 @@
+from selenium.webdriver.common.by import By
+
+# Collects every input, select and textarea in one execute_script call, with
+# labels resolved in the page so no per-element WebDriver round-trips are needed.
+SNAPSHOT_SCRIPT = r"""
+function cssEscape(value) {
+    return (window.CSS && CSS.escape) ? CSS.escape(value) : value.replace(/([^a-zA-Z0-9_-])/g, '\\$1');
+}
+function uniqueSelector(el) {
+    if (el.id && document.querySelectorAll('#' + cssEscape(el.id)).length === 1) {
+        return '#' + cssEscape(el.id);
+    }
+    var tag = el.tagName.toLowerCase();
+    var name = el.getAttribute('name');
+    if (name) {
+        var byName = tag + '[name="' + name.replace(/"/g, '\\"') + '"]';
+        if (document.querySelectorAll(byName).length === 1) return byName;
+    }
+    var parts = [];
+    var node = el;
+    while (node && node.nodeType === 1 && node !== document.documentElement) {
+        var index = 1;
+        var sibling = node.previousElementSibling;
+        while (sibling) {
+            if (sibling.tagName === node.tagName) index++;
+            sibling = sibling.previousElementSibling;
+        }
+        parts.unshift(node.tagName.toLowerCase() + ':nth-of-type(' + index + ')');
+        node = node.parentElement;
+    }
+    return 'html > ' + parts.join(' > ');
+}
+function labelFor(el) {
+    if (el.id) {
+        var forLabel = document.querySelector('label[for="' + el.id.replace(/"/g, '\\"') + '"]');
+        if (forLabel) return forLabel.innerText;
+    }
+    var wrapping = el.closest('label');
+    if (wrapping) return wrapping.innerText;
+    var labelledBy = el.getAttribute('aria-labelledby');
+    if (labelledBy) {
+        var text = labelledBy.split(/\s+/).map(function (id) {
+            var ref = document.getElementById(id);
+            return ref ? ref.innerText : '';
+        }).join(' ');
+        if (text.trim()) return text;
+    }
+    return el.getAttribute('aria-label') || '';
+}
+var fields = [];
+document.querySelectorAll('input, select, textarea').forEach(function (el) {
+    var rect = el.getBoundingClientRect();
+    var style = window.getComputedStyle(el);
+    fields.push({
+        tag: el.tagName.toLowerCase(),
+        type: (el.getAttribute('type') || el.tagName).toLowerCase(),
+        name: el.getAttribute('name') || '',
+        id: el.id || '',
+        placeholder: el.getAttribute('placeholder') || '',
+        label: (labelFor(el) || '').trim(),
+        value: el.value || '',
+        options: el.tagName === 'SELECT'
+            ? Array.prototype.map.call(el.options, function (o) { return {text: o.text.trim(), value: o.value}; })
+            : [],
+        visible: rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none',
+        selector: uniqueSelector(el)
+    });
+});
+return fields;
+"""
+
+# Input types that never take typed text
+NON_TEXT_TYPES = {'hidden', 'submit', 'button', 'reset', 'image', 'checkbox', 'radio', 'file'}
+
+# Ordered (keyword, user_info key) rules for text fields; first match wins
+TEXT_FIELD_RULES = [
+    ('name', 'name'),
+    ('school', 'school'),
+    ('gpa', 'gpa_weighted'),
+    ('email', 'email'),
+]
+
+SELECT_FIELD_RULES = [
+    ('race', 'race'),
+    ('ethnicity', 'ethnicity'),
+    ('gender', 'gender'),
+]
+
+
+def take_form_snapshot(driver):
+    """Return every input, select and textarea on the page as a list of dicts."""
+    return driver.execute_script(SNAPSHOT_SCRIPT) or []
+
+
+def field_text(field):
+    """Lowercased name, id, label and placeholder of a field joined for keyword matching."""
+    return ' '.join([field['name'], field['id'], field['label'], field['placeholder']]).lower()
+
+
+def is_text_input(field):
+    """True for visible inputs and textareas that accept typed text."""
+    return field['tag'] != 'select' and field['visible'] and field['type'] not in NON_TEXT_TYPES
+
+
+def is_essay_field(field):
+    text = field_text(field)
+    return 'essay' in text or 'personal statement' in field['label'].lower()
+
+
+def essay_prompt_for(field):
+    """Best available prompt text for an essay field."""
+    return (field['label'] or field['placeholder'] or field['name'] or field['id']).lower()
+
+
+def match_text_field(field, user_info):
+    """Return the user_info key a text field should be filled from, or None."""
+    if not is_text_input(field):
+        return None
+    text = field_text(field)
+    for keyword, key in TEXT_FIELD_RULES:
+        if keyword in text:
+            return key
+    return None
+
+
+def match_select_option(field, user_info):
+    """Return (user_info key, option text) to choose for a select field, or None."""
+    if field['tag'] != 'select':
+        return None
+    text = ' '.join([field['name'], field['label']]).lower()
+    for keyword, key in SELECT_FIELD_RULES:
+        if keyword not in text:
+            continue
+        wanted = (user_info.get(key) or '').strip().lower()
+        if not wanted:
+            return None
+        for option in field['options']:
+            if option['text'].lower() == wanted:
+                return key, option['text']
+        # Fall back to a partial match (e.g. "Female" vs "female (she/her)")
+        for option in field['options']:
+            if wanted in option['text'].lower():
+                return key, option['text']
+        return None
+    return None
+
+
+def find_field_element(driver, field):
+    return driver.find_element(By.CSS_SELECTOR, field['selector'])
@@ -0,0 +1,410 @@
+"""Structured eligibility records for scholarship pages, matched against profiles without a model call.
+
+Each page is parsed once (one Gemini call, cached like triage) into a record:
+grade levels, GPA floor, residency, states, cities, genders, races and
+deadline, normalized to fixed vocabularies and stored in eligibility.db.
+Matching loads the records into bitmaps, one integer per column value with a
+bit per scholarship, so a profile is matched against the whole pool with a
+handful of integer ANDs.
+
+Usage: python eligibility_index.py build [--limit N]
+       python eligibility_index.py match [--profile user_info.txt]
+"""
+import argparse
+import bisect
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from preclassifier import find_dates
+from prompt_compaction import DEFAULT_TOKEN_BUDGET, compact_page_text
+from tracing import span
+
+EXTRACTION_MODEL = 'gemini-3-flash-preview'
+
+GRADE_LEVELS = [
+    'high school freshman', 'high school sophomore', 'high school junior', 'high school senior',
+    'college freshman', 'college sophomore', 'college junior', 'college senior', 'graduate',
+]
+GENDER_WORDS = {
+    'female': ['female', 'woman', 'women', 'girl', 'girls'],
+    'male': ['male', 'man', 'men', 'boy', 'boys'],
+    'non-binary': ['non-binary', 'nonbinary', 'genderqueer', 'gender non-conforming'],
+}
+RACE_WORDS = {
+    'hispanic': ['hispanic', 'latino', 'latina', 'latinx', 'mexican', 'puerto rican', 'cuban'],
+    'black': ['black', 'african american', 'african-american'],
+    'asian': ['asian', 'chinese', 'filipino', 'south asian', 'japanese', 'korean', 'vietnamese'],
+    'native american': ['native american', 'american indian', 'alaska native', 'indigenous', 'tribal'],
+    'pacific islander': ['pacific islander', 'native hawaiian', 'samoan'],
+    'middle eastern': ['middle eastern', 'arab', 'north african'],
+    'white': ['white', 'caucasian'],
+}
+US_STATES = {
+    'AL': 'alabama', 'AK': 'alaska', 'AZ': 'arizona', 'AR': 'arkansas', 'CA': 'california', 'CO': 'colorado',
+    'CT': 'connecticut', 'DE': 'delaware', 'DC': 'district of columbia', 'FL': 'florida', 'GA': 'georgia',
+    'HI': 'hawaii', 'ID': 'idaho', 'IL': 'illinois', 'IN': 'indiana', 'IA': 'iowa', 'KS': 'kansas',
+    'KY': 'kentucky', 'LA': 'louisiana', 'ME': 'maine', 'MD': 'maryland', 'MA': 'massachusetts',
+    'MI': 'michigan', 'MN': 'minnesota', 'MS': 'mississippi', 'MO': 'missouri', 'MT': 'montana',
+    'NE': 'nebraska', 'NV': 'nevada', 'NH': 'new hampshire', 'NJ': 'new jersey', 'NM': 'new mexico',
+    'NY': 'new york', 'NC': 'north carolina', 'ND': 'north dakota', 'OH': 'ohio', 'OK': 'oklahoma',
+    'OR': 'oregon', 'PA': 'pennsylvania', 'RI': 'rhode island', 'SC': 'south carolina', 'SD': 'south dakota',
+    'TN': 'tennessee', 'TX': 'texas', 'UT': 'utah', 'VT': 'vermont', 'VA': 'virginia', 'WA': 'washington',
+    'WV': 'west virginia', 'WI': 'wisconsin', 'WY': 'wyoming',
+}
+HIGH_SCHOOL_GRADES = {'9': 'freshman', '10': 'sophomore', '11': 'junior', '12': 'senior'}
+COLLEGE_YEARS = {'first': 'freshman', 'second': 'sophomore', 'third': 'junior', 'fourth': 'senior'}
+# "Not Hispanic or Latino", "non-Hispanic": groups a value rules out rather than names
+NEGATED_GROUP = re.compile(r'\b(?:not|non)[\s-]+[a-z]+(?:\s+or\s+[a-z]+)?')
+# Columns matched by set membership; an empty list on a record means "open to everyone"
+LIST_COLUMNS = ['grade_levels', 'states', 'cities', 'genders', 'races']
+
+EXTRACTION_PROMPT = (
+    "Extract who is eligible for the scholarship described in the following webpage text. "
+    "Use only what the page states; leave a list empty or a value null when the page doesn't restrict it. "
+    f"grade_levels may only contain: {', '.join(GRADE_LEVELS)}. "
+    "Answer in JSON: {\"grade_levels\": [...], \"min_gpa\": <number on a 4.0 scale or null>, "
+    "\"requires_residency\": <true if applicants must be citizens or permanent residents>, "
+    "\"states\": [...], \"cities\": [...], \"genders\": [...], \"races\": [...], "
+    "\"deadline\": \"YYYY-MM-DD\" or null}"
+)
+
+
+def normalize_grade(text):
+    """Map free text like 'HS senior', '12th grade' or 'undergraduate' onto a list of GRADE_LEVELS.
+
+    An empty list means the text names no grade level we know.
+    """
+    text = (text or '').lower()
+    # Finished high school, not yet in college: applies as an incoming college freshman
+    if re.search(r'high school (graduate|diploma)|graduated (from )?high school', text):
+        return ['college freshman']
+    if 'graduate' in text and 'undergraduate' not in text or 'masters' in text or 'phd' in text:
+        return ['graduate']
+    grade = re.search(r'\b(9|10|11|12)(?:th)?\s*grade\b|\bgrade\s*(9|10|11|12)\b', text)
+    if grade:
+        return [f"high school {HIGH_SCHOOL_GRADES[grade.group(1) or grade.group(2)]}"]
+    year = next((word for word in ('freshman', 'sophomore', 'junior', 'senior') if word in text), None)
+    if year is None:
+        year = next((word for ordinal, word in COLLEGE_YEARS.items() if re.search(rf"\b{ordinal}[- ]year\b", text)), None)
+    if year is None:
+        # "Undergraduate" or "college student" without a year covers every college year
+        if re.search(r'\bundergrad|\bcollege students?\b', text):
+            return [f"college {word}" for word in COLLEGE_YEARS.values()]
+        return []
+    # The profile prompt lists bare years as college years
+    school = 'high school' if 'high school' in text or re.search(r'\bhs\b', text) else 'college'
+    return [f"{school} {year}"]
+
+
+def normalize_state(text):
+    text = (text or '').strip()
+    if text.upper() in US_STATES:
+        return US_STATES[text.upper()]
+    return text.lower() or None
+
+
+def race_groups(text):
+    """RACE_WORDS groups a race or ethnicity value names, ignoring negated ones."""
+    return groups_in(NEGATED_GROUP.sub(' ', (text or '').lower()), RACE_WORDS)
+
+
+def groups_in(text, vocabulary):
+    """Every group in vocabulary whose words appear in text."""
+    text = f" {(text or '').lower()} "
+    return sorted(group for group, words in vocabulary.items()
+                  if any(re.search(rf"(?<![a-z-]){re.escape(word)}(?![a-z])", text) for word in words))
+
+
+def parse_deadline(value, page_text=''):
+    """ISO date from the model's answer, else the latest date on a page that mentions a deadline."""
+    if value:
+        try:
+            return datetime.strptime(str(value)[:10], '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            pass
+    if re.search(r'\bdeadline\b', page_text, re.I):
+        dates = find_dates(page_text)
+        if dates:
+            return max(dates).date().isoformat()
+    return None
+
+
+def normalize_record(raw, page_text=''):
+    """Turn the model's JSON answer into a record on the fixed vocabularies."""
+    try:
+        min_gpa = float(raw.get('min_gpa')) if raw.get('min_gpa') not in (None, '') else None
+    except (TypeError, ValueError):
+        min_gpa = None
+    return {
+        'grade_levels': sorted({grade for value in raw.get('grade_levels') or [] for grade in normalize_grade(value)}),
+        'min_gpa': min_gpa,
+        'requires_residency': bool(raw.get('requires_residency')),
+        'states': sorted({state for state in map(normalize_state, raw.get('states') or []) if state}),
+        'cities': sorted({city.strip().lower() for city in raw.get('cities') or [] if city and city.strip()}),
+        'genders': sorted({g for value in raw.get('genders') or [] for g in groups_in(value, GENDER_WORDS)}),
+        'races': sorted({r for value in raw.get('races') or [] for r in race_groups(value)}),
+        'deadline': parse_deadline(raw.get('deadline'), page_text),
+    }
+
+
+def parse_extraction(answer):
+    cleaned = re.sub(r'^```(?:json)?|```$', '', answer.strip()).strip()
+    try:
+        raw = json.loads(cleaned)
+    except ValueError:
+        return None
+    return raw if isinstance(raw, dict) else None
+
+
+def extract_record(client, page_text, cache=None, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Ask Gemini for the page's eligibility rules once; returns a record or None."""
+    compacted = compact_page_text(page_text, token_budget)
+    if cache is not None:
+        answer = cache.generate(client, EXTRACTION_MODEL, EXTRACTION_PROMPT, compacted)
+    else:
+        answer = client.models.generate_content(model=EXTRACTION_MODEL,
+                                                contents=f"{EXTRACTION_PROMPT}\n\n{compacted}").text
+    raw = parse_extraction(answer)
+    return normalize_record(raw, page_text) if raw is not None else None
+
+
+def profile_facts(user_info):
+    """The profile values the matcher compares against, normalized like records."""
+    gpas = []
+    for key in ('gpa_weighted', 'gpa_unweighted'):
+        try:
+            gpas.append(float(user_info.get(key, '')))
+        except ValueError:
+            continue
+    return {
+        'grade_levels': normalize_grade(user_info.get('grade_level')),
+        # Floors are checked against the better of the two GPAs so nobody is filtered out by the scale used
+        'gpa': max(gpas) if gpas else None,
+        'resident': user_info.get('resident', '').strip().lower() in ('yes', 'y', 'true'),
+        'states': [state for state in [normalize_state(user_info.get('state'))] if state],
+        'cities': [user_info['city'].strip().lower()] if user_info.get('city', '').strip() else [],
+        'genders': groups_in(user_info.get('gender', ''), GENDER_WORDS),
+        # Race and ethnicity are matched separately so one field's negation can't reach into the other
+        'races': sorted(set(race_groups(user_info.get('race'))) | set(race_groups(user_info.get('ethnicity')))),
+    }
+
+
+class BitmapMatcher:
+    """Bitmap columns over a fixed list of records.
+
+    Bit i of every bitmap stands for record i. A list column keeps one bitmap
+    per value plus one for records that don't restrict it; GPA floors and
+    deadlines keep cumulative bitmaps over their sorted distinct values, so
+    any threshold is one bisect and one lookup.
+    """
+
+    def __init__(self, rows):
+        self.urls = [url for url, _ in rows]
+        self.everyone = (1 << len(rows)) - 1
+        self.values = {column: {} for column in LIST_COLUMNS}
+        self.unrestricted = dict.fromkeys(LIST_COLUMNS, 0)
+        self.residency = 0
+        floors = {}
+        deadlines = {}
+        self.no_floor = 0
+        self.no_deadline = 0
+        for i, (_, record) in enumerate(rows):
+            bit = 1 << i
+            for column in LIST_COLUMNS:
+                if not record[column]:
+                    self.unrestricted[column] |= bit
+                for value in record[column]:
+                    self.values[column][value] = self.values[column].get(value, 0) | bit
+            if record['requires_residency']:
+                self.residency |= bit
+            if record['min_gpa'] is None:
+                self.no_floor |= bit
+            else:
+                floors[record['min_gpa']] = floors.get(record['min_gpa'], 0) | bit
+            if record['deadline'] is None:
+                self.no_deadline |= bit
+            else:
+                deadlines[record['deadline']] = deadlines.get(record['deadline'], 0) | bit
+        # floor_bits[k]: records whose floor is at most floor_keys[k]
+        self.floor_keys = sorted(floors)
+        self.floor_bits = []
+        running = 0
+        for floor in self.floor_keys:
+            running |= floors[floor]
+            self.floor_bits.append(running)
+        # deadline_bits[k]: records whose deadline is on or after deadline_keys[k]
+        self.deadline_keys = sorted(deadlines)
+        self.deadline_bits = [0] * len(self.deadline_keys)
+        running = 0
+        for k in range(len(self.deadline_keys) - 1, -1, -1):
+            running |= deadlines[self.deadline_keys[k]]
+            self.deadline_bits[k] = running
+
+    def _allowed(self, column, values):
+        bits = self.unrestricted[column]
+        for value in values:
+            bits |= self.values[column].get(value, 0)
+        return bits
+
+    def match_bits(self, facts, today=None):
+        """Bitmap of the records the profile facts qualify for."""
+        bits = self.everyone
+        for column in LIST_COLUMNS:
+            bits &= self._allowed(column, facts[column])
+        if not facts['resident']:
+            bits &= ~self.residency
+        if facts['gpa'] is not None:
+            k = bisect.bisect_right(self.floor_keys, facts['gpa'])
+            bits &= self.no_floor | (self.floor_bits[k - 1] if k else 0)
+        today = (today or date.today()).isoformat()
+        k = bisect.bisect_left(self.deadline_keys, today)
+        bits &= self.no_deadline | (self.deadline_bits[k] if k < len(self.deadline_keys) else 0)
+        return bits
+
+    def match(self, user_info, today=None):
+        """URLs of every scholarship the profile is eligible for."""
+        bits = self.match_bits(profile_facts(user_info), today)
+        urls = []
+        while bits:
+            low = bits & -bits
+            urls.append(self.urls[low.bit_length() - 1])
+            bits ^= low
+        return urls
+
+
+class EligibilityIndex:
+    """SQLite store of eligibility records, one per scholarship URL."""
+
+    def __init__(self, path='eligibility.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records (url TEXT PRIMARY KEY, record TEXT, indexed_at REAL)"
+        )
+        self._conn.commit()
+
+    def put(self, url, record):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO records (url, record, indexed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET record = excluded.record, indexed_at = excluded.indexed_at",
+                (url, json.dumps(record), time.time())
+            )
+            self._conn.commit()
+            self._matcher = None
+
+    def remove(self, url):
+        """Drop a record, e.g. because its page changed and needs extracting again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM records WHERE url = ?", (url,))
+            self._conn.commit()
+            self._matcher = None
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM records WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def has(self, url):
+        return self.get(url) is not None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def matcher(self):
+        """BitmapMatcher over every record, rebuilt only after the index changes."""
+        with self._lock:
+            if self._matcher is None:
+                rows = self._conn.execute("SELECT url, record FROM records ORDER BY url").fetchall()
+                self._matcher = BitmapMatcher([(url, json.loads(record)) for url, record in rows])
+            return self._matcher
+
+    def match(self, user_info, today=None):
+        return self.matcher().match(user_info, today)
+
+    def is_eligible(self, url, user_info, today=None):
+        """True/False from the url's record, or None if the url isn't indexed."""
+        record = self.get(url)
+        if record is None:
+            return None
+        return BitmapMatcher([(url, record)]).match_bits(profile_facts(user_info), today) == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def build_index(urls, index, client, cache=None, browsers=None, workers=4, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Fetch and extract a record for every url not yet in the index; returns how many were added."""
+    from fetch_tier import FetchTier
+    tier = FetchTier(browsers)
+
+    def index_one(url):
+        with span('index', url=url) as s:
+            record = extract_record(client, tier.fetch_text(url), cache, token_budget)
+            s.set(extracted=record is not None)
+        if record is not None:
+            index.put(url, record)
+        return record
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(index_one, url): url for url in urls if not index.has(url)}
+        for future in as_completed(futures):
+            try:
+                if future.result() is not None:
+                    added += 1
+                else:
+                    print(f"Could not read eligibility rules from {futures[future]}")
+            except Exception as e:
+                print(f"Indexing {futures[future]} failed: {e}")
+    print(tier.report())
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index scholarship eligibility and match profiles against it')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Extract records for open links in links.db that are not indexed yet')
+    build.add_argument('--limit', type=int, help='Index at most this many links')
+    build.add_argument('--workers', type=int, default=4, help='Pages fetched and extracted in parallel')
+    match = commands.add_parser('match', help='List indexed scholarships a profile is eligible for')
+    match.add_argument('--profile', default='user_info.txt', help='Profile file in user_info.txt format')
+    args = parser.parse_args()
+
+    from link_store import open_link_store
+    from main import get_cache, get_client, load_user_info
+    index = EligibilityIndex()
+    try:
+        if args.command == 'build':
+            from browser_pool import BrowserPool
+            store = open_link_store()
+            urls = store.urls_with_status('open', limit=args.limit)
+            store.close()
+            browsers = BrowserPool(size=args.workers, headless=True, page_load_timeout=20)
+            try:
+                added = build_index(urls, index, get_client(), get_cache(), browsers, args.workers)
+            finally:
+                browsers.close()
+            print(f"Indexed {added} new scholarship(s); {index.count()} in {index.path}.")
+        else:
+            matcher = index.matcher()
+            started = time.perf_counter()
+            urls = matcher.match(load_user_info(args.profile))
+            elapsed = time.perf_counter() - started
+            for url in urls:
+                print(url)
+            print(f"{len(urls)} of {len(matcher.urls)} indexed scholarship(s) match ({elapsed * 1000:.2f} ms).")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
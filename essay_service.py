@@ -0,0 +1,112 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def normalize_prompt(prompt):
+    """Reduce an essay prompt to a key that ignores case, punctuation and spacing."""
+    text = re.sub(r'[^a-z0-9 ]+', ' ', prompt.lower())
+    return ' '.join(text.split())
+
+
+class EssayService:
+    """Generates essay answers for form prompts, once per distinct prompt.
+
+    Prompts are deduplicated by their normalized text, missing ones are
+    generated concurrently, and every draft is kept in a JSON library so the
+    same question on another scholarship reuses the earlier answer.
+
+    Thread-safe, so share one instance per library file (see
+    shared_essay_service); saves merge with drafts other processes wrote.
+    """
+
+    def __init__(self, client, model='gemini-2.5-flash', library_path='essay_drafts.json', max_workers=4):
+        self.client = client
+        self.model = model
+        self.library_path = library_path
+        self.max_workers = max_workers
+        self.calls = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._library = self._load_library()
+
+    def _load_library(self):
+        try:
+            with open(self.library_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_library(self):
+        """Write the library atomically; call with self._lock held."""
+        # Keep drafts another process saved since we loaded
+        self._library = {**self._load_library(), **self._library}
+        directory = os.path.dirname(os.path.abspath(self.library_path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.essay_drafts.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._library, f, indent=2)
+            os.replace(tmp_path, self.library_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def draft_for(self, prompt):
+        """Return the saved draft for a prompt, or None."""
+        with self._lock:
+            entry = self._library.get(normalize_prompt(prompt))
+        return entry['essay'] if entry else None
+
+    def _generate(self, prompt, user_info):
+        essay_prompt = f"Write an essay responding to this prompt: {prompt}. Use the following information from the user: {user_info.get('essays', '')}"
+        response = self.client.models.generate_content(model=self.model, contents=essay_prompt)
+        with self._lock:
+            self.calls += 1
+        return response.text
+
+    def generate_all(self, prompts, user_info):
+        """Return {prompt: essay} for every prompt, generating only unseen ones."""
+        missing = {}
+        with self._lock:
+            for prompt in prompts:
+                key = normalize_prompt(prompt)
+                if key in self._library:
+                    self.reused += 1
+                elif key not in missing:
+                    missing[key] = prompt
+
+        if missing:
+            print(f"Generating {len(missing)} new essay(s) for {len(prompts)} prompt(s)...")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {key: pool.submit(self._generate, prompt, user_info) for key, prompt in missing.items()}
+            drafts = {}
+            for key, future in futures.items():
+                try:
+                    essay = future.result()
+                except Exception as e:
+                    print(f"Essay generation failed for prompt '{missing[key]}': {e}")
+                    continue
+                if essay:
+                    drafts[key] = {'prompt': missing[key], 'essay': essay, 'created': time.time()}
+            with self._lock:
+                self._library.update(drafts)
+                self._save_library()
+
+        return {prompt: self.draft_for(prompt) for prompt in prompts if self.draft_for(prompt)}
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_essay_service(client, library_path='essay_drafts.json', **options):
+    """The one EssayService of this process for library_path, so threads don't overwrite each other's drafts."""
+    key = os.path.abspath(library_path)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = EssayService(client, library_path=library_path, **options)
+        return _shared[key]
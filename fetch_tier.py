@@ -0,0 +1,175 @@
+"""HTTP-first page fetching with a browser only for pages that need one.
+
+Most scholarship pages are static HTML, so a plain GET plus HTML-to-text is
+enough to triage them. A page is escalated to a headless browser only when
+the HTTP response looks like a bot wall (challenge status codes, CAPTCHA
+text, anti-bot vendor markers) or a JavaScript shell (almost no text, an
+empty app root, a "please enable JavaScript" notice).
+"""
+import re
+import threading
+from collections import Counter
+from prompt_compaction import html_to_blocks
+from tracing import span
+from triage import has_captcha, read_body_text
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+)
+# Pages with less visible text than this are probably rendered by JavaScript
+MIN_TEXT_CHARS = 200
+BOT_WALL_STATUS = {401, 403, 429, 503}
+# The page is gone; a browser would get the same answer
+GONE_STATUS = {404, 410}
+# Markers anti-bot services leave in challenge pages. Their scripts also load on
+# ordinary pages, so the markers only count on pages with little text
+BOT_WALL_MARKERS = [
+    'cf-challenge', 'cf_chl_', '/cdn-cgi/challenge-platform', '_incapsula_resource', 'perimeterx',
+    'px-captcha', 'datadome', 'ak_bmsc', 'sucuri', 'distil_r_captcha'
+]
+JS_REQUIRED_PHRASES = [
+    'enable javascript', 'javascript is required', 'javascript is disabled', 'requires javascript',
+    'turn on javascript', "you need to enable javascript"
+]
+# Empty mount points of single-page apps: <div id="root"></div>, <div id="__next"></div>, ...
+EMPTY_APP_ROOT = re.compile(
+    r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|main-app|ember-app)["\'][^>]*>\s*</div>', re.IGNORECASE
+)
+SCRIPT_TAG = re.compile(r'<script\b', re.IGNORECASE)
+
+
+def html_text(html):
+    """Visible text of an HTML page, one block per line, roughly what body.text shows."""
+    return '\n'.join(html_to_blocks(html))
+
+
+def bot_wall_reason(status_code, headers, html, text):
+    """Why the response looks like an anti-bot challenge, or None."""
+    if headers.get('cf-mitigated', '').lower() == 'challenge':
+        return 'Cloudflare challenge'
+    if status_code in BOT_WALL_STATUS:
+        return f"HTTP {status_code} (likely a bot wall)"
+    if has_captcha(text):
+        return 'CAPTCHA or anti-bot check'
+    if len(text) >= MIN_TEXT_CHARS * 5:
+        return None  # A fully rendered page, even if an anti-bot script rode along
+    lowered = html[:20000].lower()
+    for marker in BOT_WALL_MARKERS:
+        if marker in lowered:
+            return f"Anti-bot marker '{marker}'"
+    return None
+
+
+def js_shell_reason(html, text):
+    """Why the page probably needs JavaScript to show its content, or None."""
+    if len(text) >= MIN_TEXT_CHARS * 5:
+        return None  # Plenty of server-rendered text
+    lowered = text.lower()
+    if any(phrase in lowered for phrase in JS_REQUIRED_PHRASES):
+        return 'Page asks for JavaScript'
+    if EMPTY_APP_ROOT.search(html):
+        return 'Empty single-page app root'
+    if len(text) < MIN_TEXT_CHARS:
+        return 'Little or no text without JavaScript'
+    if len(SCRIPT_TAG.findall(html)) > 20 and len(text) < MIN_TEXT_CHARS * 2:
+        return 'Mostly scripts, little text'
+    return None
+
+
+class PageGone(Exception):
+    """The server says the page doesn't exist (404 or 410)."""
+
+
+def escalation_reason(status_code, headers, html, content_type='text/html'):
+    """Return (text, reason): the page text, and why it still needs a browser (None if it doesn't)."""
+    if content_type and 'html' not in content_type and 'text' not in content_type:
+        return '', f"Not an HTML page ({content_type or 'unknown type'})"
+    text = html_text(html)
+    if status_code >= 400 and status_code not in BOT_WALL_STATUS:
+        return text, f"HTTP {status_code}"
+    return text, bot_wall_reason(status_code, headers, html, text) or js_shell_reason(html, text)
+
+
+class FetchTier:
+    """Fetches page text over pooled HTTP, falling back to a pooled headless browser.
+
+    Thread-safe: one requests.Session (keep-alive, connection pool) is shared
+    by all fetch workers. Counts how many pages each tier served and why pages
+    were escalated.
+    """
+
+    def __init__(self, browsers, session=None, timeout=10, http_first=True):
+        self.browsers = browsers
+        self.timeout = timeout
+        self.http_first = http_first
+        if session is None and http_first:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            # Enough pooled connections per host for every fetch worker
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.served = Counter()
+        self.reasons = Counter()
+        self._lock = threading.Lock()
+
+    def fetch_http(self, url):
+        """GET url; returns (text, reason) where reason says why a browser is still needed.
+
+        Raises PageGone for 404 and 410 instead of escalating them.
+        """
+        with span('http_fetch', url=url) as s:
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except Exception as e:
+                s.set(error=str(e))
+                return '', f"HTTP fetch failed: {type(e).__name__}"
+            s.set(status=response.status_code)
+            if response.status_code in GONE_STATUS:
+                with self._lock:
+                    self.served['gone'] += 1
+                raise PageGone(f"HTTP {response.status_code}")
+            text, reason = escalation_reason(response.status_code, response.headers, response.text,
+                                             response.headers.get('Content-Type', '').lower())
+            s.set(status=response.status_code, chars=len(text), escalated=reason is not None)
+            return text, reason
+
+    def fetch_browser(self, url):
+        with span('fetch', url=url, tier='browser') as s, self.browsers.session() as driver:
+            driver.get(url)
+            text = read_body_text(driver)
+            s.set(chars=len(text))
+            return text
+
+    def fetch_text(self, url):
+        """Visible text of url, from plain HTTP when that is enough, otherwise from a browser.
+
+        Raises PageGone when plain HTTP gets a 404 or 410.
+        """
+        if self.http_first:
+            text, reason = self.fetch_http(url)
+            if reason is None:
+                with self._lock:
+                    self.served['http'] += 1
+                return text
+            with self._lock:
+                self.reasons[reason.split(' (')[0]] += 1
+        text = self.fetch_browser(url)
+        with self._lock:
+            self.served['browser'] += 1
+        return text
+
+    def report(self):
+        total = sum(self.served.values())
+        if not total:
+            return "Fetch tier: no pages fetched."
+        line = f"Fetch tier: {self.served['http']} of {total} page(s) read over plain HTTP, {self.served['browser']} needed a browser."
+        if self.served['gone']:
+            line += f" {self.served['gone']} no longer exist (404/410)."
+        if self.reasons:
+            line += ' Escalated for: ' + ', '.join(f"{reason} ({count})" for reason, count in self.reasons.most_common()) + '.'
+        return line
@@ -0,0 +1,377 @@
+"""State machine that walks a multi-page application and checkpoints each page.
+
+    landing --(apply link)--> landing --(form found)--> form --> advance --> landing ... --> done
+       \\--(password field)--> login --> landing            \\--(page didn't change)--> stuck
+
+After every filled page and every advance, the step reached and the fields
+filled on each page (selector and the profile key used, never the value) are
+saved per application URL in checkpoints.db. A crashed, skipped or
+interrupted application resumes at the last page reached instead of from
+the landing page.
+"""
+import json
+import sqlite3
+import threading
+import time
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+from dom_snapshot import (
+    essay_prompt_for, find_field_element, is_essay_field, is_text_input, match_select_option,
+    match_text_field, take_form_snapshot
+)
+from form_templates import form_fingerprint
+from page_ready import click_and_wait, navigate, wait_for_network_idle, wait_for_page_ready
+from tracing import span
+
+APPLY_KEYWORDS = [
+    'apply now', 'apply here', 'go to form', 'start application', 'begin application',
+    'start your application', 'continue to application', 'application form', 'proceed to application', 'apply'
+]
+# Checked in this order, so moving on to the next page beats a final submit. No bare 'save':
+# "Save Draft" keeps the page where it is
+ADVANCE_KEYWORDS = ['next', 'continue', 'save and continue', 'submit', 'finish']
+FINAL_KEYWORDS = {'submit', 'finish'}
+# Reason prefix of applications the user chose to skip
+SKIPPED = 'Skipped'
+COOKIE_KEYWORDS = ['accept all cookies', 'accept cookies', 'accept all', 'accept', 'agree']
+
+_UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_LOWER = 'abcdefghijklmnopqrstuvwxyz'
+_TEXT = f"translate(normalize-space(.), '{_UPPER}', '{_LOWER}')"
+_VALUE = f"translate(@value, '{_UPPER}', '{_LOWER}')"
+
+
+def keyword_xpath(paths, keywords, text=_TEXT):
+    """One XPath matching any of paths whose (lowercased) text contains any keyword."""
+    predicate = ' or '.join(f"contains({text}, '{keyword}')" for keyword in keywords)
+    return ' | '.join(f"{path}[{predicate}]" for path in paths)
+
+
+# Built once at import; each lookup is a single find_elements call
+APPLY_XPATH = keyword_xpath(['//a', '//button'], APPLY_KEYWORDS)
+ADVANCE_XPATH = (
+    keyword_xpath(['//button', "//a[contains(@class, 'button')]"], ADVANCE_KEYWORDS) + ' | '
+    + keyword_xpath(["//input[@type='submit']"], ADVANCE_KEYWORDS, text=_VALUE)
+)
+COOKIE_XPATH = (
+    "//*[@id='onetrust-accept-btn-handler'] | //button[@id='accept-cookies'] | "
+    + keyword_xpath(['//button'], COOKIE_KEYWORDS)
+)
+
+# Visible text of each candidate element in one call, instead of one .text round-trip each
+ELEMENT_TEXT_SCRIPT = """
+return arguments[0].map(function (el) {
+    var rect = el.getBoundingClientRect();
+    return [(el.innerText || el.value || '').trim().toLowerCase(), rect.width > 0 && rect.height > 0];
+});
+"""
+
+
+def find_keyword_element(driver, xpath, keywords):
+    """Return (element, keyword) for the visible match of the highest-priority keyword, or (None, None)."""
+    elements = driver.find_elements(By.XPATH, xpath)
+    if not elements:
+        return None, None
+    described = driver.execute_script(ELEMENT_TEXT_SCRIPT, elements)
+    for keyword in keywords:
+        for element, (text, visible) in zip(elements, described):
+            if visible and keyword in text:
+                return element, keyword
+    return None, None
+
+
+def fillable_fields(fields):
+    return [field for field in fields if field['visible'] and field['type'] not in ('hidden', 'submit', 'button', 'reset', 'image')]
+
+
+def is_login_page(fields):
+    return any(field['type'] == 'password' and field['visible'] for field in fields)
+
+
+def is_application_form(fields):
+    """More than a search box: at least two visible fields that aren't search inputs."""
+    inputs = [
+        field for field in fillable_fields(fields)
+        if 'search' not in (field['placeholder'] + ' ' + field['name']).lower()
+    ]
+    return len(inputs) >= 2
+
+
+def _fill_one(driver, field, source, type_, fill):
+    """Run fill(element) in a field_fill span; returns the error text if it raised, else None."""
+    # Log which profile field went where, never the value itself
+    try:
+        with span('field_fill', label=field['label'], type=type_, source=source):
+            fill(find_field_element(driver, field))
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def fill_form_fields(driver, fields, user_info, essays):
+    """Fill text fields and selects from user_info and essays.
+
+    Returns (filled, failed, unmatched): [{'selector', 'source'}] for fields
+    filled, [{'selector', 'label', 'error'}] for fields that raised (the
+    error is also on their field_fill span) and the number of fields with
+    no matching profile value.
+    """
+    filled, failed = [], []
+    unmatched = 0
+
+    def attempt(field, source, type_, fill):
+        error = _fill_one(driver, field, source, type_, fill)
+        if error:
+            failed.append({'selector': field['selector'], 'label': field['label'], 'error': error})
+        else:
+            filled.append({'selector': field['selector'], 'source': source})
+
+    for field in fields:
+        if field['tag'] == 'select':
+            continue
+        value = ''
+        key = match_text_field(field, user_info)
+        if key:
+            value = user_info.get(key, '')
+        elif is_text_input(field) and is_essay_field(field):
+            key = 'essay'
+            value = essays.get(essay_prompt_for(field), '')
+        if not value:
+            unmatched += 1
+            continue
+
+        def fill_text(element, value=value):
+            element.clear()
+            element.send_keys(value)
+        attempt(field, key, field['type'], fill_text)
+
+    for field in fields:
+        if field['tag'] != 'select':
+            continue
+        choice = match_select_option(field, user_info)
+        if not choice:
+            unmatched += 1
+            continue
+        key, option_text = choice
+        attempt(field, key, 'select', lambda element, text=option_text: Select(element).select_by_visible_text(text))
+    return filled, failed, unmatched
+
+
+class CheckpointStore:
+    """SQLite record of how far each application got: state, page reached and what each page filled."""
+
+    def __init__(self, path='checkpoints.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "url TEXT PRIMARY KEY, state TEXT, step INTEGER, page_url TEXT, steps TEXT, "
+            "reason TEXT, updated REAL);"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        """Return the checkpoint for url as a dict, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, step, page_url, steps, reason, updated FROM checkpoints WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        state, step, page_url, steps, reason, updated = row
+        return {'state': state, 'step': step, 'page_url': page_url, 'steps': json.loads(steps),
+                'reason': reason, 'updated': updated}
+
+    def save(self, url, state, step, page_url, steps, reason=''):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO checkpoints (url, state, step, page_url, steps, reason, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET state = excluded.state, "
+                "step = excluded.step, page_url = excluded.page_url, steps = excluded.steps, "
+                "reason = excluded.reason, updated = excluded.updated",
+                (url, state, step, page_url, json.dumps(steps), reason, time.time())
+            )
+            self._conn.commit()
+
+    def unfinished(self, open_urls=None):
+        """URLs of applications that stopped partway, oldest first.
+
+        Applications the user chose to skip are left out, and with open_urls
+        so is any link that is no longer open (closed, or completed since).
+        """
+        with self._lock:
+            urls = [row[0] for row in self._conn.execute(
+                "SELECT url FROM checkpoints WHERE state != 'done' AND COALESCE(reason, '') NOT LIKE ? ORDER BY updated",
+                (f"{SKIPPED}%",)
+            )]
+        if open_urls is not None:
+            open_urls = set(open_urls)
+            urls = [url for url in urls if url in open_urls]
+        return urls
+
+    def clear(self, url):
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FormNavigator:
+    """Walks one application page by page, checkpointing after each page.
+
+    run() returns 'done' when the last page was filled (and submitted if
+    submit=True) or 'stuck' with the cause in .reason. With interactive=False
+    nothing waits on input(); pages that need a person leave the navigator
+    stuck with the checkpoint saved, so a later run picks up from there.
+    """
+
+    def __init__(self, driver, url, user_info, essay_service, checkpoints, interactive=True, submit=True,
+                 max_steps=10, max_hops=5):
+        self.driver = driver
+        self.url = url
+        self.user_info = user_info
+        self.essay_service = essay_service
+        self.checkpoints = checkpoints
+        self.interactive = interactive
+        self.submit = submit
+        self.max_steps = max_steps
+        self.max_hops = max_hops
+        self.step = 0
+        self.steps = []
+        self.fields = []
+        self.hops = 0
+        self.logins = 0
+        self.cookies_checked = False
+        self.reason = ''
+
+    def run(self):
+        checkpoint = self.checkpoints.get(self.url)
+        state = 'start'
+        if checkpoint and checkpoint['state'] != 'done' and checkpoint['page_url']:
+            self.step = checkpoint['step']
+            self.steps = checkpoint['steps']
+            state = 'resume'
+        with span('navigate_application', url=self.url) as s:
+            while state not in ('done', 'stuck'):
+                state = getattr(self, f"_on_{state}")()
+            s.set(state=state, pages=len(self.steps))
+        self._save(state)
+        return state
+
+    def _save(self, state):
+        self.checkpoints.save(self.url, state, self.step, self.driver.current_url, self.steps, self.reason)
+
+    def _stuck(self, reason):
+        print(f"Stopped at page {self.step + 1}: {reason}")
+        self.reason = reason
+        return 'stuck'
+
+    def _on_start(self):
+        print(f"Opening {self.url} in browser...")
+        navigate(self.driver, self.url)
+        return 'landing'
+
+    def _on_resume(self):
+        page_url = self.checkpoints.get(self.url)['page_url']
+        print(f"Resuming {self.url} at page {self.step + 1} ({len(self.steps)} page(s) already filled)...")
+        navigate(self.driver, page_url)
+        return 'landing'
+
+    def _accept_cookies(self):
+        self.cookies_checked = True
+        element, keyword = find_keyword_element(self.driver, COOKIE_XPATH, COOKIE_KEYWORDS + [''])
+        if element is None:
+            return
+        try:
+            # A failed click is recorded on the span; the page may still be usable behind the banner
+            with span('click', keyword=keyword, target='cookie banner'):
+                element.click()
+                wait_for_network_idle(self.driver, timeout=3)
+            print("Accepted cookies.")
+        except Exception as e:
+            print(f"Could not dismiss the cookie banner: {type(e).__name__}")
+
+    def _on_landing(self):
+        if not self.cookies_checked:
+            self._accept_cookies()
+        self.fields = take_form_snapshot(self.driver)
+        if is_login_page(self.fields):
+            return 'login'
+        if is_application_form(self.fields):
+            print("Form detected. Proceeding to fill the form.")
+            return 'form'
+        if self.steps:
+            # Inside the application already (e.g. a review page): look for next/submit, not 'apply'
+            return 'advance'
+        if self.hops < self.max_hops:
+            element, keyword = find_keyword_element(self.driver, APPLY_XPATH, APPLY_KEYWORDS)
+            if element is not None:
+                self.hops += 1
+                with span('click', keyword=keyword, target='apply link'):
+                    click_and_wait(self.driver, element, dom_timeout=30)
+                return 'landing'
+        if not self.interactive:
+            return self._stuck('No application form found')
+        with span('user_wait', url=self.url):
+            choice = input("No form found. Navigate to the application form in the browser and press Enter, or type 's' to skip: ").strip().lower()
+        if choice == 's':
+            return self._stuck(f"{SKIPPED}: no application form found")
+        self.hops = self.max_hops
+        self.fields = take_form_snapshot(self.driver)
+        return 'form'
+
+    def _on_login(self):
+        self.logins += 1
+        if not self.interactive or self.logins > 2:
+            return self._stuck('Login required')
+        print("Login form detected. Please log in manually if required.")
+        with span('login_wait', url=self.url):
+            input("After logging in, press Enter to continue...")
+        wait_for_page_ready(self.driver, dom_timeout=30, form_timeout=30)
+        return 'landing'
+
+    def _on_form(self):
+        if self.step >= self.max_steps:
+            return self._stuck(f"Gave up after {self.max_steps} pages")
+        essay_prompts = [
+            essay_prompt_for(field) for field in self.fields
+            if is_text_input(field) and not match_text_field(field, self.user_info) and is_essay_field(field)
+        ]
+        essays = self.essay_service.generate_all(essay_prompts, self.user_info) if essay_prompts else {}
+        with span('fill_page', url=self.url, page=self.step + 1, fields=len(self.fields)) as s:
+            filled, failed, unmatched = fill_form_fields(self.driver, self.fields, self.user_info, essays)
+            s.set(filled=len(filled), failed=len(failed), unmatched=unmatched)
+        if failed:
+            print(f"Could not fill {len(failed)} field(s) on page {self.step + 1}: "
+                  + ', '.join(field['label'] or field['selector'] for field in failed))
+        page = {'fingerprint': form_fingerprint(self.fields), 'page_url': self.driver.current_url, 'filled': filled,
+                'failed': [field['selector'] for field in failed]}
+        # Replace the record for this page if it was filled before the last interruption
+        self.steps = self.steps[:self.step] + [page]
+        self._save('filled')
+        return 'advance'
+
+    def _on_advance(self):
+        element, keyword = find_keyword_element(self.driver, ADVANCE_XPATH, ADVANCE_KEYWORDS)
+        if element is None:
+            print("No next or submit button found; review and submit manually.")
+            return 'done'
+        if keyword in FINAL_KEYWORDS and not self.submit:
+            print(f"Not clicking the final '{keyword}' button; review and submit manually.")
+            return 'done'
+        before = form_fingerprint(self.fields), self.driver.current_url
+        with span('submit', keyword=keyword, page=self.step + 1) as s:
+            s.set(waited=round(click_and_wait(self.driver, element), 3))
+        if keyword in FINAL_KEYWORDS:
+            return 'done'
+        fields = take_form_snapshot(self.driver)
+        if (form_fingerprint(fields), self.driver.current_url) == before:
+            # Same form on the same URL: usually a validation error that needs a person
+            return self._stuck('Page did not advance (check for required fields)')
+        self.step += 1
+        self._save('form')
+        return 'landing'
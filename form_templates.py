@@ -0,0 +1,148 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Checks every selector of a template in one execute_script call
+VALIDATE_SCRIPT = """
+return arguments[0].map(function (selector) {
+    try { return document.querySelector(selector) !== null; } catch (e) { return false; }
+});
+"""
+
+
+def form_domain(url):
+    """Host a template is filed under, without 'www.'."""
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def form_fingerprint(fields):
+    """Hash of the form's structure (tag, type and name/id of each field) from a DOM snapshot.
+
+    Values, labels and hidden inputs are left out so the same form hashes the
+    same on every visit. Returns None for a page with no fields.
+    """
+    parts = [
+        f"{field['tag']}:{field['type']}:{field['name'] or field['id']}"
+        for field in fields if field['type'] != 'hidden'
+    ]
+    if not parts:
+        return None
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def template_selectors(analysis):
+    return [item['selector'] for item in analysis.get('fields', []) + analysis.get('buttons', []) if item.get('selector')]
+
+
+def validate_template(driver, analysis):
+    """Return True if every field and button selector in the template still matches the page."""
+    selectors = template_selectors(analysis)
+    if not selectors:
+        return False
+    try:
+        return all(driver.execute_script(VALIDATE_SCRIPT, selectors))
+    except Exception:
+        return False
+
+
+class FormTemplateStore:
+    """SQLite store of learned form layouts keyed by (domain, structure fingerprint).
+
+    A template is the field/button analysis Gemini produced for a form. A
+    form seen again on the same domain, or the same application portal on
+    another domain, reuses it instead of a screenshot and vision call.
+    """
+
+    def __init__(self, path='form_templates.db'):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            "domain TEXT, fingerprint TEXT, analysis TEXT, created REAL, last_used REAL, "
+            "uses INTEGER DEFAULT 0, PRIMARY KEY (domain, fingerprint));"
+            "CREATE INDEX IF NOT EXISTS idx_templates_fingerprint ON templates(fingerprint);"
+        )
+        self._conn.commit()
+
+    def lookup(self, url, fingerprint):
+        """Return (domain, analysis) for the best template for this form, or None.
+
+        An exact domain match wins; otherwise the most used template with the
+        same fingerprint on any domain (shared portal vendors).
+        """
+        if fingerprint is None:
+            return None
+        domain = form_domain(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT domain, analysis FROM templates WHERE fingerprint = ? "
+                "ORDER BY domain = ? DESC, uses DESC LIMIT 1",
+                (fingerprint, domain)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, url, fingerprint, analysis):
+        """Remember the analysis of this form for its domain."""
+        if fingerprint is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO templates (domain, fingerprint, analysis, created, last_used, uses) "
+                "VALUES (?, ?, ?, ?, ?, 0) ON CONFLICT(domain, fingerprint) DO UPDATE SET "
+                "analysis = excluded.analysis, last_used = excluded.last_used",
+                (form_domain(url), fingerprint, json.dumps(analysis), now, now)
+            )
+            self._conn.commit()
+
+    def record_use(self, domain, fingerprint):
+        with self._lock:
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE templates SET uses = uses + 1, last_used = ? WHERE domain = ? AND fingerprint = ?",
+                (time.time(), domain, fingerprint)
+            )
+            self._conn.commit()
+
+    def invalidate(self, domain, fingerprint):
+        """Forget a template whose selectors no longer match."""
+        with self._lock:
+            self.invalidated += 1
+            self._conn.execute("DELETE FROM templates WHERE domain = ? AND fingerprint = ?", (domain, fingerprint))
+            self._conn.commit()
+
+    def match(self, driver, url, fingerprint):
+        """Return a validated template analysis for the page open in driver, or None."""
+        found = self.lookup(url, fingerprint)
+        if found is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        domain, analysis = found
+        if not validate_template(driver, analysis):
+            print(f"Cached form template from {domain} doesn't match this page; re-analyzing.")
+            # Only drop this domain's own template; another site's copy may still be right there
+            if domain == form_domain(url):
+                self.invalidate(domain, fingerprint)
+            with self._lock:
+                self.misses += 1
+            return None
+        self.record_use(domain, fingerprint)
+        return analysis
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'invalidated': self.invalidated}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
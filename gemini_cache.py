@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from prompt_compaction import estimate_tokens
+from tracing import span
+
+
+def normalize_text(text):
+    """Collapse whitespace so cosmetic page changes don't miss the cache."""
+    return ' '.join(text.split())
+
+
+def make_cache_key(model, prompt, content):
+    """Hash (model, prompt template, page text or screenshot bytes) into a cache key."""
+    h = hashlib.sha256()
+    h.update(model.encode('utf-8'))
+    h.update(b'\0')
+    h.update(prompt.encode('utf-8'))
+    h.update(b'\0')
+    if isinstance(content, bytes):
+        h.update(content)
+    else:
+        h.update(normalize_text(content).encode('utf-8'))
+    return h.hexdigest()
+
+
+class GeminiCache:
+    """Persistent on-disk cache for Gemini responses.
+
+    Entries live in a SQLite file, expire after ttl_seconds, and the least
+    recently used ones are evicted once the stored responses exceed max_bytes.
+    """
+
+    def __init__(self, path='gemini_cache.db', max_bytes=50 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, "
+            "created REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created = row
+            if now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key, model, response):
+        """Store a response and evict old entries if the cache is over its size cap."""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # Drop expired entries first, then least recently used until under the cap
+        cur = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        self.evictions += cur.rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def generate(self, client, model, prompt, content, contents=None, valid=None):
+        """Return Gemini's text for (prompt, content), calling the API only on a miss.
+
+        contents overrides what is sent to the model (e.g. a prompt plus image
+        part); by default the prompt and text content are joined. When valid is
+        given, only answers it accepts are cached or served from the cache, so
+        an unparseable answer is asked again next time instead of replayed.
+        """
+        with span('model_call', model=model) as s:
+            if isinstance(content, str):
+                s.set(tokens=estimate_tokens(prompt) + estimate_tokens(content))
+            key = make_cache_key(model, prompt, content)
+            cached = self.get(key)
+            if cached is not None and valid is not None and not valid(cached):
+                cached = None
+            s.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+            if contents is None:
+                contents = f"{prompt}\n\n{content}"
+            response = client.models.generate_content(model=model, contents=contents)
+            text = response.text
+            if text and (valid is None or valid(text)):
+                self.put(key, model, text)
+            return text
+
+    async def agenerate(self, client, model, prompt, content, contents=None, valid=None):
+        """generate() for coroutines, calling client.aio on a miss.
+
+        The SQLite reads and writes run in a worker thread so they never block the event loop.
+        """
+        with span('model_call', model=model) as s:
+            if isinstance(content, str):
+                s.set(tokens=estimate_tokens(prompt) + estimate_tokens(content))
+            key = make_cache_key(model, prompt, content)
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None and valid is not None and not valid(cached):
+                cached = None
+            s.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+            if contents is None:
+                contents = f"{prompt}\n\n{content}"
+            response = await client.aio.models.generate_content(model=model, contents=contents)
+            text = response.text
+            if text and (valid is None or valid(text)):
+                await asyncio.to_thread(self.put, key, model, text)
+            return text
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) if total else 0.0
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'hit_rate': hit_rate}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
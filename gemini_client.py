@@ -0,0 +1,235 @@
+import random
+import threading
+import time
+from tracing import span
+
+# HTTP status codes worth retrying: rate limited or a transient server error
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when too many consecutive Gemini calls have failed to keep trying."""
+
+
+def error_code(exc):
+    """Best-effort HTTP status code of a google-genai (or requests) exception."""
+    for attr in ('code', 'status_code'):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+class TokenBucket:
+    """Token bucket whose refill rate backs off on 429s and recovers on success."""
+
+    def __init__(self, rate, capacity, min_rate=None):
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return how long to wait for one."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire() for coroutines: waits without blocking the event loop."""
+        # Imported here so threaded and CLI-only callers don't pay for asyncio at startup
+        import asyncio
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def throttle(self):
+        """Halve the rate after the API pushes back."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def recover(self):
+        """Creep back toward the configured rate after a success."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class CircuitBreaker:
+    """Stops calls for `cooldown` seconds after `threshold` consecutive failures."""
+
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown:
+                raise CircuitOpenError(f"Gemini circuit open after {self.failures} consecutive failures")
+            # Half-open: let calls through; the next failure reopens immediately
+            self.opened_at = None
+            self.failures = self.threshold - 1
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class RateLimitedClient:
+    """Drop-in wrapper for genai.Client shared by every Gemini call.
+
+    client.models.generate_content(...) goes through a token bucket sized to
+    the quota, a cap on concurrent requests, jittered exponential backoff on
+    429/5xx responses, and a circuit breaker that fails fast when the API is
+    down.
+    """
+
+    def __init__(self, client, requests_per_minute=60, burst=5, max_concurrent=8,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, breaker=None):
+        self.client = client
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._aio = AsyncRateLimitedModels(self, max_concurrent)
+
+    @property
+    def models(self):
+        # Call sites use client.models.generate_content, so expose the same shape
+        return self
+
+    @property
+    def aio(self):
+        # client.aio.models.generate_content is the async twin, sharing this client's limits
+        return self._aio
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from concurrent workers apart
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def generate_content(self, **kwargs):
+        with span('gemini_request', model=kwargs.get('model')) as s:
+            response = self._generate(s, kwargs)
+        return response
+
+    def _generate(self, s, kwargs):
+        for attempt in range(self.max_retries + 1):
+            s.set(attempts=attempt + 1)
+            self.breaker.before_call()
+            with span('rate_limit_wait'):
+                self.bucket.acquire()
+            try:
+                with self._slots:
+                    response = self.client.models.generate_content(**kwargs)
+            except Exception as e:
+                code = error_code(e)
+                if code == 429:
+                    self.bucket.throttle()
+                if code not in RETRYABLE_CODES or attempt == self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                delay = self._backoff(attempt)
+                with self._lock:
+                    self.retries += 1
+                print(f"Gemini returned {code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                with span('backoff_sleep', code=code):
+                    time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.bucket.recover()
+            with self._lock:
+                self.calls += 1
+            return response
+
+
+class AsyncRateLimitedModels:
+    """Async side of RateLimitedClient, reached as client.aio.models.generate_content.
+
+    Shares the token bucket, circuit breaker and counters with the sync client,
+    so threads and coroutines together stay inside one quota.
+    """
+
+    def __init__(self, limiter, max_concurrent):
+        self.limiter = limiter
+        self.max_concurrent = max_concurrent
+        self._slots = None
+        self._loop = None
+
+    @property
+    def models(self):
+        return self
+
+    async def generate_content(self, **kwargs):
+        import asyncio
+        limiter = self.limiter
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores belong to one event loop; each asyncio.run() gets a fresh one
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        with span('gemini_request', model=kwargs.get('model')) as s:
+            for attempt in range(limiter.max_retries + 1):
+                s.set(attempts=attempt + 1)
+                limiter.breaker.before_call()
+                await limiter.bucket.acquire_async()
+                try:
+                    async with self._slots:
+                        response = await limiter.client.aio.models.generate_content(**kwargs)
+                except Exception as e:
+                    code = error_code(e)
+                    if code == 429:
+                        limiter.bucket.throttle()
+                    if code not in RETRYABLE_CODES or attempt == limiter.max_retries:
+                        limiter.breaker.record_failure()
+                        raise
+                    delay = limiter._backoff(attempt)
+                    with limiter._lock:
+                        limiter.retries += 1
+                    print(f"Gemini returned {code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{limiter.max_retries})")
+                    await asyncio.sleep(delay)
+                    continue
+                limiter.breaker.record_success()
+                limiter.bucket.recover()
+                with limiter._lock:
+                    limiter.calls += 1
+                return response
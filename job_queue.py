@@ -0,0 +1,365 @@
+"""Job queue for triage and form filling, shared by any number of worker processes.
+
+A link moves through found -> triaged -> open -> filling -> done as jobs:
+a 'triage' job fetches and classifies a link, and when it comes back open a
+'fill' job is queued for each profile. Workers lease one job at a time. A
+lease expires unless the worker renews it, so a crashed worker's job goes
+back to the queue. Failed jobs are retried with exponential backoff up to
+max_attempts. At most domain_cap jobs per site are leased at once across all
+workers.
+
+The backend is one SQLite file in WAL mode, so every worker must run on
+the same host as jobs.db (and links.db): WAL relies on shared memory and
+does not work over network filesystems. Scale out with more processes or
+--threads on that host.
+
+Usage: python job_queue.py enqueue [URL ...]      (no URLs: pending links from `main.py search`)
+       python job_queue.py worker [--kinds triage fill] [--threads 4] [--exit-when-empty]
+       python job_queue.py stats
+"""
+import argparse
+import sqlite3
+import threading
+import time
+import uuid
+from form_templates import form_domain
+from tracing import span
+
+KINDS = ['triage', 'fill']
+# Default seconds a lease lasts without a heartbeat, per kind
+LEASE_SECONDS = {'triage': 120, 'fill': 900}
+
+
+class JobQueue:
+    """SQLite-backed job queue with leases, retries and per-domain caps."""
+
+    def __init__(self, path='jobs.db', max_attempts=3, retry_delay=30, domain_cap=2):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.domain_cap = domain_cap
+        self._lock = threading.Lock()
+        # Autocommit mode so lease() can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, kind TEXT, url TEXT, domain TEXT, profile TEXT DEFAULT '', "
+            "state TEXT, attempts INTEGER DEFAULT 0, available_at REAL, lease_owner TEXT, "
+            "lease_expires REAL, last_error TEXT, created REAL, updated REAL, "
+            "UNIQUE (kind, url, profile));"
+            "CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(state, kind, available_at);"
+            "CREATE INDEX IF NOT EXISTS idx_jobs_domain ON jobs(domain, state);"
+        )
+
+    def enqueue(self, kind, url, profile='', delay=0):
+        """Queue a job unless the same (kind, url, profile) was queued before; returns True if added."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, url, domain, profile, state, available_at, created, updated) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (kind, url, form_domain(url), profile, now + delay, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def _reclaim_expired(self, now):
+        """Requeue jobs whose worker stopped renewing the lease, or fail them if out of attempts."""
+        self._conn.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "lease_owner = NULL, last_error = 'Lease expired', updated = ? "
+            "WHERE state = 'leased' AND lease_expires <= ?",
+            (self.max_attempts, now, now)
+        )
+
+    def lease(self, worker, kinds=KINDS, lease_seconds=None):
+        """Claim the oldest ready job whose site is under its cap; returns (id, kind, url, profile) or None."""
+        now = time.time()
+        marks = ','.join('?' * len(kinds))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reclaim_expired(now)
+                row = self._conn.execute(
+                    f"SELECT id, kind, url, profile FROM jobs j WHERE state = 'queued' AND kind IN ({marks}) "
+                    "AND available_at <= ? AND (SELECT COUNT(*) FROM jobs a WHERE a.domain = j.domain "
+                    "AND a.state = 'leased') < ? ORDER BY available_at, id LIMIT 1",
+                    (*kinds, now, self.domain_cap)
+                ).fetchone()
+                if row is not None:
+                    seconds = lease_seconds or LEASE_SECONDS.get(row[1], 300)
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                        "lease_expires = ?, updated = ? WHERE id = ?",
+                        (worker, now + seconds, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _update_leased(self, job_id, worker, sql, params):
+        """Run an update on a job this worker still holds; returns False if the lease was lost."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {sql} WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (*params, job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id, worker, lease_seconds):
+        """Extend a lease; returns False if the job was reclaimed meanwhile."""
+        now = time.time()
+        return self._update_leased(job_id, worker, "lease_expires = ?, updated = ?", (now + lease_seconds, now))
+
+    def complete(self, job_id, worker):
+        return self._update_leased(job_id, worker, "state = 'done', lease_owner = NULL, updated = ?", (time.time(),))
+
+    def fail(self, job_id, worker, error):
+        """Put the job back with exponential backoff, or mark it failed after max_attempts."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        attempts = row[0] if row else self.max_attempts
+        if attempts >= self.max_attempts:
+            return self._update_leased(job_id, worker, "state = 'failed', lease_owner = NULL, last_error = ?, updated = ?",
+                                       (error, now))
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        return self._update_leased(
+            job_id, worker,
+            "state = 'queued', lease_owner = NULL, last_error = ?, available_at = ?, updated = ?",
+            (error, now + delay, now)
+        )
+
+    def pending(self, kinds=KINDS):
+        """Number of jobs of these kinds that are queued or leased."""
+        marks = ','.join('?' * len(kinds))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE kind IN ({marks}) AND state IN ('queued', 'leased')", kinds
+            ).fetchone()[0]
+
+    def stats(self):
+        """{kind: {state: count}}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state").fetchall()
+        stats = {}
+        for kind, state, count in rows:
+            stats.setdefault(kind, {})[state] = count
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Heartbeat:
+    """Renews a job's lease in the background while the worker is busy with it."""
+
+    def __init__(self, queue, job_id, worker, lease_seconds):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(self.job_id, self.worker, self.lease_seconds):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class Worker:
+    """Pulls triage and fill jobs from the queue and runs them with the existing pipeline code.
+
+    Triage reads the page over HTTP first (FetchTier), then classifies it
+    with the local pre-classifier or Gemini and records the status in the
+    link store. Open links get a fill job for each of fill_profiles. Fill
+    runs fill_application headless: sites that need a person go to the
+    review queue, and forms are only submitted when submit is True.
+    """
+
+    def __init__(self, queue, store, browsers, client, cache=None, kinds=KINDS, fill_profiles=('',), submit=False,
+                 preclassifier=None, name=None, tier=None):
+        self.queue = queue
+        self.store = store
+        self.client = client
+        self.cache = cache
+        self.kinds = list(kinds)
+        self.fill_profiles = list(fill_profiles)
+        self.submit = submit
+        self.preclassifier = preclassifier
+        self.browsers = browsers
+        self.name = name or f"worker-{uuid.uuid4().hex[:8]}"
+        self._profiles = {}
+        self._profiles_lock = threading.Lock()
+        if tier is None:
+            from fetch_tier import FetchTier
+            tier = FetchTier(browsers)
+        self.tier = tier
+
+    def triage(self, url):
+        from fetch_tier import PageGone
+        from triage import classify_page_text, has_captcha, record_link_status
+        try:
+            page_text = self.tier.fetch_text(url)
+        except PageGone as e:
+            record_link_status(self.store, url, 'not found', f"Page no longer exists ({e})")
+            print(f"[{self.name}] {url}: not found ({e})")
+            return
+        if has_captcha(page_text):
+            self.store.add_review(url, 'triage', 'CAPTCHA or anti-bot check')
+            return
+        decision = self.preclassifier.classify(page_text) if self.preclassifier is not None else None
+        if decision is not None:
+            status, details = decision
+            details = f"Local pre-classifier: {details}"
+        else:
+            with span('classify', url=url) as s:
+                status, details = classify_page_text(self.client, page_text, self.cache)
+                s.set(status=status)
+            if self.preclassifier is not None:
+                self.preclassifier.record_label(page_text, status, details)
+        record_link_status(self.store, url, status, details)
+        print(f"[{self.name}] {url}: {status}")
+        if status == 'open':
+            for profile in self.fill_profiles:
+                self.queue.enqueue('fill', url, profile)
+
+    def _profile(self, name):
+        """(user_info, application state store, essay service) for a profile, loaded once per worker."""
+        with self._profiles_lock:
+            if name not in self._profiles:
+                if name:
+                    from profiles import ProfileRegistry
+                    profile = ProfileRegistry().get(name)
+                    self._profiles[name] = (profile.load(), profile.applications(), profile.essay_service(self.client))
+                else:
+                    from batch import DEFAULT_JOB, load_profile
+                    self._profiles[name] = (load_profile(DEFAULT_JOB), self.store, None)
+            return self._profiles[name]
+
+    def fill(self, url, profile):
+        from main import fill_application
+        user_info, state, essays = self._profile(profile)
+        if state.get(url) and state.get(url)[0] == 'completed':
+            return
+        if fill_application(url, user_info, test=not self.submit, browsers=self.browsers, interactive=False,
+                            store=state, essay_service=essays) and self.submit:
+            state.upsert(url, 'completed', 'Submitted by queue worker')
+
+    def run_one(self):
+        """Lease and run one job; returns False when nothing was ready."""
+        job = self.queue.lease(self.name, self.kinds)
+        if job is None:
+            return False
+        job_id, kind, url, profile = job
+        seconds = LEASE_SECONDS.get(kind, 300)
+        with Heartbeat(self.queue, job_id, self.name, seconds):
+            try:
+                with span('queue_job', url=url, kind=kind):
+                    if kind == 'triage':
+                        self.triage(url)
+                    else:
+                        self.fill(url, profile)
+            except Exception as e:
+                print(f"[{self.name}] {kind} {url} failed: {e}")
+                self.queue.fail(job_id, self.name, f"{type(e).__name__}: {e}")
+                return True
+        self.queue.complete(job_id, self.name)
+        return True
+
+    def run(self, exit_when_empty=False, idle_sleep=5):
+        while True:
+            if self.run_one():
+                continue
+            if exit_when_empty and not self.queue.pending(self.kinds):
+                return
+            time.sleep(idle_sleep)
+
+    def close(self):
+        for _, state, _ in self._profiles.values():
+            if state is not self.store:
+                state.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Queue triage and form filling jobs and run workers for them')
+    parser.add_argument('--db', default='jobs.db', help='Queue database shared by every worker')
+    parser.add_argument('--domain-cap', type=int, default=2, help='Jobs leased at once per site across all workers')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help='Queue triage jobs')
+    enqueue.add_argument('urls', nargs='*', help='Links to triage (default: pending links in links.db)')
+    worker = commands.add_parser('worker', help='Run jobs until stopped')
+    worker.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS)
+    worker.add_argument('--threads', type=int, default=1, help='Worker loops in this process, each with a headless browser')
+    worker.add_argument('--profiles', nargs='*', default=[''],
+                        help='Profiles (see profiles.py) to queue fills for when a link is open (default: user_info.txt)')
+    worker.add_argument('--submit', action='store_true', help='Submit filled forms (default: fill only)')
+    worker.add_argument('--no-preclassifier', action='store_true')
+    worker.add_argument('--exit-when-empty', action='store_true', help='Stop once no jobs are queued or leased')
+    worker.add_argument('--trace', help='Write timing spans to this JSON lines file')
+    commands.add_parser('stats', help='Show job counts by kind and state')
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db, max_attempts=args.max_attempts, domain_cap=args.domain_cap)
+    try:
+        if args.command == 'enqueue':
+            urls = args.urls
+            if not urls:
+                from link_store import open_link_store
+                from main import PENDING
+                store = open_link_store()
+                urls = store.urls_with_status(PENDING)
+                store.close()
+            added = sum(queue.enqueue('triage', url) for url in urls)
+            print(f"Queued {added} new triage job(s) of {len(urls)}.")
+        elif args.command == 'stats':
+            for kind, states in sorted(queue.stats().items()):
+                print(f"{kind:<8}" + '  '.join(f"{state} {count}" for state, count in sorted(states.items())))
+        else:
+            import tracing
+            from browser_pool import BrowserPool
+            from fetch_tier import FetchTier
+            from link_store import open_link_store
+            from main import get_cache, get_client
+            from preclassifier import PreClassifier
+            tracing.configure(args.trace)
+            store = open_link_store()
+            browsers = BrowserPool(size=args.threads, headless=True, page_load_timeout=20)
+            preclassifier = None if args.no_preclassifier else PreClassifier()
+            tier = FetchTier(browsers)
+            workers = [Worker(queue, store, browsers, get_client(), get_cache(), args.kinds, args.profiles,
+                              args.submit, preclassifier, tier=tier) for _ in range(args.threads)]
+            # Daemon threads so Ctrl-C stops the process; unfinished leases simply expire and are retried
+            threads = [threading.Thread(target=w.run, args=(args.exit_when_empty,), name=w.name, daemon=True)
+                       for w in workers]
+            try:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                for w in workers:
+                    w.close()
+                browsers.close()
+                store.close()
+            print(tier.report())
+            print(tracing.report())
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class LinkStore:
+    """SQLite-backed record of every scholarship link and its triage status.
+
+    Each URL has exactly one row, so re-triaging a link updates it in place
+    instead of appending a duplicate line like links.txt did.
+    """
+
+    def __init__(self, path='links.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        # Queue workers in other processes write here too; wait for their locks instead of failing
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS links ("
+            "url TEXT PRIMARY KEY, status TEXT, details TEXT, "
+            "first_seen REAL, last_checked REAL);"
+            "CREATE INDEX IF NOT EXISTS idx_links_status ON links(status);"
+            "CREATE INDEX IF NOT EXISTS idx_links_last_checked ON links(last_checked);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS review_queue ("
+            "url TEXT, stage TEXT, reason TEXT, created REAL, resolved INTEGER DEFAULT 0, "
+            "PRIMARY KEY (url, stage));"
+        )
+        self._conn.commit()
+
+    def has(self, url):
+        """Return True if the link has been seen before (primary-key lookup)."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM links WHERE url = ?", (url,)).fetchone()
+        return row is not None
+
+    def get(self, url):
+        """Return (status, details, last_checked) for url, or None if unknown."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT status, details, last_checked FROM links WHERE url = ?", (url,)
+            ).fetchone()
+
+    def upsert(self, url, status, details='', checked_at=None):
+        """Insert the link or update its status and details in place."""
+        now = checked_at if checked_at is not None else time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO links (url, status, details, first_seen, last_checked) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET status = excluded.status, details = excluded.details, "
+                "last_checked = excluded.last_checked",
+                (url, status, details, now, now)
+            )
+            self._conn.commit()
+
+    def urls_with_status(self, status, limit=None):
+        """Return URLs with the given status, most recently checked first."""
+        sql = "SELECT url FROM links WHERE status = ? ORDER BY last_checked DESC"
+        params = (status,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (status, limit)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+    def count(self, status=None):
+        with self._lock:
+            if status is None:
+                return self._conn.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM links WHERE status = ?", (status,)).fetchone()[0]
+
+    def add_review(self, url, stage, reason):
+        """Queue a link that needs a human (CAPTCHA, login, unreadable form)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO review_queue (url, stage, reason, created, resolved) VALUES (?, ?, ?, ?, 0) "
+                "ON CONFLICT(url, stage) DO UPDATE SET reason = excluded.reason, resolved = 0",
+                (url, stage, reason, time.time())
+            )
+            self._conn.commit()
+
+    def pending_reviews(self, stage=None):
+        """Return unresolved (url, stage, reason) review items, oldest first."""
+        sql = "SELECT url, stage, reason FROM review_queue WHERE resolved = 0"
+        params = ()
+        if stage is not None:
+            sql += " AND stage = ?"
+            params = (stage,)
+        with self._lock:
+            return self._conn.execute(sql + " ORDER BY created", params).fetchall()
+
+    def resolve_review(self, url, stage):
+        with self._lock:
+            self._conn.execute("UPDATE review_queue SET resolved = 1 WHERE url = ? AND stage = ?", (url, stage))
+            self._conn.commit()
+
+    def import_links_txt(self, path='links.txt'):
+        """One-time import of a legacy links.txt; returns the number of lines imported.
+
+        Later lines win, matching how status changes used to be appended.
+        """
+        marker = f"imported:{os.path.abspath(path)}"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+        if not os.path.exists(path):
+            return 0
+        rows = []
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as f:
+            for line in f:
+                parts = [x.strip() for x in line.split('|', 2)]
+                url = parts[0]
+                if not url.startswith('http'):
+                    continue  # Skip placeholder/comment lines
+                status = parts[1] if len(parts) > 1 else 'completed'
+                details = parts[2] if len(parts) > 2 else ''
+                rows.append((url, status, details, mtime, mtime))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO links (url, status, details, first_seen, last_checked) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET status = excluded.status, details = excluded.details",
+                rows
+            )
+            self._conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(time.time())))
+            self._conn.commit()
+        return len(rows)
+
+    def export_links_txt(self, path='links.txt'):
+        """Write one 'url | status | details' line per link for reading by hand."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, status, details FROM links ORDER BY first_seen").fetchall()
+        with open(path, 'w') as f:
+            for url, status, details in rows:
+                f.write(f"{url} | {status} | {details}\n")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_link_store(path='links.db', legacy_path='links.txt'):
+    """Open the link store, importing an existing links.txt the first time."""
+    store = LinkStore(path)
+    imported = store.import_links_txt(legacy_path)
+    if imported:
+        print(f"Imported {imported} links from {legacy_path} into {path}.")
+    return store
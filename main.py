@@ -1,29 +1,47 @@
+"""Scholarship Engine command line: search, triage, fill and report.
+
+    python main.py            search, then triage the new links (same as `run`)
+    python main.py search     search and save new links for a later triage
+    python main.py triage     classify links saved by `search`
+    python main.py fill       fill the applications of open links
+    python main.py report     link counts by status and the review queue
+
+Selenium, the Gemini SDK, pdfplumber and the HTTP clients are imported by the
+functions that use them, and the Gemini client and on-disk stores are built on
+first use, so `--help` and `report` start quickly and need no API key.
+`python benchmark.py --startup` checks startup time against a budget.
+"""
 import os
+import sys
 import json
+import re
 import argparse
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import Select
-from webdriver_manager.chrome import ChromeDriverManager
-from google import genai
-from googlesearch import search
-import pdfplumber
-def load_completed_scholarships():
-    try:
-        with open('links.txt', 'r') as f:
-            return set(line.strip() for line in f if line.strip())
-    except FileNotFoundError:
-        return set()
-
-def save_completed_scholarships(completed):
-    with open('links.txt', 'a') as f:  # Append
-        for url in completed:
-            f.write(url + '\n')
-
-def load_user_info():
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from essay_service import shared_essay_service
+from form_templates import FormTemplateStore, form_fingerprint
+from gemini_cache import GeminiCache
+from gemini_client import RateLimitedClient
+from link_store import open_link_store
+from preclassifier import PreClassifier
+from prompt_compaction import DEFAULT_TOKEN_BUDGET, compact_html
+from query_plan import clean_url, expand_queries, normalize_url, run_query_plan
+from search_providers import FIXTURE_DIR, GoogleSearchProvider, get_provider
+from triage import has_captcha, read_body_text
+import tracing
+from tracing import span
+def load_completed_scholarships(store):
+    """Return links marked completed in the link store."""
+    return set(store.urls_with_status('completed'))
+
+def save_completed_scholarships(store, completed):
+    for url in completed:
+        store.upsert(url, 'completed')
+
+def load_user_info(path='user_info.txt'):
     info = {}
     try:
-        with open('user_info.txt', 'r') as f:
+        with open(path, 'r') as f:
             for line in f:
                 if ':' in line:
                     key, value = line.split(':', 1)
@@ -32,43 +50,131 @@ def load_user_info():
         pass
     return info
 
-def save_user_info(info):
-    with open('user_info.txt', 'w') as f:
+def save_user_info(info, path='user_info.txt'):
+    with open(path, 'w') as f:
         for key, value in info.items():
             if key in ['essays', 'transcript']:
                 continue  # Skip long text fields
             f.write(f"{key}: {value}\n")
 
-def is_scholarship_applicable(url, user_info):
-    """Use Gemini to check if the scholarship is applicable based on grade level."""
-    try:
+_http_session = None
+
+def http_session():
+    """Shared requests session so repeated fetches reuse connections."""
+    global _http_session
+    if _http_session is None:
         import requests
-        response = requests.get(url, timeout=10)
-        page_text = response.text[:5000]  # First 5000 chars
+        _http_session = requests.Session()
+    return _http_session
+
+def is_scholarship_applicable(url, user_info, index=None):
+    """Use Gemini to check if the scholarship is applicable based on grade level.
+
+    With an EligibilityIndex that has a record for url, the answer comes from
+    the record (every eligibility rule, no model call). For many profiles or
+    URLs at once use EligibilityIndex.match or async_engine.check_applicable_all.
+    """
+    if index is not None:
+        eligible = index.is_eligible(url, user_info)
+        if eligible is not None:
+            return eligible
+    try:
+        response = http_session().get(url, timeout=10)
+        # Strip markup/boilerplate and keep the text most relevant to eligibility
+        page_text = compact_html(response.text)
         prompt = f"Based on the following page text, is this scholarship applicable for a {user_info['grade_level']} student? Answer with 'yes' or 'no' only."
-        prompt_with_text = f"{prompt}\n\n{page_text}"
-        response = client.models.generate_content(
-            model='gemini-3-flash-preview',
-            contents=prompt_with_text
-        )
-        return 'yes' in response.text.lower()
-    except:
+        answer = get_cache().generate(get_client(), 'gemini-3-flash-preview', prompt, page_text)
+        return 'yes' in answer.lower()
+    except Exception as e:
+        print(f"Could not check applicability of {url}: {e}")
         return True  # If can't check, assume applicable
 
+# Profile fields every run needs before searching
+REQUIRED_FIELDS = ['name', 'grade_level', 'gender', 'race', 'school', 'gpa_weighted', 'resident', 'city', 'state']
+
 def load_api_key():
+    """The Gemini API key from GEMINI_API_KEY, else api_key.txt; shared by every profile."""
+    if os.environ.get('GEMINI_API_KEY'):
+        return os.environ['GEMINI_API_KEY'].strip()
     try:
         with open('api_key.txt', 'r') as f:
             return f.read().strip()
     except FileNotFoundError:
         raise ValueError("API key file 'api_key.txt' not found. Please create it with your Gemini API key.")
 
-# Configure Gemini API
-api_key = load_api_key()
-client = genai.Client(api_key=api_key)
+# Built on first use by the getters below; tests and the benchmark may assign their own
+client = None
+cache = None
+essay_service = None
+templates = None
+# Queue worker threads may all ask for these at once; get_essay_service calls get_client
+_init_lock = threading.RLock()
+
+def get_client():
+    """Gemini client shared by every call: one rate limiter, retry policy and circuit breaker."""
+    global client
+    if client is None:
+        with _init_lock:
+            if client is None:
+                from google import genai
+                client = RateLimitedClient(genai.Client(api_key=load_api_key()))
+    return client
+
+def get_cache():
+    """Shared on-disk cache so unchanged pages don't cost another model call."""
+    global cache
+    if cache is None:
+        with _init_lock:
+            if cache is None:
+                cache = GeminiCache()
+    return cache
+
+def get_essay_service():
+    """Essay drafts are reused whenever the same prompt shows up on another form."""
+    global essay_service
+    if essay_service is None:
+        with _init_lock:
+            if essay_service is None:
+                essay_service = shared_essay_service(get_client(), model='gemini-1.5-flash')
+    return essay_service
+
+def get_templates():
+    """Field/selector layouts of forms already analyzed, keyed by domain and form structure."""
+    global templates
+    if templates is None:
+        with _init_lock:
+            if templates is None:
+                templates = FormTemplateStore()
+    return templates
+
+def load_essays(pattern='essay{}.txt'):
+    """Load essay1.txt, essay2.txt, etc. until no more files are found."""
+    essays = []
+    i = 1
+    while True:
+        filename = pattern.format(i)
+        try:
+            with open(filename, 'r') as f:
+                essays.append(f.read())
+            i += 1
+        except FileNotFoundError:
+            break
+    return essays
+
+def build_search_query(search_query, omit_criteria, user_info):
+    """Add the omit term and, unless already mentioned, the user's city and state."""
+    search_terms = search_query
+    if omit_criteria:
+        search_terms += f" -{omit_criteria}"
+    city = user_info.get('city', '')
+    state = user_info.get('state', '')
+    if city and state and city.lower() not in search_terms.lower() and state.lower() not in search_terms.lower():
+        search_terms += f" {city} {state}"
+    return search_terms
 
-def get_user_info():
+def get_user_info(path='user_info.txt', essay_pattern='essay{}.txt'):
     """Collect user information via prompts, loading existing if available."""
-    info = load_user_info()
+    info = load_user_info(path)
     
 
     fields = [
@@ -90,57 +196,54 @@ def get_user_info():
         if key not in info or not info[key]:
             info[key] = input(prompt).strip()
 
-    # Transcript
+    # Transcript: extract in the background while the remaining prompts run
     if 'transcript_path' not in info:
-        transcript_path = input("Enter path to transcript file (PDF or TXT), leave blank to skip: ").strip()
-        info['transcript_path'] = transcript_path
-        if not transcript_path:
-            info['transcript'] = "N/A"
-        else:
-            info['transcript'] = extract_text_from_file(transcript_path)
+        info['transcript_path'] = input("Enter path to transcript file (PDF or TXT), leave blank to skip: ").strip()
+    transcript_pool = ThreadPoolExecutor(max_workers=1)
+    transcript_future = None
+    if info['transcript_path']:
+        # A relative path is relative to the info file, as profiles.py saves it
+        transcript_path = info['transcript_path']
+        if not os.path.isabs(transcript_path):
+            transcript_path = os.path.join(os.path.dirname(path), transcript_path)
+        transcript_future = transcript_pool.submit(extract_text_from_file, transcript_path)
+    else:
+        info['transcript'] = "N/A"
     
     # Essays: load from essay1.txt, essay2.txt, etc.
-    essays = []
-    i = 1
-    while True:
-        filename = f'essay{i}.txt'
-        try:
-            with open(filename, 'r') as f:
-                essays.append(f.read())
-            i += 1
-        except FileNotFoundError:
-            break
-    info['essays'] = essays
+    info['essays'] = load_essays(essay_pattern)
     
     # Extra details
     if 'country' not in info:
         info['country'] = input("Enter your country (optional): ") or None
-    
+
+    if transcript_future is not None:
+        try:
+            info['transcript'] = transcript_future.result()
+        except Exception as e:
+            # A moved or unreadable transcript shouldn't stop the run
+            print(f"Could not read transcript {info['transcript_path']}: {e}")
+            info['transcript'] = "N/A"
+    transcript_pool.shutdown()
+
     return info
 
 def extract_text_from_file(file_path):
-    """Extract text from PDF or TXT file."""
-    if file_path.endswith('.pdf'):
-        with pdfplumber.open(file_path) as pdf:
-            text = ''
-            for page in pdf.pages:
-                text += page.extract_text()
-        return text
-    elif file_path.endswith('.txt'):
-        with open(file_path, 'r') as f:
-            return f.read()
+    """Extract a transcript from PDF or TXT file as prompt-ready course rows."""
+    if file_path.endswith('.pdf') or file_path.endswith('.txt'):
+        # Pages are extracted in parallel and the result is cached by file hash
+        from transcript import load_transcript, transcript_for_prompt
+        return transcript_for_prompt(load_transcript(file_path))
     else:
         return "Unsupported file type"
 
-def search_scholarships(query, num_results=5):
-    """Search for scholarships using Google."""
-    results = list(search(query, num_results=num_results))
-    return results
+def search_scholarships(query, num_results=5, provider=None):
+    """Search for scholarships with a search provider (googlesearch-python by default)."""
+    provider = provider or GoogleSearchProvider()
+    return provider(query, num_results, 0)
 
-def analyze_page_with_gemini(image_path, prompt):
-    """Use Gemini to analyze the screenshot."""
-    with open(image_path, 'rb') as f:
-        image_data = f.read()
+def analyze_page_with_gemini(image_data, prompt, valid=None):
+    """Use Gemini to analyze a screenshot given as PNG bytes; valid(text) decides what gets cached."""
     # Use the correct Gemini SDK format for image input
     image_part = {
         'inline_data': {
@@ -149,25 +252,85 @@ def analyze_page_with_gemini(image_path, prompt):
         }
     }
     contents = [prompt, image_part]
-    response = client.models.generate_content(
-        model='gemini-3-flash-preview',
-        contents=contents
-    )
-    return response.text
-
-def fill_application(url, user_info, test=False):
-    """Navigate to URL, analyze, and fill form."""
-    options = webdriver.ChromeOptions()
-    # Never use headless mode, always show browser window
-    # (No options.add_argument("--headless"))
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    print(f"Opening {url} in browser...")
-    driver.get(url)
-    time.sleep(3)  # Wait for page load
+    return get_cache().generate(get_client(), 'gemini-3-flash-preview', prompt, image_data, contents=contents,
+                                valid=valid)
 
-    # Take screenshot
-    screenshot_path = 'screenshot.png'
-    driver.save_screenshot(screenshot_path)
+def parse_form_analysis(analysis):
+    """The form description as a dict, with any ```json fences removed; None if it isn't JSON."""
+    cleaned = re.sub(r'^```(?:json)?|```$', '', (analysis or '').strip()).strip()
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _is_essay_label(label, field_type):
+    return 'essay' in label or 'personal statement' in label or 'textarea' in field_type
+
+def fill_application(url, user_info, test=False, browsers=None, interactive=True, store=None, essay_service=None):
+    """Navigate to URL, analyze, and fill form.
+
+    With interactive=False nothing waits on input(): pages that need a human
+    (CAPTCHA, login, unreadable form) go to the store's review queue and the
+    function returns False. Returns True only once a submit button was
+    clicked (in test mode, found), so callers can mark the link completed.
+    Pass a profile's own EssayService to keep its drafts apart from other
+    profiles'.
+    """
+    # Interactive runs never use headless mode, always show browser window
+    own_browsers = browsers is None
+    if own_browsers:
+        from browser_pool import BrowserPool
+        browsers = BrowserPool(size=1)
+    driver = browsers.acquire()
+    try:
+        with span('fill_application', url=url) as s:
+            filled = _fill_form(driver, url, user_info, test, interactive, store, essay_service)
+            s.set(filled=filled)
+            return filled
+    finally:
+        # Hand the browser back so the next application skips a cold Chrome start
+        browsers.release(driver)
+        if own_browsers:
+            browsers.close()
+
+def _fill_field(element, label, field_type, field, user_info, essays):
+    """Fill one field Gemini described from the profile or a generated essay."""
+    if field_type == 'select':
+        from selenium.webdriver.support.ui import Select
+        select = Select(element)
+        if 'race' in label:
+            select.select_by_visible_text(user_info['race'])
+            print("Selected race")
+        elif 'ethnicity' in label:
+            select.select_by_visible_text(user_info['ethnicity'])
+            print("Selected ethnicity")
+        elif 'gender' in label:
+            select.select_by_visible_text(user_info['gender'])
+            print("Selected gender")
+        # Add more
+    elif field_type in ['text', 'textarea']:
+        if 'name' in label:
+            element.send_keys(user_info['name'])
+            print("Filled name")
+        elif 'school' in label:
+            element.send_keys(user_info['school'])
+            print("Filled school")
+        elif 'gpa' in label:
+            element.send_keys(user_info['gpa_weighted'])
+            print("Filled GPA")
+        elif _is_essay_label(label, field_type):
+            essay_response = essays.get(field.get('prompt', label))
+            if essay_response:
+                element.send_keys(essay_response)
+                print("Filled essay with generated response.")
+        # Add more conditions
+
+def _analyze_form(driver, url, interactive, store):
+    """Describe the form's fields and buttons with Gemini vision; returns None if unreadable."""
+    # Take the screenshot in memory; concurrent fills would overwrite a shared file
+    with span('dom_extract', method='screenshot'):
+        screenshot = driver.get_screenshot_as_png()
 
     # Prompt for Gemini
     prompt = """
@@ -186,18 +349,67 @@ def fill_application(url, user_info, test=False):
     }
     """
 
-    analysis = analyze_page_with_gemini(screenshot_path, prompt)
-    print("Gemini Analysis:", analysis)
-
-    # Parse JSON (assuming Gemini returns valid JSON)
-    try:
-        data = json.loads(analysis)
-    except:
+    # Only answers that parse are cached; a bad one is asked again next time
+    analysis = analyze_page_with_gemini(screenshot, prompt,
+                                        valid=lambda text: parse_form_analysis(text) is not None)
+    data = parse_form_analysis(analysis)
+    if data is None:
         print("Failed to parse Gemini response as JSON.")
-        input("Press enter to continue or 'q' to quit: ")
-        driver.quit()
-        os.remove(screenshot_path)
-        return
+        if interactive:
+            with span('user_wait', url=url):
+                input("Press enter to continue or 'q' to quit: ")
+        else:
+            store.add_review(url, 'fill', 'Could not parse form analysis')
+        return None
+    print(f"Gemini found {len(data.get('fields', []))} field(s) and {len(data.get('buttons', []))} button(s).")
+    return data
+
+def _fill_form(driver, url, user_info, test, interactive, store, essay_service=None):
+    from selenium.webdriver.common.by import By
+    from dom_snapshot import take_form_snapshot
+    from page_ready import click_and_wait, navigate, print_wait_report
+    print(f"Opening {url} in browser...")
+    waited = navigate(driver, url, form_timeout=10)
+    print(f"Page ready after {waited:.2f}s")
+
+    if not interactive:
+        reason = None
+        if has_captcha(read_body_text(driver)):
+            reason = 'CAPTCHA or anti-bot check'
+        elif driver.find_elements(By.CSS_SELECTOR, "input[type='password']"):
+            reason = 'Login required'
+        if reason:
+            print(f"{reason} on {url}; added to the review queue.")
+            store.add_review(url, 'fill', reason)
+            return False
+
+    # Forms already learned on this domain (or portal) skip the screenshot and vision call
+    with span('dom_extract', method='snapshot') as s:
+        fingerprint = form_fingerprint(take_form_snapshot(driver))
+        data = get_templates().match(driver, url, fingerprint)
+        s.set(template_hit=data is not None)
+    if data is not None:
+        print("Filling from a cached form template.")
+    else:
+        data = _analyze_form(driver, url, interactive, store)
+        if data is None:
+            return False
+        if data.get('fields'):
+            get_templates().put(url, fingerprint, data)
+
+    # Generate every essay on the page up front, one call per distinct prompt
+    essay_prompts = []
+    for field in data.get('fields', []):
+        label = field['label'].lower()
+        if not field.get('selector') or field.get('type') not in ['text', 'textarea']:
+            continue
+        # Name/school/GPA fields are filled directly below, even when they are textareas
+        if any(word in label for word in ('name', 'school', 'gpa')):
+            continue
+        if _is_essay_label(label, field.get('type')):
+            essay_prompts.append(field.get('prompt', label))
+    essay_service = essay_service or get_essay_service()
+    essays = essay_service.generate_all(essay_prompts, user_info) if essay_prompts else {}
 
     # Fill fields
     for field in data.get('fields', []):
@@ -211,67 +423,79 @@ def fill_application(url, user_info, test=False):
         except:
             continue
 
-        if field_type == 'select':
-            select = Select(element)
-            if 'race' in label:
-                select.select_by_visible_text(user_info['race'])
-                print(f"Selected race: {user_info['race']}")
-            elif 'ethnicity' in label:
-                select.select_by_visible_text(user_info['ethnicity'])
-                print(f"Selected ethnicity: {user_info['ethnicity']}")
-            elif 'gender' in label:
-                select.select_by_visible_text(user_info['gender'])
-                print(f"Selected gender: {user_info['gender']}")
-            # Add more
-        elif field_type in ['text', 'textarea']:
-            if 'name' in label:
-                element.send_keys(user_info['name'])
-                print(f"Filled name: {user_info['name']}")
-            elif 'school' in label:
-                element.send_keys(user_info['school'])
-                print(f"Filled school: {user_info['school']}")
-            elif 'gpa' in label:
-                element.send_keys(user_info['gpa_weighted'])
-                print(f"Filled GPA: {user_info['gpa_weighted']}")
-            elif 'essay' in label or 'personal statement' in label or 'textarea' in field_type:
-                prompt_text = field.get('prompt', label)
-                essay_prompt = f"Write an essay responding to this prompt: {prompt_text}. Use the following information from the user: {user_info['essays']}"
-                essay_response = client.models.generate_content(
-                    model='gemini-1.5-flash',
-                    contents=essay_prompt
-                ).text
-                element.send_keys(essay_response)
-                print(f"Filled essay with generated response.")
-            # Add more conditions
+        # Log which fields were filled, never the values themselves
+        try:
+            with span('field_fill', label=label, type=field_type):
+                _fill_field(element, label, field_type, field, user_info, essays)
+        except Exception as e:
+            print(f"Could not fill field '{label}': {e}")
 
     # Click submit or next
+    submitted = False
     for button in data.get('buttons', []):
         if 'submit' in button['label'].lower():
-            if test:
-                print(f"Test mode: Would click submit button: {button['selector']}")
-            else:
-                driver.find_element(By.CSS_SELECTOR, button['selector']).click()
+            with span('submit', test=test) as s:
+                if test:
+                    print(f"Test mode: Would click submit button: {button['selector']}")
+                    submitted = True
+                else:
+                    try:
+                        click_and_wait(driver, driver.find_element(By.CSS_SELECTOR, button['selector']))
+                        submitted = True
+                    except Exception as e:
+                        print(f"Could not click submit button {button['selector']}: {e}")
+                s.set(submitted=submitted)
             break
+    if not submitted and not test:
+        print(f"No submit button was clicked on {url}.")
+        if not interactive:
+            store.add_review(url, 'fill', 'Submit button not found or not clickable')
+
+    print_wait_report()
+    if interactive:
+        with span('user_wait', url=url):
+            input("Done filling, press enter to continue: ")
+    return submitted
+
+def _new_links(links, store):
+    """Clean result links and drop duplicates and links already in the store."""
+    found_links = []
+    seen = set()
+    for href in links:
+        href = clean_url(href)
+        key = normalize_url(href)
+        if key not in seen and not store.has(href):
+            seen.add(key)
+            found_links.append(href)
+    return found_links
+
+COMMANDS = ('run', 'search', 'triage', 'fill', 'report')
+# Status of links found by `search` and not triaged yet
+PENDING = 'pending'
+LINK_STATUSES = [PENDING, 'open', 'closed', 'completed', 'not found']
+
+def _profile(args):
+    """Prompt for anything missing from the saved profile; returns None if it is still incomplete.
+
+    With --profile NAME the profile comes from profiles/NAME/ instead of the working directory.
+    """
+    if args.profile:
+        from profiles import ProfileRegistry
+        profile = ProfileRegistry().get(args.profile)
+        user_info = get_user_info(profile.info_path, profile.essay_pattern)
+        save_user_info(user_info, profile.info_path)
+    else:
+        user_info = get_user_info()
+        save_user_info(user_info)
 
-    input("Done filling, press enter to continue: ")
-    driver.quit()
-    os.remove(screenshot_path)
-
-def main():
-    parser = argparse.ArgumentParser(description='Automated Scholarship Filler')
-    parser.add_argument('--test', action='store_true', help='Run in test mode without submitting forms')
-    args = parser.parse_args()
-
-    user_info = get_user_info()
-    save_user_info(user_info)
-    
     # Check if all required fields are present
-    required = ['name', 'grade_level', 'gender', 'race', 'school', 'gpa_weighted', 'resident', 'city', 'state']
-    if not all(key in user_info and user_info[key] for key in required):
+    if not all(key in user_info and user_info[key] for key in REQUIRED_FIELDS):
         print("Some required info missing. Run again to complete setup.")
-        return
-    
+        return None
+    return user_info
 
+def _search(args, user_info, store, driver=None):
+    """Prompt for search criteria and return new result links, best first."""
     print("\n--- Scholarship Search ---")
     print("You can search for scholarships by any criteria (e.g., major, interests, demographic, city, state, etc.)")
     print(f"Your saved city: {user_info.get('city', '')}, state: {user_info.get('state', '')}")
@@ -279,149 +503,212 @@ def main():
     search_query = input("Enter your scholarship search criteria (e.g., 'engineering scholarships for women in California'): ").strip()
 
     omit_criteria = input("Any specific criteria to omit (e.g., keywords, leave blank if none): ").strip()
-    query = search_query
-    if omit_criteria:
-        query += f" -{omit_criteria}"
 
     num_results = int(input("How many links to search through on Google? ").strip())
 
-
-    # Open Google search in browser for user to handle CAPTCHA if needed
-    import urllib.parse
-    search_terms = query
-    city = user_info.get('city', '')
-    state = user_info.get('state', '')
-    if city and state and city.lower() not in search_terms.lower() and state.lower() not in search_terms.lower():
-        search_terms += f" {city} {state}"
-    encoded_query = urllib.parse.quote_plus(search_terms)
-    url = f"https://www.google.com/search?q={encoded_query}"
-    from selenium import webdriver
-    from selenium.webdriver.chrome.service import Service
-    from webdriver_manager.chrome import ChromeDriverManager
-    options = webdriver.ChromeOptions()
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.get(url)
-    input("If a CAPTCHA appears, please solve it in the browser. When you are done, press Enter here to continue...")
-    import time
-    from selenium.webdriver.common.by import By
-    time.sleep(2)  # Wait for page to fully load
-    # Load all completed/omitted links (strip off status/details if present)
-    completed = set()
+    search_terms = build_search_query(search_query, omit_criteria, user_info)
+    provider = get_provider(args.search_provider, driver=driver, fixture_dir=args.fixtures, record=args.record_fixtures,
+                            skip=store.has)
+    # Links already in the store (any status) are omitted from this run
+    if args.query_plan:
+        # Fan out over profile-derived queries and merge the results before fetching anything
+        queries = expand_queries(user_info, base_query=search_terms)
+        # The selenium provider searches one page at a time in the visible browser; keep that to one page per query
+        pages = 1 if args.search_provider == 'selenium' else 2
+        found_links = run_query_plan(queries, search_page=provider, pages=pages, skip=store.has)
+    else:
+        found_links = _new_links(search_scholarships(search_terms, num_results, provider), store)
+    return found_links[:num_results]
+
+def _triage(links, store, args, driver=None):
+    """Classify links into the store; CAPTCHA sites are reopened in driver for you to solve."""
+    from triage import triage_links
+    preclassifier = None if args.no_preclassifier else PreClassifier()
+    if args.engine == 'async':
+        # Plain async HTTP first; only pages that need JavaScript or hit a bot wall go to Chrome
+        from async_engine import triage_links_async
+        links = triage_links_async(links, get_client(), store, cache=get_cache(), preclassifier=preclassifier,
+                                   token_budget=args.token_budget, per_host=args.per_host)
+    if not links:
+        if preclassifier is not None:
+            print(preclassifier.report())
+        return
+    browsers = None
+    if driver is None:
+        # Chrome is only started when some page actually needs it
+        from browser_pool import BrowserPool
+        browsers = BrowserPool(size=1)
+        driver = browsers.acquire()
     try:
-        with open('links.txt', 'r') as f:
-            for line in f:
-                if '|' in line:
-                    url = line.split('|', 1)[0].strip()
-                else:
-                    url = line.strip()
-                if url:
-                    completed.add(url)
-    except FileNotFoundError:
-        pass
+        # Fetch and classify the rest in browsers; CAPTCHA sites come back to the visible browser
+        triage_links(links, get_client(), store, driver,
+                     fetch_workers=args.fetch_workers, model_workers=args.model_workers, cache=get_cache(),
+                     token_budget=args.token_budget, preclassifier=preclassifier,
+                     http_first=args.engine == 'threads' and not args.browser_fetch)
+    finally:
+        if browsers is not None:
+            browsers.release(driver)
+            browsers.close()
+
+def cmd_run(args):
+    """Search, then triage the new links in one session (the original flow)."""
+    user_info = _profile(args)
+    if user_info is None:
+        return
+    # The selenium provider opens Google in this browser so the user can handle a CAPTCHA;
+    # triage also hands CAPTCHA sites back to it
+    from browser_pool import BrowserPool
+    browsers = BrowserPool(size=1)
+    driver = browsers.acquire()
+    store = open_link_store()
+    try:
+        _triage(_search(args, user_info, store, driver), store, args, driver)
+    finally:
+        store.close()
+    print(tracing.report())
+    input("Press Enter to close the browser and finish...")
+    browsers.release(driver)
+    browsers.close()
 
-    # Find all organic search result links
-    organic_results = driver.find_elements(By.CSS_SELECTOR, 'div.g')
-    found_links = []
-    for result in organic_results:
-        try:
-            link = result.find_element(By.CSS_SELECTOR, 'a')
-            href = link.get_attribute('href')
-            if href and href.startswith('http') and 'google.com' not in href and href not in completed and href not in found_links:
-                found_links.append(href)
-        except Exception:
-            continue
-    # Fallback: try all visible a[href] links if not enough found
-    if len(found_links) < num_results:
-        links = driver.find_elements(By.CSS_SELECTOR, 'a[href]')
-        for link in links:
-            href = link.get_attribute('href')
-            if href and href.startswith('http') and 'google.com' not in href and href not in completed and href not in found_links:
-                found_links.append(href)
-            if len(found_links) >= num_results:
-                break
-
-    # Process up to num_results links, skipping omitted/completed
-    for idx, link_url in enumerate(found_links[:num_results]):
-        if link_url in completed:
-            print(f"Skipping omitted/completed link: {link_url}")
-            continue
-        print(f"Opening search result {idx+1}: {link_url}")
-        driver.get(link_url)
-        time.sleep(2)
-        # Extract visible text from the page
-        try:
-            page_text = driver.find_element(By.TAG_NAME, "body").text
-        except Exception:
-            page_text = ""
-
-        # Detect CAPTCHA/Cloudflare/robot checks
-        capcha_keywords = [
-            'captcha', 'cloudflare', 'robot check', 'are you human', 'verify you are human',
-            'please stand by', 'checking your browser', 'press and hold', 'security check',
-            'unusual traffic', 'verify you are not a robot', 'solve the puzzle', 'protection from attacks'
-        ]
-        if any(word in page_text.lower() for word in capcha_keywords):
-            print("CAPTCHA or anti-bot detected on this scholarship site!")
-            user_choice = input("Solve the CAPTCHA and press Enter to continue, or type 's' to skip this site: ").strip().lower()
-            if user_choice == 's':
-                # Mark as not found and skip
-                with open('links.txt', 'a') as f:
-                    f.write(f"{link_url} | not found | Skipped due to CAPTCHA\n")
-                print(f"Skipped {link_url} and marked as not found.")
-                driver.back()
-                time.sleep(2)
-                continue
-            # After user solves, try to reload text
+def cmd_search(args):
+    """Search and save the new links as pending so `triage` can pick them up later."""
+    user_info = _profile(args)
+    if user_info is None:
+        return
+    browsers = driver = None
+    if args.search_provider == 'selenium':
+        from browser_pool import BrowserPool
+        browsers = BrowserPool(size=1)
+        driver = browsers.acquire()
+    store = open_link_store()
+    try:
+        links = _search(args, user_info, store, driver)
+        for url in links:
+            store.upsert(url, PENDING, 'Found by search')
+        print(f"Saved {len(links)} new link(s); run `python main.py triage` to classify them.")
+    finally:
+        store.close()
+        if browsers is not None:
+            browsers.release(driver)
+            browsers.close()
+    print(tracing.report())
+
+def cmd_triage(args):
+    """Classify the links a previous `search` saved."""
+    store = open_link_store()
+    try:
+        # Links blocked by a CAPTCHA wait in the review queue instead of being fetched again
+        blocked = {url for url, _, _ in store.pending_reviews('triage')}
+        links = [url for url in store.urls_with_status(PENDING) if url not in blocked][:args.limit]
+        if not links:
+            print("No pending links; run `python main.py search` first.")
+            return
+        print(f"Triaging {len(links)} pending link(s)...")
+        _triage(links, store, args)
+    finally:
+        store.close()
+    print(tracing.report())
+
+def cmd_fill(args):
+    """Fill the application form of each open link, marking it completed once submitted.
+
+    With --profile the completions, review queue and essay drafts are the profile's own.
+    """
+    user_info = _profile(args)
+    if user_info is None:
+        return
+    from browser_pool import BrowserPool
+    store = open_link_store()
+    state, essays = store, None
+    if args.profile:
+        from profiles import ProfileRegistry
+        profile = ProfileRegistry().get(args.profile)
+        state, essays = profile.applications(), profile.essay_service(get_client())
+    browsers = BrowserPool(size=1)
+    try:
+        # Links waiting in the fill review queue need a human first, not another attempt
+        blocked = {url for url, _, _ in state.pending_reviews('fill')}
+        urls = [url for url in store.urls_with_status('open')
+                if url not in blocked and (state is store or not state.has(url))]
+        for url in urls[:args.limit] if args.limit else urls:
             try:
-                page_text = driver.find_element(By.TAG_NAME, "body").text
-            except Exception:
-                page_text = ""
-
-        # Use Gemini to analyze the text for scholarship/apply info
-        prompt = (
-            "Analyze the following webpage text. "
-            "Does it contain a real scholarship opportunity, or is it just an ad for a university, or a scholarship only for attending that specific college/university? "
-            "If it is a scholarship only for students who attend the same college/university as the page, treat it as 'not found'. "
-            "If it is a real, general scholarship, is there a way to apply (e.g., a button or link with 'apply', 'application', or similar)? "
-            "If the scholarship is closed or unavailable, say so. "
-            "Summarize in JSON: {\"status\": 'open'|'closed'|'completed'|'not found', \"details\": <short reason>}"
-        )
-        from google import genai
-        response = client.models.generate_content(
-            model='gemini-3-flash-preview',
-            contents=f"{prompt}\n\n{page_text[:5000]}"
-        )
-        analysis = response.text
-        print("Gemini Analysis:", analysis)
-        # Try to parse Gemini's JSON response
-        import json
-        import re
-        status = 'not found'
-        details = ''
-        # Remove code block markers if present
-        cleaned = analysis.strip()
-        if cleaned.startswith('```json'):
-            cleaned = re.sub(r'^```json', '', cleaned).strip()
-        if cleaned.startswith('```'):
-            cleaned = re.sub(r'^```', '', cleaned).strip()
-        if cleaned.endswith('```'):
-            cleaned = re.sub(r'```$', '', cleaned).strip()
-        try:
-            result = json.loads(cleaned)
-            status = result.get('status', 'not found')
-            details = result.get('details', '')
-        except Exception:
-            print("Could not parse Gemini response as JSON.")
-            details = analysis
-        # Save the link with status and details
-        with open('links.txt', 'a') as f:
-            f.write(f"{link_url} | {status} | {details}\n")
-        print(f"Saved link with status: {status}")
-        # Return to Google results page for next link
-        driver.back()
-        time.sleep(2)
-    input("Press Enter to close the browser and finish...")
-    driver.quit()
+                if fill_application(url, user_info, test=args.test, browsers=browsers, store=state,
+                                    essay_service=essays) and not args.test:
+                    state.upsert(url, 'completed', 'Submitted')
+            except Exception as e:
+                print(f"Filling {url} failed: {e}")
+    finally:
+        browsers.close()
+        if state is not store:
+            state.close()
+        store.close()
+    stats = get_templates().stats()
+    print(f"Form templates: {stats['hits']} reused, {stats['misses']} analyzed with Gemini vision.")
+    print(tracing.report())
+
+def cmd_report(args):
+    """Print link counts by status and the review queue; needs no browser or API key."""
+    store = open_link_store()
+    try:
+        print(f"{store.count()} link(s) in {store.path}:")
+        for status in LINK_STATUSES:
+            print(f"  {status:<12}{store.count(status):>6}")
+        reviews = store.pending_reviews()
+        print(f"{len(reviews)} site(s) waiting for review.")
+        for url, stage, reason in reviews:
+            print(f"  [{stage}] {url}: {reason}")
+    finally:
+        store.close()
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--trace', help='Write timing spans to this JSON lines file')
+    common.add_argument('--profile', help='Use profiles/PROFILE/ (see profiles.py) instead of user_info.txt and essay*.txt')
+
+    search_options = argparse.ArgumentParser(add_help=False)
+    search_options.add_argument('--query-plan', action='store_true', help='Expand your profile into many queries, search them concurrently and merge the results')
+    search_options.add_argument('--search-provider', choices=['selenium', 'google', 'api', 'replay'], default='selenium',
+                                help='Where search results come from; replay serves recorded fixtures with no network access')
+    search_options.add_argument('--fixtures', default=FIXTURE_DIR, help='Directory of recorded search fixtures')
+    search_options.add_argument('--record-fixtures', action='store_true', help='Save search results to --fixtures for later replay')
+
+    triage_options = argparse.ArgumentParser(add_help=False)
+    triage_options.add_argument('--engine', choices=['async', 'threads'], default='async',
+                                help='async: fetch and classify over async HTTP first and open a browser only when needed; threads: worker threads, also HTTP first')
+    triage_options.add_argument('--browser-fetch', action='store_true', help='With --engine threads, load every page in Chrome instead of trying plain HTTP first')
+    triage_options.add_argument('--per-host', type=int, default=4, help='Concurrent HTTP connections per site with --engine async')
+    triage_options.add_argument('--fetch-workers', type=int, default=4, help='Number of pages to load in parallel during triage')
+    triage_options.add_argument('--model-workers', type=int, default=4, help='Number of concurrent Gemini calls during triage')
+    triage_options.add_argument('--no-preclassifier', action='store_true', help='Send every page to Gemini instead of deciding obvious ones locally')
+    triage_options.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='Approximate tokens of page text sent with each triage prompt')
+
+    parser = argparse.ArgumentParser(description='Automated Scholarship Filler',
+                                     epilog="With no command, runs search followed by triage (the 'run' command).")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    run = commands.add_parser('run', parents=[common, search_options, triage_options],
+                              help='Search, then triage the new links (the default)')
+    # Older scripts pass --test; run never submits anything
+    run.add_argument('--test', action='store_true', help=argparse.SUPPRESS)
+    run.set_defaults(handler=cmd_run)
+    commands.add_parser('search', parents=[common, search_options],
+                        help='Search and save new links for a later triage').set_defaults(handler=cmd_search)
+    triage = commands.add_parser('triage', parents=[common, triage_options], help='Classify links saved by search')
+    triage.add_argument('--limit', type=int, help='Triage at most this many pending links')
+    triage.set_defaults(handler=cmd_triage)
+    fill = commands.add_parser('fill', parents=[common], help='Fill the applications of open links')
+    fill.add_argument('--test', action='store_true', help='Fill forms without submitting them')
+    fill.add_argument('--limit', type=int, help='Fill at most this many applications')
+    fill.set_defaults(handler=cmd_fill)
+    commands.add_parser('report', help='Show link counts and the review queue').set_defaults(handler=cmd_report)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS + ('-h', '--help'):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
+    tracing.configure(getattr(args, 'trace', None))
+    args.handler(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
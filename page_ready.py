@@ -0,0 +1,131 @@
+import time
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from tracing import span
+
+# How often the explicit waits re-check their condition (seconds)
+POLL_INTERVAL = 0.1
+
+FORM_XPATH = "//form | //input | //select | //textarea"
+
+# (condition, seconds waited, whether it was met) for every wait this run
+wait_log = []
+
+
+def _record(condition, start, met):
+    elapsed = time.monotonic() - start
+    wait_log.append((condition, elapsed, met))
+    return elapsed
+
+
+def wait_for_dom_ready(driver, timeout=15):
+    """Wait until document.readyState is 'complete'; returns seconds waited."""
+    start = time.monotonic()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script('return document.readyState') == 'complete'
+        )
+        met = True
+    except TimeoutException:
+        met = False
+    return _record('dom-ready', start, met)
+
+
+class _NetworkIdle:
+    """Condition that holds once no new resources have loaded for idle_time seconds."""
+
+    def __init__(self, idle_time):
+        self.idle_time = idle_time
+        self.last_count = -1
+        self.last_change = time.monotonic()
+
+    def __call__(self, driver):
+        count = driver.execute_script("return performance.getEntriesByType('resource').length")
+        now = time.monotonic()
+        if count != self.last_count:
+            self.last_count = count
+            self.last_change = now
+            return False
+        return now - self.last_change >= self.idle_time
+
+
+def wait_for_network_idle(driver, idle_time=0.5, timeout=10):
+    """Wait until the page stops fetching resources; returns seconds waited."""
+    start = time.monotonic()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(_NetworkIdle(idle_time))
+        met = True
+    except TimeoutException:
+        met = False
+    return _record('network-idle', start, met)
+
+
+def wait_for_form_element(driver, timeout=30, xpath=FORM_XPATH):
+    """Wait until a form, input, select or textarea is present; returns seconds waited."""
+    start = time.monotonic()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.find_elements(By.XPATH, xpath)
+        )
+        met = True
+    except TimeoutException:
+        met = False
+    return _record('form-present', start, met)
+
+
+def wait_for_page_ready(driver, dom_timeout=15, network_timeout=10, form_timeout=None):
+    """Wait for DOM-ready, then network-idle, then (optionally) a form element."""
+    with span('page_ready') as s:
+        elapsed = wait_for_dom_ready(driver, timeout=dom_timeout)
+        elapsed += wait_for_network_idle(driver, timeout=network_timeout)
+        if form_timeout is not None:
+            elapsed += wait_for_form_element(driver, timeout=form_timeout)
+        s.set(waited=round(elapsed, 3))
+    return elapsed
+
+
+def navigate(driver, url, **timeouts):
+    """Open url and wait for it to be ready instead of sleeping a fixed time."""
+    with span('navigate', url=url):
+        driver.get(url)
+        return wait_for_page_ready(driver, **timeouts)
+
+
+def click_and_wait(driver, element, navigation_timeout=1, **timeouts):
+    """Click element, follow a newly opened tab if there is one, and wait for readiness."""
+    old_handles = driver.window_handles
+    old_root = driver.find_element(By.TAG_NAME, 'html')
+    element.click()
+
+    def navigated(d):
+        if len(d.window_handles) > len(old_handles):
+            return 'new-tab'
+        try:
+            old_root.is_enabled()
+        except StaleElementReferenceException:
+            return 'same-tab'
+        return False
+
+    start = time.monotonic()
+    try:
+        how = WebDriverWait(driver, navigation_timeout, poll_frequency=POLL_INTERVAL).until(navigated)
+        _record('navigation', start, True)
+        if how == 'new-tab':
+            driver.switch_to.window(driver.window_handles[-1])
+    except TimeoutException:
+        _record('navigation', start, False)  # In-page update rather than a navigation
+    return wait_for_page_ready(driver, **timeouts)
+
+
+def print_wait_report():
+    """Print how long each kind of wait took so far this run."""
+    if not wait_log:
+        return
+    totals = {}
+    for condition, elapsed, met in wait_log:
+        count, total, timeouts = totals.get(condition, (0, 0.0, 0))
+        totals[condition] = (count + 1, total + elapsed, timeouts + (0 if met else 1))
+    print("Page readiness waits:")
+    for condition, (count, total, timeouts) in totals.items():
+        print(f"  {condition}: {count} waits, {total:.2f}s total, {total / count:.2f}s avg, {timeouts} timed out")
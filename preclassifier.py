@@ -0,0 +1,284 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from prompt_compaction import compact_page_text
+from triage import UNPARSED
+
+LABELS_PATH = 'triage_labels.jsonl'
+
+# Pages are compacted to this many tokens before features are taken, so
+# training examples and live pages look the same
+FEATURE_TOKEN_BUDGET = 2000
+
+# Naive Bayes is only trusted once it has seen this many labelled pages
+MIN_TRAINING_EXAMPLES = 50
+
+# Share of locally decided pages still sent to Gemini, so the local decisions get checked
+AUDIT_RATE = 0.05
+LABEL_STATUSES = ('open', 'closed', 'completed', 'not found')
+
+SCHOLARSHIP_WORDS = re.compile(r'\b(scholarships?|grants?|fellowships?|bursary|bursaries)\b', re.I)
+CLOSED_PHRASES = re.compile(
+    r'\b(no longer accepting applications|applications? (are|is) (now )?closed|'
+    r'(this|the) scholarship (is|has) (now )?(closed|ended)|deadline has passed|'
+    r'application (period|window|cycle) has (ended|closed)|winners have been (announced|selected))\b',
+    re.I,
+)
+OPEN_PHRASES = re.compile(
+    r'\b(apply now|apply online|start (your )?application|begin (your )?application|'
+    r'applications? (are|is) (now )?open|now accepting applications|submit (your|an) application)\b',
+    re.I,
+)
+AWARD_AMOUNT = re.compile(r'\$\s?\d[\d,]*')
+AGGREGATOR_PHRASES = re.compile(
+    r'\b(search (over |thousands of |millions of |our database of )?(\d[\d,]* )?scholarships|'
+    r'create (a |your )?free (profile|account)|get matched (to|with) scholarships|scholarship search engine)\b',
+    re.I,
+)
+ADMISSIONS_PHRASES = re.compile(
+    r'\b(undergraduate admissions|request (more )?information|schedule a (campus )?visit|'
+    r'apply to (the )?(university|college)|admitted students|tuition and fees|degree programs?)\b',
+    re.I,
+)
+DATE_PATTERN = re.compile(
+    r'\b(january|february|march|april|may|june|july|august|september|october|november|december)'
+    r'\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b',
+    re.I,
+)
+TOKEN_PATTERN = re.compile(r'[a-z][a-z0-9$]+')
+
+
+def find_dates(text):
+    """Return every 'Month day, year' date in the text as datetimes."""
+    dates = []
+    for month, day, year in DATE_PATTERN.findall(text):
+        try:
+            dates.append(datetime.strptime(f"{month} {day} {year}", '%B %d %Y'))
+        except ValueError:
+            continue
+    return dates
+
+
+def rule_based_status(text, today=None):
+    """Return (status, reason) for pages the keyword rules are sure about, else None."""
+    today = today or datetime.now()
+    if not SCHOLARSHIP_WORDS.search(text):
+        return 'not found', 'No scholarship, grant or fellowship mentioned'
+    if AGGREGATOR_PHRASES.search(text):
+        return 'not found', 'Scholarship search/aggregator landing page'
+    if len(ADMISSIONS_PHRASES.findall(text)) >= 2 and not AWARD_AMOUNT.search(text):
+        return 'not found', 'University admissions page rather than a scholarship'
+
+    dates = find_dates(text)
+    closed = CLOSED_PHRASES.search(text)
+    open_ = OPEN_PHRASES.search(text)
+    if closed and not open_:
+        return 'closed', f"Page says: {closed.group(0)}"
+    if dates and max(dates) < today and not open_ and re.search(r'\bdeadline\b', text, re.I):
+        return 'closed', f"Deadline passed ({max(dates):%B %d, %Y})"
+    if open_ and not closed and AWARD_AMOUNT.search(text) and dates and max(dates) >= today:
+        return 'open', f"Apply link, award amount and upcoming date ({max(dates):%B %d, %Y})"
+    return None
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def train_naive_bayes(examples):
+    """Train a naive Bayes model over word presence from [(text, status)] examples."""
+    class_counts = Counter()
+    token_counts = {}
+    vocabulary = set()
+    for text, status in examples:
+        class_counts[status] += 1
+        counts = token_counts.setdefault(status, Counter())
+        for token in set(tokenize(text)):
+            counts[token] += 1
+            vocabulary.add(token)
+    total = sum(class_counts.values())
+    model = {'priors': {}, 'log_probs': {}, 'unknown': {}}
+    for status, count in class_counts.items():
+        counts = token_counts[status]
+        denominator = sum(counts.values()) + len(vocabulary)
+        model['priors'][status] = math.log(count / total)
+        model['log_probs'][status] = {t: math.log((c + 1) / denominator) for t, c in counts.items()}
+        model['unknown'][status] = math.log(1 / denominator)
+    return model
+
+
+def naive_bayes_predict(model, text):
+    """Return (status, probability) for the most likely class."""
+    tokens = set(tokenize(text))
+    scores = {}
+    for status, prior in model['priors'].items():
+        log_probs = model['log_probs'][status]
+        unknown = model['unknown'][status]
+        scores[status] = prior + sum(log_probs.get(t, unknown) for t in tokens)
+    best = max(scores, key=scores.get)
+    # Softmax over log scores, shifted for numerical stability
+    top = scores[best]
+    norm = sum(math.exp(s - top) for s in scores.values())
+    return best, 1.0 / norm
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def load_labelled_examples(path=LABELS_PATH):
+    """Read [(text, status)] pairs recorded from earlier Gemini classifications."""
+    examples = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                examples.append((record['text'], record['status']))
+    except FileNotFoundError:
+        pass
+    return examples
+
+
+class PreClassifier:
+    """Offline classifier that settles obvious pages before they reach Gemini.
+
+    Keyword rules run first; if enough labelled pages exist a naive Bayes
+    model trained on them handles the rest when it is confident. Anything
+    else is left for the LLM. Pages Gemini classifies are recorded as new
+    labelled examples for the next run, once per distinct page. A random
+    audit_rate share of the pages decided locally goes to Gemini anyway, so
+    the labels also cover the local decisions and evaluate() can measure
+    their precision.
+    """
+
+    def __init__(self, labels_path=LABELS_PATH, min_confidence=0.95, use_model=True, audit_rate=AUDIT_RATE,
+                 seed=None):
+        self.labels_path = labels_path
+        self.min_confidence = min_confidence
+        self.audit_rate = audit_rate
+        self.decided = Counter()
+        self.deferred = 0
+        self.audited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.model = None
+        examples = load_labelled_examples(labels_path)
+        self._labelled = {text_hash(text) for text, _ in examples}
+        if use_model and len(examples) >= MIN_TRAINING_EXAMPLES:
+            self.model = train_naive_bayes(examples)
+
+    def classify(self, page_text):
+        """Return (status, details) when confident, or None to defer to Gemini."""
+        text = compact_page_text(page_text, FEATURE_TOKEN_BUDGET)
+        decision = rule_based_status(text)
+        if decision is None and self.model is not None:
+            status, probability = naive_bayes_predict(self.model, text)
+            if probability >= self.min_confidence:
+                decision = (status, f"Local model ({probability:.0%} confident)")
+        with self._lock:
+            if decision is None:
+                self.deferred += 1
+            elif self._random.random() < self.audit_rate:
+                # Let Gemini label this one so the local decision can be checked
+                self.audited += 1
+                return None
+            else:
+                self.decided[decision[0]] += 1
+        return decision
+
+    def record_label(self, page_text, status, details=''):
+        """Save a Gemini-labelled page for training and precision checks.
+
+        Unparsed answers and pages already labelled (cache hits, re-triage) are skipped.
+        """
+        if status not in LABEL_STATUSES or str(details).startswith(UNPARSED):
+            return
+        text = compact_page_text(page_text, FEATURE_TOKEN_BUDGET)
+        digest = text_hash(text)
+        with self._lock:
+            if digest in self._labelled:
+                return
+            self._labelled.add(digest)
+            with open(self.labels_path, 'a') as f:
+                f.write(json.dumps({'text': text, 'status': status}) + '\n')
+
+    def report(self):
+        saved = sum(self.decided.values())
+        total = saved + self.deferred + self.audited
+        if not total:
+            return "Pre-classifier: no pages checked."
+        breakdown = ', '.join(f"{count} {status}" for status, count in self.decided.most_common())
+        line = f"Pre-classifier: saved {saved} of {total} Gemini calls ({saved / total:.0%}){': ' + breakdown if breakdown else ''}."
+        if self.audited:
+            line += f" {self.audited} local decision(s) sent to Gemini for audit."
+        return line
+
+
+def _score(decisions):
+    """{decided, precision, per_status} from [(decided status, label)] pairs."""
+    per_status = {}
+    for status, label in decisions:
+        stats = per_status.setdefault(status, [0, 0])
+        stats[0] += status == label
+        stats[1] += 1
+    correct = sum(hits for hits, _ in per_status.values())
+    return {
+        'decided': len(decisions),
+        'precision': correct / len(decisions) if decisions else 0.0,
+        'per_status': {status: hits / total for status, (hits, total) in per_status.items()},
+    }
+
+
+def evaluate(examples, min_confidence=0.95, holdout=0.2):
+    """Precision and coverage of the local decisions against labelled examples.
+
+    The keyword rules need no training and are scored on every example; the
+    audited pages are what makes their precision meaningful. The naive Bayes
+    model is trained on the first part of the examples and scored on the
+    held-out rest, so its precision isn't measured on its own training data.
+    """
+    rules = _score([(decision[0], label) for text, label in examples
+                    for decision in [rule_based_status(text)] if decision is not None])
+    rules['coverage'] = rules['decided'] / len(examples) if examples else 0.0
+    split = int(len(examples) * (1 - holdout))
+    train, test = examples[:split], examples[split:]
+    model = train_naive_bayes(train) if len(train) >= MIN_TRAINING_EXAMPLES else None
+    decisions = []
+    for text, label in test:
+        decision = rule_based_status(text)
+        if decision is None and model is not None:
+            status, probability = naive_bayes_predict(model, text)
+            if probability >= min_confidence:
+                decision = (status, '')
+        if decision is not None:
+            decisions.append((decision[0], label))
+    results = _score(decisions)
+    results.update({
+        'examples': len(test),
+        'coverage': len(decisions) / len(test) if test else 0.0,
+        'rules': rules,
+    })
+    return results
+
+
+if __name__ == "__main__":
+    examples = load_labelled_examples()
+    results = evaluate(examples)
+    rules = results['rules']
+    print(f"Labelled examples: {len(examples)}")
+    print(f"Keyword rules decided {rules['decided']} ({rules['coverage']:.0%}), precision {rules['precision']:.1%}")
+    for status, precision in sorted(rules['per_status'].items()):
+        print(f"  {status}: {precision:.1%}")
+    print(f"Held-out examples: {results['examples']}")
+    print(f"Decided locally: {results['decided']} ({results['coverage']:.0%} of pages would skip Gemini)")
+    print(f"Precision: {results['precision']:.1%}")
+    for status, precision in sorted(results['per_status'].items()):
+        print(f"  {status}: {precision:.1%}")
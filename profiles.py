@@ -0,0 +1,239 @@
+"""Several students from one checkout: per-profile info and application state, shared scholarship data.
+
+Each profile is a directory under profiles/ holding what belongs to one
+student:
+
+    profiles/<name>/user_info.txt     profile fields, same format as ./user_info.txt
+    profiles/<name>/essay1.txt ...    the student's essays
+    profiles/<name>/applications.db   links this student applied to, and their review queue
+    profiles/<name>/checkpoints.db    multi-page application progress
+    profiles/<name>/essay_drafts.json generated essay answers
+
+Search results and triage (links.db), the Gemini cache, the eligibility
+index and form templates stay in the working directory and are shared, so N
+students cost one search-and-triage pass plus one bitmap match each.
+
+Usage: python profiles.py list
+       python profiles.py add NAME [--copy-from .]
+       python profiles.py match [NAME ...]
+       python profiles.py run job.json [--profiles NAME ...]
+"""
+import argparse
+import os
+import shutil
+import sys
+from essay_service import shared_essay_service
+from link_store import LinkStore
+
+PROFILES_DIR = 'profiles'
+
+
+class Profile:
+    """Paths and per-student stores of one profile directory."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.info_path = os.path.join(path, 'user_info.txt')
+        self.essay_pattern = os.path.join(path, 'essay{}.txt')
+        self.applications_path = os.path.join(path, 'applications.db')
+        self.checkpoints_path = os.path.join(path, 'checkpoints.db')
+        self.essay_drafts_path = os.path.join(path, 'essay_drafts.json')
+
+    def load(self):
+        """user_info with essays and transcript; raises ValueError if required fields are missing."""
+        from main import REQUIRED_FIELDS, extract_text_from_file, load_essays, load_user_info
+        info = load_user_info(self.info_path)
+        missing = [key for key in REQUIRED_FIELDS if not info.get(key)]
+        if missing:
+            raise ValueError(f"Profile '{self.name}' is missing required fields: {', '.join(missing)}")
+        info['essays'] = load_essays(self.essay_pattern)
+        transcript_path = info.get('transcript_path')
+        if transcript_path and not os.path.isabs(transcript_path):
+            transcript_path = os.path.join(self.path, transcript_path)
+        info['transcript'] = "N/A"
+        if transcript_path:
+            try:
+                info['transcript'] = extract_text_from_file(transcript_path)
+            except Exception as e:
+                print(f"Could not read transcript {transcript_path} for profile '{self.name}': {e}")
+        return info
+
+    def applications(self):
+        """This student's application state: completed links and their fill review queue."""
+        return LinkStore(self.applications_path)
+
+    def essay_service(self, client):
+        """The profile's essay drafts; one service per process, however many workers ask."""
+        return shared_essay_service(client, self.essay_drafts_path, model='gemini-1.5-flash')
+
+
+class ProfileRegistry:
+    """The profile directories under root."""
+
+    def __init__(self, root=PROFILES_DIR):
+        self.root = root
+
+    def names(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isfile(os.path.join(self.root, name, 'user_info.txt')))
+
+    def get(self, name):
+        profile = Profile(name, os.path.join(self.root, name))
+        if not os.path.isfile(profile.info_path):
+            raise ValueError(f"No profile named '{name}' in {self.root}/")
+        return profile
+
+    def all(self):
+        return [self.get(name) for name in self.names()]
+
+    def add(self, name, copy_from=None):
+        """Create a profile, copying user_info.txt, essays and the transcript from copy_from if given."""
+        path = os.path.join(self.root, name)
+        if os.path.exists(os.path.join(path, 'user_info.txt')):
+            raise ValueError(f"Profile '{name}' already exists")
+        os.makedirs(path, exist_ok=True)
+        profile = Profile(name, path)
+        if copy_from is None:
+            open(profile.info_path, 'a').close()
+            return profile
+        from main import load_user_info, save_user_info
+        info = load_user_info(os.path.join(copy_from, 'user_info.txt'))
+        i = 1
+        while os.path.isfile(os.path.join(copy_from, f"essay{i}.txt")):
+            shutil.copy(os.path.join(copy_from, f"essay{i}.txt"), profile.essay_pattern.format(i))
+            i += 1
+        transcript = info.get('transcript_path')
+        if transcript:
+            source = transcript if os.path.isabs(transcript) else os.path.join(copy_from, transcript)
+            if os.path.isfile(source):
+                shutil.copy(source, path)
+                info['transcript_path'] = os.path.basename(source)
+        save_user_info(info, profile.info_path)
+        return profile
+
+
+def eligible_links(store, applications, index, user_info, limit=None):
+    """Open links the student qualifies for and hasn't applied to or queued for review yet, best first.
+
+    Links the eligibility index has no record for are kept; when unsure, apply.
+    """
+    matcher = index.matcher()
+    matched = set(matcher.match(user_info))
+    indexed = set(matcher.urls)
+    blocked = {url for url, _, _ in applications.pending_reviews('fill')}
+    urls = [url for url in store.urls_with_status('open')
+            if (url in matched or url not in indexed) and not applications.has(url) and url not in blocked]
+    return urls[:limit] if limit else urls
+
+
+def run_profiles(job, profiles):
+    """One shared search and triage for every profile, then a match and fill per profile."""
+    import tracing
+    from batch import fill_links, job_queries, print_reviews, print_template_stats, search_links, triage_new_links
+    from eligibility_index import EligibilityIndex, build_index
+    from link_store import open_link_store
+    from main import get_cache, get_client
+
+    tracing.configure(job['trace'])
+    infos = {profile.name: profile.load() for profile in profiles}
+    client, cache = get_client(), get_cache()
+    store = open_link_store()
+    index = EligibilityIndex()
+    try:
+        # Every profile's queries go into one plan, so shared results are fetched once
+        queries = []
+        for info in infos.values():
+            queries += [q for q in job_queries(job, info) if q not in queries]
+        links = search_links(job, queries, store)
+        print(f"Search: {len(queries)} quer(ies) for {len(profiles)} profile(s) found {len(links)} new link(s).")
+        triage_new_links(job, links, store, client, cache)
+
+        unindexed = [url for url in store.urls_with_status('open') if not index.has(url)]
+        if unindexed:
+            from browser_pool import BrowserPool
+            browsers = BrowserPool(size=job['triage']['fetch_workers'], headless=True, page_load_timeout=20)
+            try:
+                added = build_index(unindexed, index, client, cache, browsers, job['triage']['fetch_workers'])
+            finally:
+                browsers.close()
+            print(f"Eligibility index: {added} new record(s), {index.count()} total.")
+
+        for profile in profiles:
+            info = infos[profile.name]
+            applications = profile.applications()
+            try:
+                urls = eligible_links(store, applications, index, info, limit=job['fill']['max_applications'])
+                print(f"\n--- {profile.name}: {len(urls)} eligible scholarship(s) ---")
+                filled = 0
+                if job['fill']['enabled'] and urls:
+                    filled = fill_links(job, urls, info, applications, profile.essay_service(client))
+                reviews = applications.pending_reviews()
+                print(f"{profile.name}: {filled} filled, {len(reviews)} waiting for review.")
+                print_reviews(reviews)
+            finally:
+                applications.close()
+        if job['fill']['enabled']:
+            print_template_stats()
+        print(tracing.report())
+    finally:
+        index.close()
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage student profiles and run them against shared scholarship data')
+    parser.add_argument('--root', default=PROFILES_DIR, help='Directory holding one subdirectory per profile')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List profiles')
+    add = commands.add_parser('add', help='Create a profile')
+    add.add_argument('name')
+    add.add_argument('--copy-from', help='Copy user_info.txt, essays and transcript from this directory')
+    match = commands.add_parser('match', help='Count eligible, unapplied scholarships for each profile')
+    match.add_argument('names', nargs='*', help='Profiles to match (default: all)')
+    run = commands.add_parser('run', help='Search and triage once for every profile, then match and fill each')
+    run.add_argument('job', help='Batch job file (see batch_job.example.json); its profile entry is ignored')
+    run.add_argument('--profiles', nargs='*', help='Profiles to run (default: all)')
+    args = parser.parse_args()
+
+    registry = ProfileRegistry(args.root)
+    try:
+        if args.command == 'list':
+            for name in registry.names():
+                print(name)
+        elif args.command == 'add':
+            profile = registry.add(args.name, args.copy_from)
+            print(f"Created {profile.path}; fill in {profile.info_path} and add essays as essay1.txt, essay2.txt, ...")
+        elif args.command == 'match':
+            from eligibility_index import EligibilityIndex
+            from link_store import open_link_store
+            store = open_link_store()
+            index = EligibilityIndex()
+            try:
+                for profile in [registry.get(name) for name in args.names] or registry.all():
+                    applications = profile.applications()
+                    try:
+                        urls = eligible_links(store, applications, index, profile.load())
+                    finally:
+                        applications.close()
+                    print(f"{profile.name}: {len(urls)} eligible scholarship(s)")
+                    for url in urls:
+                        print(f"  {url}")
+            finally:
+                index.close()
+                store.close()
+        else:
+            from batch import load_job
+            profiles = [registry.get(name) for name in args.profiles] if args.profiles else registry.all()
+            if not profiles:
+                raise ValueError(f"No profiles in {args.root}/; create one with `python profiles.py add NAME`")
+            run_profiles(load_job(args.job), profiles)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
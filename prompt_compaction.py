@@ -0,0 +1,157 @@
+import re
+from html.parser import HTMLParser
+
+# Default number of tokens of page text to send with a classification prompt
+DEFAULT_TOKEN_BUDGET = 1200
+
+# Elements whose content is never useful for classifying a scholarship page
+SKIP_TAGS = {'script', 'style', 'noscript', 'svg', 'nav', 'footer', 'header', 'aside', 'template', 'iframe'}
+
+# Elements that start a new block of text
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'table', 'tr', 'td', 'th',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'dt', 'dd', 'form', 'label', 'button', 'a', 'title',
+}
+
+# (weight, pattern) scholarship signals; a block's score is the sum of weights that match
+SIGNALS = [
+    (3.0, re.compile(r'\b(deadline|due date|due by|closes?|closing date|open(s|ing)? (on|until)|accepting applications)\b', re.I)),
+    (3.0, re.compile(r'\b(january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{1,2}\b', re.I)),
+    (2.0, re.compile(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b')),
+    (3.0, re.compile(r'\b(eligib\w*|requirements?|must be|applicants? (must|should)|open to|who can apply)\b', re.I)),
+    (2.0, re.compile(r'\b(gpa|high school|senior|junior|sophomore|freshman|undergraduate|graduate student|enrolled|resident|citizen)\b', re.I)),
+    (3.0, re.compile(r'\$\s?\d[\d,]*|\b\d[\d,]* dollars\b|\baward(s|ed)?\b|\bstipend\b', re.I)),
+    (3.0, re.compile(r'\b(apply( now| here| online)?|application|submit|start your application)\b', re.I)),
+    (2.0, re.compile(r'\bscholarships?\b|\bgrants?\b|\bfellowships?\b', re.I)),
+    (2.0, re.compile(r'\b(closed|no longer accepting|has ended|expired|winners? (announced|have been))\b', re.I)),
+]
+
+# Boilerplate that shows up on every page and crowds out the useful text
+BOILERPLATE = re.compile(
+    r'\b(cookies?|privacy policy|terms of (use|service)|all rights reserved|copyright|©|'
+    r'sign in|log in|subscribe|newsletter|follow us|skip to (main )?content|menu)\b',
+    re.I,
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English)."""
+    return max(1, len(text) // 4)
+
+
+class _BlockExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._current = []
+        self._skip_depth = 0
+
+    def _flush(self):
+        text = ' '.join(''.join(self._current).split())
+        if text:
+            self.blocks.append(text)
+        self._current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def html_to_blocks(html):
+    """Split raw HTML into text blocks, dropping scripts, styles, nav, headers and footers."""
+    parser = _BlockExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass  # Keep whatever parsed before the malformed markup
+    return parser.blocks
+
+
+def text_to_blocks(text):
+    """Split visible page text (e.g. body.text) into one block per non-empty line."""
+    return [' '.join(line.split()) for line in text.splitlines() if line.strip()]
+
+
+def score_block(block):
+    score = sum(weight for weight, pattern in SIGNALS if pattern.search(block))
+    if BOILERPLATE.search(block):
+        score -= 2.0
+    if len(block) < 20 and score <= 0:
+        score -= 1.0  # Short nav/menu fragments
+    return score
+
+
+def truncate_to_tokens(block, tokens):
+    """Cut block to about tokens tokens, at a word boundary where there is one."""
+    limit = tokens * 4
+    if len(block) <= limit:
+        return block
+    cut = block[:limit]
+    return (cut.rsplit(' ', 1)[0] if ' ' in cut else cut).rstrip() + ' ...'
+
+
+# Don't bother sending a truncated block with less room than this
+MIN_TRUNCATED_TOKENS = 20
+
+
+def compact_blocks(blocks, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Fill token_budget with the highest-scoring blocks, kept in page order.
+
+    A block too big for the room left is cut down to fit rather than sent
+    whole or dropped, so one huge block can't blow the budget.
+    """
+    seen = set()
+    candidates = []
+    for index, block in enumerate(blocks):
+        if block in seen:
+            continue  # Repeated banners, buttons and menu entries
+        seen.add(block)
+        candidates.append((score_block(block), index, block))
+
+    chosen = {}
+    used = 0
+    if candidates:
+        # The page title/first heading gives the model context even when it scores low
+        first = truncate_to_tokens(candidates[0][2], token_budget // 2)
+        chosen[candidates[0][1]] = first
+        used = estimate_tokens(first)
+    for score, index, block in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        if index in chosen:
+            continue
+        if score <= 0 and used > token_budget // 2:
+            break  # Don't pad a short page with boilerplate
+        room = token_budget - used
+        if estimate_tokens(block) > room:
+            if room < MIN_TRUNCATED_TOKENS:
+                continue
+            block = truncate_to_tokens(block, room - 1)
+        chosen[index] = block
+        used += estimate_tokens(block)
+    return '\n'.join(chosen[index] for _, index, _ in candidates if index in chosen)
+
+
+def compact_page_text(text, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Compact visible page text for a prompt."""
+    return compact_blocks(text_to_blocks(text), token_budget)
+
+
+def compact_html(html, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Compact raw HTML for a prompt."""
+    return compact_blocks(html_to_blocks(html), token_budget)
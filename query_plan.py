@@ -0,0 +1,152 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from search_providers import GoogleSearchProvider
+from tracing import span
+
+# Query-string parameters that only track the click and never change the page
+TRACKING_PARAMS = {
+    'gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'yclid', 'srsltid', 'ved', 'usg', 'sa',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'ref', 'ref_src', 'igshid', 'si', 'hsctatracking',
+}
+TRACKING_PREFIXES = ('utm_', 'hsa_', 'pk_', 'mtm_')
+
+# Hosts that wrap the real destination in a query parameter
+REDIRECT_PARAMS = {
+    'www.google.com': ('q', 'url'),
+    'google.com': ('q', 'url'),
+    'l.facebook.com': ('u',),
+    'www.bing.com': ('u',),
+}
+
+
+def unwrap_redirect(url):
+    """Return the destination of a Google/Facebook/Bing redirect link, or url unchanged."""
+    parts = urlsplit(url)
+    params = REDIRECT_PARAMS.get(parts.netloc.lower())
+    if params and parts.path in ('/url', '/l.php', '/ck/a'):
+        query = dict(parse_qsl(parts.query))
+        for name in params:
+            target = query.get(name, '')
+            if target.startswith('http'):
+                return target
+    return url
+
+
+def _strip_tracking(query):
+    return [
+        (k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+
+
+def clean_url(url):
+    """Unwrap redirects and drop tracking parameters and the fragment, keeping the URL fetchable."""
+    parts = urlsplit(unwrap_redirect(url.strip()))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(_strip_tracking(parts.query)), ''))
+
+
+def normalize_url(url):
+    """Canonical form of a result URL used for deduplication.
+
+    Unwraps redirects, lowercases the scheme and host, drops 'www.', default
+    ports, fragments, tracking parameters and trailing slashes, and sorts
+    the remaining query parameters.
+    """
+    url = unwrap_redirect(url.strip())
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(_strip_tracking(parts.query))
+    path = parts.path.rstrip('/') or ''
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def expand_queries(user_info, base_query='', max_queries=20):
+    """Expand a profile from user_info.txt into a list of distinct search queries."""
+    grade = user_info.get('grade_level', '').strip()
+    city = user_info.get('city', '').strip()
+    state = user_info.get('state', '').strip()
+    queries = []
+    seen = set()
+
+    def add(template, *values):
+        # Skip templates whose profile fields are blank
+        if not all(values):
+            return
+        query = ' '.join(template.format(*values).split())
+        if query.lower() not in seen:
+            seen.add(query.lower())
+            queries.append(query)
+
+    add("{}", base_query)
+    # "engineering scholarships" -> "engineering", so the template doesn't say scholarships twice
+    topic = ' '.join(re.sub(r'\bscholarships?\b', ' ', base_query, flags=re.I).split())
+    add("{} scholarships for {} students", topic, grade)
+    add("scholarships for {} students", grade)
+    add("{} scholarships for {} students", state, grade)
+    add("{} {} local scholarships", city, state)
+    add("{} community foundation scholarships", city)
+    add("{} student scholarships", user_info.get('race', '').strip())
+    add("{} scholarships", user_info.get('ethnicity', '').strip())
+    add("scholarships for {} students", user_info.get('gender', '').strip())
+    preferences = user_info.get('preferences', '').strip().lower()
+    if preferences not in ('', 'straight', 'heterosexual', 'ignore', 'n/a', 'none'):
+        add("LGBTQ scholarships {}", state or 'students')
+    for key in ('major', 'interests'):
+        for value in user_info.get(key, '').split(','):
+            add("{} scholarships for {} students", value.strip(), grade)
+            add("{} scholarships {}", value.strip(), state)
+    if user_info.get('gpa_unweighted') or user_info.get('gpa_weighted'):
+        add("merit scholarships {} {}", grade, state)
+    return queries[:max_queries]
+
+
+def _search_page(search_page, query, num_results, start):
+    with span('search', query=query, start=start) as s:
+        results = search_page(query, num_results, start)
+        s.set(results=len(results))
+        return results
+
+
+def run_query_plan(queries, search_page=None, pages=2, per_page=10, max_workers=4, skip=None):
+    """Run every query (with pagination) concurrently and return ranked, deduped URLs.
+
+    Results are merged by normalized URL and ranked by reciprocal-rank fusion,
+    so a page that ranks well for several queries comes first. skip(url) can
+    drop already-known links before anything is fetched. search_page is any
+    provider from search_providers (googlesearch-python by default).
+    """
+    if search_page is None:
+        search_page = GoogleSearchProvider()
+    tasks = [(query, page) for query in queries for page in range(pages)]
+    scores = {}
+    originals = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_search_page, search_page, query, per_page, page * per_page): (query, page) for query, page in tasks}
+        for future in as_completed(futures):
+            query, page = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Search failed for '{query}' (page {page + 1}): {e}")
+                continue
+            for offset, url in enumerate(results):
+                if not url.startswith('http'):
+                    continue
+                key = normalize_url(url)
+                rank = page * per_page + offset
+                # Reciprocal-rank fusion (k=60): rewards pages several queries agree on
+                scores[key] = scores.get(key, 0.0) + 1.0 / (60 + rank)
+                originals.setdefault(key, clean_url(url))
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    total = len(ranked)
+    if skip is not None:
+        ranked = [key for key in ranked if not skip(key) and not skip(originals[key])]
+    print(f"Query plan: {len(queries)} queries, {total} unique results, {len(ranked)} new.")
+    return [originals[key] for key in ranked]
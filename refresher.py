@@ -0,0 +1,344 @@
+"""Incremental re-checks of scholarship pages that were triaged before.
+
+Every tracked link keeps its ETag, Last-Modified and a fingerprint of its
+meaningful text in refresh.db. A re-check sends a conditional GET: a 304
+costs no download, and a page whose meaningful text hashes the same costs
+no model call. Only pages that really changed are re-classified, so a
+closed scholarship that reopens next cycle shows up as open again.
+
+Each link's next check is scheduled from how often it has changed before
+(pages that never change drift out to MAX_INTERVAL) and from its deadline:
+just after an upcoming deadline passes, and a few weeks before last year's
+deadline comes round again for closed scholarships.
+
+Usage: python refresher.py [--limit 200] [--workers 8]
+"""
+import argparse
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from prompt_compaction import BOILERPLATE, score_block, text_to_blocks
+from tracing import span
+
+DAY = 24 * 3600
+MIN_INTERVAL = 1 * DAY
+MAX_INTERVAL = 30 * DAY
+# Closed pages whose deadline passed are not re-checked less often than this
+MAX_CLOSED_INTERVAL = 90 * DAY
+# Recurring scholarships usually reopen a few weeks before last year's deadline
+REOPEN_LEAD = 45 * DAY
+# Link statuses worth keeping current; completed links are done and pending ones are triage's job
+TRACKED_STATUSES = ['open', 'closed', 'not found']
+
+# Text that changes on every load without the scholarship changing
+VOLATILE = re.compile(
+    r'\b\d{1,2}:\d{2}(:\d{2})?\s*(am|pm)?\b|\b\d+ (seconds?|minutes?|hours?|days?) ago\b|'
+    r'\b[0-9a-f]{16,}\b|\b\d{6,}\b',
+    re.I,
+)
+
+
+def meaningful_text(text):
+    """The scholarship-relevant lines of a page (dates, eligibility, awards, apply/closed notices), normalized."""
+    blocks = text_to_blocks(text)
+    relevant = [block for block in blocks if score_block(block) > 0]
+    if not relevant:
+        relevant = [block for block in blocks if not BOILERPLATE.search(block)]
+    lines = []
+    for block in relevant:
+        line = ' '.join(VOLATILE.sub(' ', block.lower()).split())
+        if line and line not in lines:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def fingerprint(text):
+    return hashlib.sha256(meaningful_text(text).encode('utf-8')).hexdigest()
+
+
+def next_check_time(now, checks, changes, status=None, deadline=None):
+    """When to look at a page again, from its change history and deadline (ISO date or None)."""
+    # Smoothed share of checks that found a change; a new page starts at one in two
+    rate = (changes + 1) / (checks + 2)
+    interval = min(MAX_INTERVAL, max(MIN_INTERVAL, MIN_INTERVAL / rate))
+    if deadline:
+        due = datetime.strptime(deadline, '%Y-%m-%d').timestamp()
+        if due > now:
+            # Catch the page right after it closes
+            interval = min(interval, due - now + DAY)
+        elif status == 'closed':
+            anniversary = due + 365 * DAY
+            while anniversary < now:
+                anniversary += 365 * DAY
+            reopen = anniversary - REOPEN_LEAD
+            if reopen > now:
+                # Nothing to see until the next cycle opens; inside the window the normal schedule applies
+                interval = min(MAX_CLOSED_INTERVAL, max(interval, reopen - now))
+    return now + interval
+
+
+class RefreshStore:
+    """SQLite record of each tracked page's validators, fingerprint and check schedule."""
+
+    def __init__(self, path='refresh.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, fingerprint TEXT, deadline TEXT, "
+            "checks INTEGER DEFAULT 0, changes INTEGER DEFAULT 0, last_checked REAL, next_check REAL);"
+            "CREATE INDEX IF NOT EXISTS idx_pages_next_check ON pages(next_check);"
+        )
+        self._conn.commit()
+
+    def track(self, urls, now=None):
+        """Start tracking urls not seen before; they are due at once."""
+        now = now or time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pages (url, next_check) VALUES (?, ?)", [(url, now) for url in urls]
+            )
+            self._conn.commit()
+
+    def urls(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT url FROM pages").fetchall()]
+
+    def untrack(self, urls):
+        """Stop checking urls, e.g. links that were filled since they were tracked."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url in urls])
+            self._conn.commit()
+
+    def due(self, now=None, limit=None):
+        """URLs whose next check has come, most overdue first."""
+        sql = "SELECT url FROM pages WHERE next_check <= ? ORDER BY next_check"
+        params = (now or time.time(),)
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params).fetchall()]
+
+    def get(self, url):
+        """Return {etag, last_modified, fingerprint, deadline, checks, changes} for url, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, fingerprint, deadline, checks, changes FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(['etag', 'last_modified', 'fingerprint', 'deadline', 'checks', 'changes'], row))
+
+    def record_check(self, url, changed, next_check, etag=None, last_modified=None, fingerprint=None, deadline=None):
+        """Save a check's outcome; validators and fingerprint are only replaced when given."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET checks = checks + 1, changes = changes + ?, last_checked = ?, next_check = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), "
+                "fingerprint = COALESCE(?, fingerprint), deadline = COALESCE(?, deadline) WHERE url = ?",
+                (int(changed), time.time(), next_check, etag, last_modified, fingerprint, deadline, url)
+            )
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Refresher:
+    """Re-checks due pages with conditional requests and re-classifies the ones that changed."""
+
+    def __init__(self, store, pages, tier, client, cache=None, index=None):
+        self.store = store
+        self.pages = pages
+        self.tier = tier
+        self.client = client
+        self.cache = cache
+        self.index = index
+        self.outcomes = Counter()
+        self.transitions = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, outcome, transition=None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if transition:
+                self.transitions[transition] += 1
+
+    def fetch(self, url, state):
+        """Conditional GET; returns (text, etag, last_modified), or None when the server says 304.
+
+        Pages read through a browser come back without validators: a JavaScript
+        shell's ETag says nothing about the content it renders. Raises PageGone
+        on 404 and 410.
+        """
+        from fetch_tier import GONE_STATUS, PageGone, escalation_reason
+        headers = {}
+        if state['etag']:
+            headers['If-None-Match'] = state['etag']
+        if state['last_modified']:
+            headers['If-Modified-Since'] = state['last_modified']
+        with span('http_fetch', url=url, conditional=bool(headers)) as s:
+            response = self.tier.session.get(url, headers=headers, timeout=self.tier.timeout)
+            s.set(status=response.status_code)
+        if response.status_code == 304:
+            return None
+        if response.status_code in GONE_STATUS:
+            raise PageGone(f"HTTP {response.status_code}")
+        text, reason = escalation_reason(response.status_code, response.headers, response.text,
+                                         response.headers.get('Content-Type', '').lower())
+        if reason:
+            # JavaScript pages and bot walls have no usable validators; read them in a browser
+            return self.tier.fetch_browser(url), None, None
+        return text, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    def _untrack(self, url):
+        self.pages.untrack([url])
+        self._count('untracked')
+        return 'untracked'
+
+    def check(self, url):
+        """Re-check one page; returns what happened ('not modified', 'unchanged', 'changed', 'baseline', ...)."""
+        from eligibility_index import parse_deadline
+        from fetch_tier import PageGone
+        from triage import classify_page_text, has_captcha, record_link_status
+        state = self.pages.get(url)
+        link = self.store.get(url)
+        status = link[0] if link else None
+        if status not in TRACKED_STATUSES:
+            # Filled or back to pending since it was tracked; never overwrite that
+            return self._untrack(url)
+        now = time.time()
+        try:
+            fetched = self.fetch(url, state)
+        except PageGone as e:
+            # Taken down; no model call needed to know it's gone
+            changed = status != 'not found'
+            if changed:
+                record_link_status(self.store, url, 'not found', f"Page no longer exists ({e})")
+                print(f"{url}: {status} -> not found")
+            self.pages.record_check(url, changed, next_check_time(now, state['checks'] + 1, state['changes'] + changed,
+                                                                  'not found', state['deadline']))
+            self._count('gone', f"{status} -> not found" if changed else None)
+            return 'gone'
+        if fetched is None:
+            self.pages.record_check(url, False, next_check_time(now, state['checks'] + 1, state['changes'],
+                                                                status, state['deadline']))
+            self._count('not modified')
+            return 'not modified'
+        text, etag, last_modified = fetched
+        if has_captcha(text):
+            # Can't see the page; try again on the normal schedule without counting a change
+            self.pages.record_check(url, False, next_check_time(now, state['checks'] + 1, state['changes'],
+                                                                status, state['deadline']))
+            self._count('blocked')
+            return 'blocked'
+        digest = fingerprint(text)
+        deadline = parse_deadline(None, text) or state['deadline']
+        baseline = state['fingerprint'] is None
+        # An open page's first check only records a baseline. Closed and missing pages are
+        # re-classified, since they may have reopened between triage and this check.
+        if digest == state['fingerprint'] or (baseline and status == 'open'):
+            outcome = 'baseline' if baseline else 'unchanged'
+            self.pages.record_check(url, False, next_check_time(now, state['checks'] + 1, state['changes'],
+                                                                status, deadline),
+                                    etag, last_modified, digest, deadline)
+            self._count(outcome)
+            return outcome
+        with span('classify', url=url) as s:
+            new_status, details = classify_page_text(self.client, text, self.cache)
+            s.set(status=new_status)
+        link = self.store.get(url)
+        if link is None or link[0] not in TRACKED_STATUSES:
+            # Filled while this page was being fetched and classified
+            return self._untrack(url)
+        record_link_status(self.store, url, new_status, details)
+        if self.index is not None and (not baseline or new_status != status):
+            # Eligibility may have changed with the page; re-extract on the next index build
+            self.index.remove(url)
+        changed = not baseline or new_status != status
+        self.pages.record_check(url, changed, next_check_time(now, state['checks'] + 1, state['changes'] + changed,
+                                                              new_status, deadline),
+                                etag, last_modified, digest, deadline)
+        transition = f"{status} -> {new_status}" if new_status != status else None
+        if transition:
+            print(f"{url}: {transition}")
+        outcome = 'rechecked' if baseline else 'changed'
+        self._count(outcome, transition)
+        return outcome
+
+    def refresh(self, limit=None, workers=8):
+        """Track any new triaged links, then check every due page; returns the outcome counts."""
+        urls = [url for status in TRACKED_STATUSES for url in self.store.urls_with_status(status)]
+        tracked = set(urls)
+        self.pages.untrack([url for url in self.pages.urls() if url not in tracked])
+        self.pages.track(urls)
+        due = self.pages.due(limit=limit)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.check, url): url for url in due}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # Left due, so the next run tries again
+                    print(f"Could not re-check {futures[future]}: {e}")
+                    self._count('error')
+        return self.outcomes
+
+    def report(self):
+        checked = sum(self.outcomes.values()) - self.outcomes['untracked']
+        if not checked:
+            return "Refresh: nothing due."
+        line = (f"Refresh: {checked} page(s) checked, {self.outcomes['not modified']} not modified (304), "
+                f"{self.outcomes['unchanged'] + self.outcomes['baseline']} with unchanged text, "
+                f"{self.outcomes['changed']} changed and re-classified, {self.outcomes['gone']} gone (404/410), "
+                f"{self.outcomes['rechecked']} closed or missing page(s) re-classified on their first check.")
+        if self.transitions:
+            line += ' Status changes: ' + ', '.join(f"{t} ({n})" for t, n in self.transitions.most_common()) + '.'
+        return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-check tracked scholarship pages and re-classify the ones that changed')
+    parser.add_argument('--limit', type=int, help='Check at most this many due pages')
+    parser.add_argument('--workers', type=int, default=8, help='Pages checked in parallel')
+    parser.add_argument('--trace', help='Write timing spans to this JSON lines file')
+    args = parser.parse_args()
+
+    import tracing
+    from browser_pool import BrowserPool
+    from eligibility_index import EligibilityIndex
+    from fetch_tier import FetchTier
+    from link_store import open_link_store
+    from main import get_cache, get_client
+    tracing.configure(args.trace)
+    store = open_link_store()
+    pages = RefreshStore()
+    index = EligibilityIndex()
+    browsers = BrowserPool(size=min(args.workers, 4), headless=True, page_load_timeout=20)
+    try:
+        refresher = Refresher(store, pages, FetchTier(browsers), get_client(), get_cache(), index)
+        refresher.refresh(args.limit, args.workers)
+        print(refresher.report())
+        print(f"{pages.count()} page(s) tracked in {pages.path}.")
+    finally:
+        browsers.close()
+        index.close()
+        pages.close()
+        store.close()
+    print(tracing.report())
+
+
+if __name__ == "__main__":
+    main()
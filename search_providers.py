@@ -0,0 +1,214 @@
+"""Search backends behind one interface.
+
+Every provider is called as provider(query, num_results, start) and returns
+a list of result URLs, so any of them can be passed straight to
+query_plan.run_query_plan(search_page=...).
+
+- GoogleSearchProvider: googlesearch-python (the original search_scholarships path)
+- SeleniumSearchProvider: scrapes google.com in a browser the user can solve CAPTCHAs in
+- CustomSearchProvider: Google Programmable Search JSON API over HTTP
+- ReplayProvider: serves recorded result pages from disk, for offline runs and benchmarks
+- RecordingProvider: wraps another provider and saves what it returns as fixtures
+"""
+import hashlib
+import json
+import os
+import threading
+import urllib.parse
+from tracing import span
+
+FIXTURE_DIR = 'serp_fixtures'
+CUSTOM_SEARCH_URL = 'https://www.googleapis.com/customsearch/v1'
+
+
+def query_key(query):
+    """Stable file name for a query's fixture: whitespace and case don't matter."""
+    normalized = ' '.join(query.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def scrape_result_links(driver, num_results=10, skip=None):
+    """Collect outbound result links from the Google results page open in driver.
+
+    Links skip(href) is true for (already in the link store) don't count
+    towards num_results, so the fallback keeps looking for new ones.
+    """
+    from selenium.webdriver.common.by import By
+    found = []
+
+    def add(href):
+        if href and href.startswith('http') and 'google.com' not in href and href not in found:
+            if skip is None or not skip(href):
+                found.append(href)
+
+    # Organic results first, then any visible link if there weren't enough
+    for result in driver.find_elements(By.CSS_SELECTOR, 'div.g'):
+        try:
+            add(result.find_element(By.CSS_SELECTOR, 'a').get_attribute('href'))
+        except Exception:
+            continue
+    if len(found) < num_results:
+        for link in driver.find_elements(By.CSS_SELECTOR, 'a[href]'):
+            add(link.get_attribute('href'))
+            if len(found) >= num_results:
+                break
+    return found
+
+
+class GoogleSearchProvider:
+    """Google results through the googlesearch-python package."""
+    name = 'google'
+
+    def __call__(self, query, num_results=10, start=0):
+        from googlesearch import search
+        return list(search(query, num_results=num_results, start_num=start))
+
+
+class SeleniumSearchProvider:
+    """Scrapes google.com in a real browser.
+
+    With pause=True the first search waits for Enter so the user can solve a
+    CAPTCHA; later searches reuse the same browser session. Links skip(href)
+    is true for are left out while scraping.
+    """
+    name = 'selenium'
+
+    def __init__(self, driver, pause=True, skip=None):
+        self.driver = driver
+        self.pause = pause
+        self.skip = skip
+        self._lock = threading.Lock()
+
+    def __call__(self, query, num_results=10, start=0):
+        from page_ready import wait_for_page_ready
+        url = f"https://www.google.com/search?q={urllib.parse.quote_plus(query)}"
+        if start:
+            url += f"&start={start}"
+        # One browser: searches take turns
+        with self._lock:
+            self.driver.get(url)
+            if self.pause:
+                with span('captcha_wait', url=url):
+                    input("If a CAPTCHA appears, please solve it in the browser. When you are done, press Enter here to continue...")
+                self.pause = False
+            wait_for_page_ready(self.driver)
+            return scrape_result_links(self.driver, num_results, self.skip)
+
+
+class CustomSearchProvider:
+    """Google Programmable Search (Custom Search JSON API) over plain HTTP.
+
+    Needs an API key and a search engine ID, read from GOOGLE_CSE_KEY and
+    GOOGLE_CSE_ID unless passed in. The API returns at most 10 results per
+    request, so larger pages are fetched in several requests.
+    """
+    name = 'api'
+
+    def __init__(self, api_key=None, engine_id=None, timeout=10, session=None):
+        self.api_key = api_key or os.environ.get('GOOGLE_CSE_KEY')
+        self.engine_id = engine_id or os.environ.get('GOOGLE_CSE_ID')
+        if not self.api_key or not self.engine_id:
+            raise ValueError("CustomSearchProvider needs GOOGLE_CSE_KEY and GOOGLE_CSE_ID")
+        self.timeout = timeout
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+
+    def __call__(self, query, num_results=10, start=0):
+        results = []
+        while len(results) < num_results:
+            params = {
+                'key': self.api_key, 'cx': self.engine_id, 'q': query,
+                'num': min(10, num_results - len(results)),
+                'start': start + len(results) + 1,  # The API counts from 1
+            }
+            response = self.session.get(CUSTOM_SEARCH_URL, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            items = response.json().get('items', [])
+            results.extend(item['link'] for item in items if item.get('link'))
+            if len(items) < params['num']:
+                break  # No more results for this query
+        return results
+
+
+class ReplayProvider:
+    """Serves recorded result lists from FIXTURE_DIR, one JSON file per query.
+
+    Each fixture is {"query": ..., "results": [url, ...]}; a page is a slice
+    of the results list. With strict=True a query with no fixture raises
+    KeyError, otherwise it returns no results.
+    """
+    name = 'replay'
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, strict=False):
+        self.fixture_dir = fixture_dir
+        self.strict = strict
+        self._fixtures = {}
+        self._lock = threading.Lock()
+
+    def fixture_path(self, query):
+        return os.path.join(self.fixture_dir, f"{query_key(query)}.json")
+
+    def load(self, query):
+        key = query_key(query)
+        with self._lock:
+            if key not in self._fixtures:
+                path = self.fixture_path(query)
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        self._fixtures[key] = json.load(f)['results']
+                else:
+                    self._fixtures[key] = None
+            results = self._fixtures[key]
+        if results is None and self.strict:
+            raise KeyError(f"No search fixture for '{query}' in {self.fixture_dir}")
+        return results or []
+
+    def __call__(self, query, num_results=10, start=0):
+        return [url for url in self.load(query)[start:start + num_results] if url]
+
+
+class RecordingProvider:
+    """Passes searches through to another provider and saves the results as fixtures."""
+
+    def __init__(self, provider, fixture_dir=FIXTURE_DIR):
+        self.provider = provider
+        self.name = f"record:{provider.name}"
+        self.replay = ReplayProvider(fixture_dir)
+        self._lock = threading.Lock()
+        os.makedirs(fixture_dir, exist_ok=True)
+
+    def __call__(self, query, num_results=10, start=0):
+        page = self.provider(query, num_results, start)
+        path = self.replay.fixture_path(query)
+        with self._lock:
+            results = []
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    results = json.load(f)['results']
+            # Write the page into its slot so a later replay slices the same page;
+            # pages can finish out of order, so pad any gap before it, and pad a
+            # short page to its full size so it doesn't shift the pages after it
+            results.extend([''] * (start - len(results)))
+            results[start:start + num_results] = page + [''] * (num_results - len(page))
+            with open(path, 'w') as f:
+                json.dump({'query': query, 'results': results}, f, indent=2)
+        return page
+
+
+def get_provider(name='google', driver=None, fixture_dir=FIXTURE_DIR, record=False, **options):
+    """Build a provider by name: 'google', 'selenium', 'api' or 'replay'."""
+    if name == 'google':
+        provider = GoogleSearchProvider()
+    elif name == 'selenium':
+        if driver is None:
+            raise ValueError("The selenium search provider needs a browser")
+        provider = SeleniumSearchProvider(driver, pause=options.get('pause', True), skip=options.get('skip'))
+    elif name == 'api':
+        provider = CustomSearchProvider(options.get('api_key'), options.get('engine_id'))
+    elif name == 'replay':
+        return ReplayProvider(fixture_dir, strict=options.get('strict', False))
+    else:
+        raise ValueError(f"Unknown search provider '{name}'")
+    return RecordingProvider(provider, fixture_dir) if record else provider
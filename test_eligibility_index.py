@@ -0,0 +1,25 @@
+from eligibility_index import BitmapMatcher, normalize_grade, normalize_record
+
+COLLEGE = ['college freshman', 'college sophomore', 'college junior', 'college senior']
+
+
+def test_undergraduate_covers_every_college_year():
+    assert normalize_grade('undergraduate') == COLLEGE
+    assert normalize_grade('Undergraduate students') == COLLEGE
+    assert normalize_grade('college student') == COLLEGE
+
+
+def test_specific_grades_stay_specific():
+    assert normalize_grade('HS senior') == ['high school senior']
+    assert normalize_grade('12th grade') == ['high school senior']
+    assert normalize_grade('undergraduate sophomore') == ['college sophomore']
+    assert normalize_grade('graduate student') == ['graduate']
+    assert normalize_grade('anyone') == []
+
+
+def test_undergraduate_record_keeps_its_restriction():
+    record = normalize_record({'grade_levels': ['undergraduate students']})
+    assert record['grade_levels'] == sorted(COLLEGE)
+    matcher = BitmapMatcher([('https://example.org/s', record)])
+    assert matcher.match({'grade_level': 'college junior'}) == ['https://example.org/s']
+    assert matcher.match({'grade_level': 'high school senior'}) == []
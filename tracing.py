@@ -0,0 +1,176 @@
+"""Lightweight spans for finding out where a run's time goes.
+
+    with span('fetch', url=url) as s:
+        text = fetch(url)
+        s.set(chars=len(text))
+
+Spans nest per thread (and per asyncio task) and are kept in memory for report(). Call
+configure('trace.jsonl') to also stream them out as JSON lines shaped like
+OpenTelemetry spans (trace_id, span_id, parent_span_id, start/end in unix
+nanoseconds, attributes, status).
+
+Attributes describe the work, never the data: URLs, counts, token
+estimates and cache hits, not filled values or essay text.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Where each span's own time (excluding child spans) is charged in the report
+CATEGORIES = {
+    'search': 'search',
+    # Plain HTTP page fetches; 'fetch' is a page load in a browser
+    'http_fetch': 'http',
+    'fetch': 'chrome',
+    'navigate': 'chrome',
+    'page_ready': 'chrome',
+    'dom_extract': 'chrome',
+    'field_fill': 'chrome',
+    'fill_page': 'chrome',
+    'click': 'chrome',
+    'submit': 'chrome',
+    'fill_application': 'chrome',
+    'model_call': 'gemini',
+    'gemini_request': 'gemini',
+    'rate_limit_wait': 'sleeps',
+    'backoff_sleep': 'sleeps',
+    'captcha_wait': 'waiting on you',
+    'login_wait': 'waiting on you',
+    'user_wait': 'waiting on you',
+}
+
+
+class Span:
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        # The site a span belongs to, inherited from the nearest span with a url
+        self.site = attributes.get('url') or (parent.site if parent else None)
+        self.top_site = self.site is not None and (parent is None or parent.site is None)
+        self.attributes = dict(attributes)
+        self.status = 'ok'
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        """Add or update attributes while the span is open."""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.tracer.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'start_time_unix_nano': int(self.start * 1e9),
+            'end_time_unix_nano': int((self.start + self.duration) * 1e9),
+            'duration_ms': round(self.duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+            'status': self.status,
+        }
+
+
+class Tracer:
+    """Collects finished spans and optionally appends them to a JSONL file."""
+
+    def __init__(self, path=None):
+        self.trace_id = uuid.uuid4().hex
+        self.path = path
+        self.spans = []
+        # A context variable rather than a thread-local, so concurrent asyncio tasks don't nest in each other
+        self._stack = contextvars.ContextVar(f"spans_{self.trace_id}", default=())
+        self._lock = threading.Lock()
+
+    def current(self):
+        stack = self._stack.get()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = self.current()
+        record = Span(self, name, parent, attributes)
+        token = self._stack.set(self._stack.get() + (record,))
+        try:
+            yield record
+        except BaseException as e:
+            record.status = 'error'
+            record.attributes['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._stack.reset(token)
+            record.duration = time.perf_counter() - record._started
+            self._finish(record)
+
+    def _finish(self, record):
+        with self._lock:
+            self.spans.append(record)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(record.to_dict(), default=str) + '\n')
+
+    def report(self, top=5):
+        """Summarize time by stage, by category (HTTP, Chrome, Gemini, sleeps) and by site."""
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return "Trace: no spans recorded."
+        child_time = {}
+        for record in spans:
+            if record.parent_id:
+                child_time[record.parent_id] = child_time.get(record.parent_id, 0.0) + record.duration
+        stages = {}
+        categories = {}
+        sites = {}
+        for record in spans:
+            durations = stages.setdefault(record.name, [])
+            durations.append(record.duration)
+            # Self time, so nested spans aren't counted twice (concurrent children can push it below 0)
+            own = max(0.0, record.duration - child_time.get(record.span_id, 0.0))
+            category = CATEGORIES.get(record.name, 'other')
+            categories[category] = categories.get(category, 0.0) + own
+            if record.top_site:
+                sites[record.site] = sites.get(record.site, 0.0) + record.duration
+
+        lines = ["--- Run report ---", f"{'stage':<18}{'count':>7}{'total s':>10}{'p50 s':>9}{'max s':>9}"]
+        for name, durations in sorted(stages.items(), key=lambda item: sum(item[1]), reverse=True):
+            ordered = sorted(durations)
+            lines.append(f"{name:<18}{len(ordered):>7}{sum(ordered):>10.2f}"
+                         f"{ordered[len(ordered) // 2]:>9.2f}{ordered[-1]:>9.2f}")
+        total = sum(categories.values()) or 1.0
+        lines.append("Time by category (span self time, summed across threads):")
+        for category, seconds in sorted(categories.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {category:<16}{seconds:>9.2f}s  {seconds / total:>4.0%}")
+        if sites:
+            lines.append("Slowest sites:")
+            for site, seconds in sorted(sites.items(), key=lambda item: item[1], reverse=True)[:top]:
+                lines.append(f"  {seconds:>7.2f}s  {site}")
+        if self.path:
+            lines.append(f"Spans written to {os.path.abspath(self.path)}")
+        return '\n'.join(lines)
+
+
+tracer = Tracer()
+
+
+def configure(path=None):
+    """Start a fresh trace, streaming spans to path as JSON lines if given."""
+    global tracer
+    tracer = Tracer(path)
+    return tracer
+
+
+def span(name, **attributes):
+    """Open a span on the current tracer; use as a context manager."""
+    return tracer.span(name, **attributes)
+
+
+def report(top=5):
+    return tracer.report(top)
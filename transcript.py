@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pdfplumber
+
+CACHE_DIR = 'transcript_cache'
+
+# Pages handed to each worker process; small PDFs are read in-process
+PAGES_PER_TASK = 4
+# Bump when parsing changes so cached results are parsed again
+PARSER_VERSION = 2
+
+GRADE_PATTERN = r'(?:A|B|C|D)[+-]?|F|P|NP|W|IP'
+
+# "AP Calculus BC   A-   1.0" / "ENGL 101 English Composition B+ 3"; a colon means a "Label: value" line
+COURSE_ROW = re.compile(
+    r'^(?P<course>[A-Za-z][^:]*?)\s+(?P<grade>' + GRADE_PATTERN + r')\s*(?P<credits>\d+(?:\.\d+)?)?\s*$'
+)
+# Header and footer lines that can end in a letter that looks like a grade
+NOT_A_COURSE = re.compile(
+    r'^(?:counselor|advisor|student|name|address|room|status|graduation|class of|date|id|school|phone|page)\b',
+    re.IGNORECASE
+)
+# Lines worth keeping next to the course rows: GPA, rank, credit totals, test scores
+SUMMARY_LINE = re.compile(
+    r'\b(?:gpa|grade point|cumulative|weighted|unweighted|rank|percentile|total credits|credits earned|'
+    r'class of|graduat\w*|honors?|sat|act|psat)\b',
+    re.IGNORECASE
+)
+TERM_HEADER = re.compile(
+    r'^(?P<term>(?:Fall|Spring|Summer|Winter|Semester|Term|Grade|Quarter)\b.*?\d{1,4}.*)$', re.IGNORECASE
+)
+
+
+def _extract_pages(file_path, page_numbers):
+    """Worker: return [(page_number, text)] for a slice of the PDF."""
+    with pdfplumber.open(file_path) as pdf:
+        # Some pages (scans, blank pages) have no text layer and return None
+        return [(n, pdf.pages[n].extract_text() or '') for n in page_numbers]
+
+
+def iter_pdf_pages(file_path, max_workers=None):
+    """Yield (page_number, text) as pages finish extracting, in completion order."""
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+        if page_count <= PAGES_PER_TASK:
+            for n, page in enumerate(pdf.pages):
+                yield n, page.extract_text() or ''
+            return
+    chunks = [list(range(i, min(i + PAGES_PER_TASK, page_count))) for i in range(0, page_count, PAGES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_extract_pages, file_path, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            for n, text in future.result():
+                yield n, text
+
+
+def file_hash(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def parse_course_rows(text):
+    """Parse transcript text into [{'term', 'course', 'grade', 'credits'}] rows."""
+    rows = []
+    term = ''
+    for line in text.splitlines():
+        line = ' '.join(line.split())
+        if not line:
+            continue
+        match = None if NOT_A_COURSE.match(line) else COURSE_ROW.match(line)
+        if match:
+            rows.append({
+                'term': term,
+                'course': match.group('course'),
+                'grade': match.group('grade'),
+                'credits': match.group('credits') or '',
+            })
+            continue
+        header = TERM_HEADER.match(line)
+        if header:
+            term = header.group('term')
+    return rows
+
+
+def summary_lines(text):
+    """Lines outside the course table that carry GPA, class rank, credit totals and the like."""
+    lines = []
+    for line in text.splitlines():
+        line = ' '.join(line.split())
+        if line and line not in lines and SUMMARY_LINE.search(line) and not COURSE_ROW.match(line):
+            lines.append(line)
+    return lines
+
+
+def format_course_rows(rows):
+    """Compact one-line-per-course text to send in prompts instead of the raw transcript."""
+    lines = []
+    for row in rows:
+        prefix = f"{row['term']}: " if row['term'] else ''
+        credits = f" ({row['credits']} cr)" if row['credits'] else ''
+        lines.append(f"{prefix}{row['course']} - {row['grade']}{credits}")
+    return '\n'.join(lines)
+
+
+def load_transcript(file_path, cache_dir=CACHE_DIR, max_workers=None):
+    """Return {'text', 'rows'} for a PDF or TXT transcript, cached by file hash."""
+    digest = file_hash(file_path)
+    cache_path = os.path.join(cache_dir, f'{digest}-v{PARSER_VERSION}.json')
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    if file_path.lower().endswith('.pdf'):
+        pages = {}
+        for n, text in iter_pdf_pages(file_path, max_workers=max_workers):
+            pages[n] = text
+        text = '\n'.join(pages[n] for n in sorted(pages))
+    else:
+        with open(file_path, 'r') as f:
+            text = f.read()
+
+    result = {'text': text, 'rows': parse_course_rows(text)}
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump(result, f)
+    return result
+
+
+def transcript_for_prompt(transcript):
+    """Structured course rows plus summary lines (GPA, rank) when rows parsed, otherwise the raw text."""
+    if not transcript['rows']:
+        return transcript['text']
+    summary = summary_lines(transcript['text'])
+    courses = format_course_rows(transcript['rows'])
+    return '\n'.join(summary) + '\n\n' + courses if summary else courses
@@ -0,0 +1,186 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from prompt_compaction import DEFAULT_TOKEN_BUDGET, compact_page_text
+from tracing import span
+
+# Phrases that show up on CAPTCHA/Cloudflare/robot check pages
+CAPTCHA_KEYWORDS = [
+    'captcha', 'cloudflare', 'robot check', 'are you human', 'verify you are human',
+    'please stand by', 'checking your browser', 'press and hold', 'security check',
+    'unusual traffic', 'verify you are not a robot', 'solve the puzzle', 'protection from attacks'
+]
+
+TRIAGE_MODEL = 'gemini-3-flash-preview'
+
+TRIAGE_PROMPT = (
+    "Analyze the following webpage text. "
+    "Does it contain a real scholarship opportunity, or is it just an ad for a university, or a scholarship only for attending that specific college/university? "
+    "If it is a scholarship only for students who attend the same college/university as the page, treat it as 'not found'. "
+    "If it is a real, general scholarship, is there a way to apply (e.g., a button or link with 'apply', 'application', or similar)? "
+    "If the scholarship is closed or unavailable, say so. "
+    "Summarize in JSON: {\"status\": 'open'|'closed'|'completed'|'not found', \"details\": <short reason>}"
+)
+
+# Prefix of the details saved when Gemini's answer wasn't valid JSON
+UNPARSED = 'Unparsed Gemini response'
+
+def has_captcha(page_text):
+    """Check whether page text looks like a CAPTCHA or anti-bot wall."""
+    lowered = page_text.lower()
+    return any(word in lowered for word in CAPTCHA_KEYWORDS)
+
+
+def parse_triage_response(analysis):
+    """Parse Gemini's JSON triage answer into (status, details)."""
+    # Remove code block markers if present
+    cleaned = analysis.strip()
+    if cleaned.startswith('```json'):
+        cleaned = re.sub(r'^```json', '', cleaned).strip()
+    if cleaned.startswith('```'):
+        cleaned = re.sub(r'^```', '', cleaned).strip()
+    if cleaned.endswith('```'):
+        cleaned = re.sub(r'```$', '', cleaned).strip()
+    try:
+        result = json.loads(cleaned)
+        return result.get('status', 'not found'), result.get('details', '')
+    except Exception:
+        print("Could not parse Gemini response as JSON.")
+        return 'not found', f"{UNPARSED}: {analysis}"
+
+
+def classify_page_text(client, page_text, cache=None, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Ask Gemini whether the page is an open/closed/completed scholarship."""
+    # Send the most scholarship-relevant text that fits the budget, not the first 5000 chars
+    compacted = compact_page_text(page_text, token_budget)
+    if cache is not None:
+        return parse_triage_response(cache.generate(client, TRIAGE_MODEL, TRIAGE_PROMPT, compacted))
+    response = client.models.generate_content(
+        model=TRIAGE_MODEL,
+        contents=f"{TRIAGE_PROMPT}\n\n{compacted}"
+    )
+    return parse_triage_response(response.text)
+
+
+def record_link_status(store, link_url, status, details):
+    """Save a triage result in the link store (safe to call from worker threads)."""
+    store.upsert(link_url, status, ' '.join(str(details).split()))
+
+
+def read_body_text(driver):
+    """Return the visible text of the current page, or '' if unavailable."""
+    from selenium.webdriver.common.by import By
+    try:
+        return driver.find_element(By.TAG_NAME, "body").text
+    except Exception:
+        return ""
+
+
+def _classify_and_record(client, store, link_url, page_text, cache=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                         preclassifier=None):
+    with span('classify', url=link_url) as s:
+        status, details = classify_page_text(client, page_text, cache, token_budget)
+        s.set(status=status)
+    record_link_status(store, link_url, status, details)
+    if preclassifier is not None:
+        preclassifier.record_label(page_text, status, details)
+    print(f"Saved {link_url} with status: {status}")
+    return status
+
+
+def _resolve_captcha_links(captcha_links, client, store, driver, cache=None, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Hand CAPTCHA-blocked sites to the interactive browser one at a time."""
+    for link_url in captcha_links:
+        print(f"Opening CAPTCHA-protected site: {link_url}")
+        driver.get(link_url)
+        print("CAPTCHA or anti-bot detected on this scholarship site!")
+        with span('captcha_wait', url=link_url):
+            user_choice = input("Solve the CAPTCHA and press Enter to continue, or type 's' to skip this site: ").strip().lower()
+        if user_choice == 's':
+            # Mark as not found and skip
+            record_link_status(store, link_url, 'not found', 'Skipped due to CAPTCHA')
+            print(f"Skipped {link_url} and marked as not found.")
+            continue
+        page_text = read_body_text(driver)
+        _classify_and_record(client, store, link_url, page_text, cache, token_budget)
+
+
+def triage_links(links, client, store, driver, fetch_workers=4, model_workers=4, cache=None, browsers=None,
+                 token_budget=DEFAULT_TOKEN_BUDGET, preclassifier=None, http_first=True):
+    """Fetch and classify links concurrently, saving each result in the link store.
+
+    Pages are fetched by a bounded pool of workers and classified by a
+    separate bounded pool of Gemini calls. With http_first each page is tried
+    over plain HTTP and only opened in a headless browser when it looks like a
+    JavaScript shell or a bot wall; pass False for links already known to
+    need a browser. Only sites that hit a CAPTCHA are
+    sent back to the interactive driver once the concurrent pass is done, or
+    added to the store's review queue when driver is None.
+    Pass a GeminiCache to reuse classifications of pages that haven't changed,
+    and a headless BrowserPool to keep fetch browsers warm across calls.
+    token_budget caps how much page text goes into each classification prompt.
+    A PreClassifier settles obvious pages locally so they never reach Gemini.
+    """
+    from fetch_tier import FetchTier, PageGone  # fetch_tier imports this module
+    own_browsers = browsers is None
+    if own_browsers:
+        from browser_pool import BrowserPool
+        browsers = BrowserPool(size=fetch_workers, headless=True, page_load_timeout=20)
+    tier = FetchTier(browsers, http_first=http_first)
+    captcha_links = []
+    model_futures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+                ThreadPoolExecutor(max_workers=model_workers) as model_pool:
+            fetch_futures = {fetch_pool.submit(tier.fetch_text, url): url for url in links}
+            for future in as_completed(fetch_futures):
+                link_url = fetch_futures[future]
+                try:
+                    page_text = future.result()
+                except PageGone as e:
+                    print(f"{link_url} no longer exists ({e}).")
+                    record_link_status(store, link_url, 'not found', f"Page no longer exists ({e})")
+                    continue
+                except Exception as e:
+                    print(f"Failed to load {link_url}: {e}")
+                    record_link_status(store, link_url, 'not found', f"Failed to load page: {e}")
+                    continue
+                if has_captcha(page_text):
+                    print(f"CAPTCHA detected on {link_url}, queued for manual review.")
+                    captcha_links.append(link_url)
+                    continue
+                decision = preclassifier.classify(page_text) if preclassifier is not None else None
+                if decision is not None:
+                    status, details = decision
+                    record_link_status(store, link_url, status, f"Local pre-classifier: {details}")
+                    print(f"Saved {link_url} with status: {status} (no Gemini call)")
+                    continue
+                model_futures[model_pool.submit(
+                    _classify_and_record, client, store, link_url, page_text, cache, token_budget, preclassifier)] = link_url
+            for future in as_completed(model_futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # Leave the link unrecorded so the next run retries it
+                    print(f"Gemini classification failed for {model_futures[future]}: {e}")
+    finally:
+        if own_browsers:
+            browsers.close()
+    print(tier.report())
+
+    if captcha_links and driver is None:
+        # Headless batch runs queue CAPTCHA sites for a human instead of blocking
+        for link_url in captcha_links:
+            store.add_review(link_url, 'triage', 'CAPTCHA or anti-bot check')
+            # Recorded so later searches skip it; `main.py triage` leaves it until the review is resolved
+            record_link_status(store, link_url, 'pending', 'CAPTCHA; waiting for review')
+        print(f"{len(captcha_links)} site(s) added to the review queue (CAPTCHA).")
+    elif captcha_links:
+        print(f"{len(captcha_links)} site(s) need manual CAPTCHA solving.")
+        _resolve_captcha_links(captcha_links, client, store, driver, cache, token_budget)
+
+    if preclassifier is not None:
+        print(preclassifier.report())
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Gemini cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")